@@ -1,14 +1,17 @@
+from importlib import import_module
+
 from flask import Flask
-from flask_bootstrap import Bootstrap
+from flask.sessions import SessionInterface
 from flask_login import LoginManager
-from flask_moment import Moment
-from flask_sqlalchemy import SQLAlchemy
 
 from config import config
 
-bootstrap = Bootstrap()
-moment = Moment()
-db = SQLAlchemy()
+from . import accesslog
+from .ratelimit import login_throttle
+from .routing import RoutingSQLAlchemy
+
+# reads of GET requests go to the read replicas when there are any
+db = RoutingSQLAlchemy()
 
 # Flask-Login is initialized in the application factory function.
 login_manager = LoginManager()
@@ -21,34 +24,101 @@ name.
 """
 login_manager.login_view = "auth.login"
 
+# Blueprints that can be enabled through the FLASK_BLUEPRINTS setting, given as
+# (module, blueprint attribute, url prefix). A blueprint module is only imported
+# when it is enabled, so workers that serve a single blueprint do not pay for
+# importing the others.
+BLUEPRINTS = {
+    "main": (".main", "main", None),
+    "auth": (".auth", "auth", "/auth"),
+    "api": (".api.v1", "api", "/api/v1"),
+}
+
+# Blueprints that render templates and therefore need Bootstrap and Moment.
+HTML_BLUEPRINTS = {"main", "auth"}
+
+
+def init_html_extensions(app):
+    """
+    Bootstrap, Moment, the fragment cache and the fingerprinted static assets are
+    only used by templates, so they are imported and initialized only when a
+    blueprint that renders HTML is enabled.
+    """
+    from flask_bootstrap import Bootstrap
+    from flask_moment import Moment
+
+    from . import assets, fragments
+
+    Bootstrap(app)
+    Moment(app)
+    fragments.init_app(app)
+    assets.init_app(app)
+
+
+class NullSessionInterface(SessionInterface):
+    """
+    Session interface used when no blueprint renders HTML. API clients
+    authenticate on every request, so the session cookie is neither decoded nor
+    written back.
+    """
+
+    def open_session(self, app, request):
+        return self.make_null_session(app)
+
+    def save_session(self, app, session, response):
+        pass
+
 
 def create_app(config_name):
     app = Flask(__name__)
     app.config.from_object(config[config_name])
     config[config_name].init_app(app)
 
-    bootstrap.init_app(app)
-    moment.init_app(app)
+    enabled = [name.strip() for name in app.config["FLASK_BLUEPRINTS"] if name.strip()]
+    unknown = set(enabled) - set(BLUEPRINTS)
+    if unknown:
+        raise ValueError("Unknown blueprints: %s" % ", ".join(sorted(unknown)))
+
+    html = bool(HTML_BLUEPRINTS.intersection(enabled))
+    if html:
+        init_html_extensions(app)
     db.init_app(app)
+    login_throttle.init_app(app)
 
-    login_manager.init_app(app)
+    # The user session, and Flask-Login on top of it, is only needed by the
+    # blueprints that render HTML.
+    if html:
+        login_manager.init_app(app)
+    else:
+        app.session_interface = NullSessionInterface()
 
     if app.config["SSL_REDIRECT"]:
         from flask_sslify import SSLify
 
         sslify = SSLify(app)
 
-    from .main import main as main_blueprint
+    for name in enabled:
+        module, attribute, url_prefix = BLUEPRINTS[name]
+        blueprint = getattr(import_module(module, __name__), attribute)
+        app.register_blueprint(blueprint, url_prefix=url_prefix)
 
-    app.register_blueprint(main_blueprint)
+    # the custom error pages are registered by the main blueprint, without it
+    # errors raised outside of the API routes are also reported as JSON
+    if "main" not in enabled and "api" in enabled:
+        from .api.v1.errors import init_app_errors
 
-    from .auth import auth as auth_blueprint
+        init_app_errors(app)
 
-    app.register_blueprint(auth_blueprint, url_prefix="/auth")
+    if app.config["FLASK_COMPRESS_LEVELS"]:
+        from .compression import CompressionMiddleware
 
-    from .api.v1 import api as api_blueprint
+        app.wsgi_app = CompressionMiddleware(
+            app.wsgi_app,
+            app.config["FLASK_COMPRESS_LEVELS"],
+            app.config["FLASK_COMPRESS_MIN_SIZE"],
+        )
 
-    app.register_blueprint(api_blueprint, url_prefix="/api/v1")
+    accesslog.init_app(app)
 
     # attach routes and custom error pages here
 
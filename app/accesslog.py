@@ -0,0 +1,130 @@
+"""
+Structured access log.
+
+AccessLogMiddleware logs one JSON object per request on the
+"<app name>.access" logger once the response body has been sent, e.g.
+
+    {"time": "2022-04-01T10:00:00.123Z", "method": "GET", "path": "/api/v1/users/",
+     "endpoint": "api.get_users", "status": 200, "latency_ms": 12.3,
+     "db_queries": 2, "db_time_ms": 1.1, "user_id": 42, "size": 9120,
+     "remote_addr": "10.0.0.1"}
+
+The latency and size cover the whole body, streamed or not, as sent to the
+client. Only a FLASK_ACCESS_LOG_SAMPLE_RATE fraction of the successful requests
+is logged, while errors (status 400 and above) and requests slower than
+FLASK_ACCESS_LOG_SLOW_REQUEST seconds are always logged.
+"""
+import json
+import logging
+import random
+import sys
+import time
+
+from flask import g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from . import logs
+
+ENVIRON_KEY = "flasky.access_log"
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if has_request_context():
+        entry = request.environ.get(ENVIRON_KEY)
+        if entry is not None:
+            context._access_log_entry = entry
+            context._access_log_start = time.perf_counter()
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    entry = getattr(context, "_access_log_entry", None)
+    if entry is not None:
+        entry["db_queries"] += 1
+        entry["db_time_ms"] += (time.perf_counter() - context._access_log_start) * 1000
+
+
+def _record_request(response):
+    """Add the fields only known inside Flask to the entry of the request."""
+    entry = request.environ.get(ENVIRON_KEY)
+    if entry is not None:
+        entry["endpoint"] = request.endpoint
+        user = g.get("current_user") or g.get("_login_user")
+        entry["user_id"] = getattr(user, "id", None)
+    return response
+
+
+class AccessLogMiddleware:
+    def __init__(self, app, logger, config):
+        self.app = app
+        self.logger = logger
+        self.config = config
+
+    def __call__(self, environ, start_response):
+        start = time.perf_counter()
+        entry = environ[ENVIRON_KEY] = {
+            "endpoint": None,
+            "db_queries": 0,
+            "db_time_ms": 0.0,
+            "user_id": None,
+        }
+        status = []
+
+        def logging_start_response(status_line, headers, exc_info=None):
+            status[:] = [int(status_line[:3])]
+            return start_response(status_line, headers, exc_info)
+
+        iterable = self.app(environ, logging_start_response)
+        size = 0
+        try:
+            for chunk in iterable:
+                size += len(chunk)
+                yield chunk
+        finally:
+            if hasattr(iterable, "close"):
+                iterable.close()
+            self.log(environ, entry, status[0] if status else 500, start, size)
+
+    def log(self, environ, entry, status, start, size):
+        latency = time.perf_counter() - start
+        if (
+            status < 400
+            and latency < self.config["FLASK_ACCESS_LOG_SLOW_REQUEST"]
+            and random.random() >= self.config["FLASK_ACCESS_LOG_SAMPLE_RATE"]
+        ):
+            return
+        now = time.time()
+        record = {
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(now))
+            + ".%03dZ" % (now % 1 * 1000),
+            "method": environ["REQUEST_METHOD"],
+            "path": environ.get("SCRIPT_NAME", "") + environ.get("PATH_INFO", ""),
+            "endpoint": entry["endpoint"],
+            "status": status,
+            "latency_ms": round(latency * 1000, 3),
+            "db_queries": entry["db_queries"],
+            "db_time_ms": round(entry["db_time_ms"], 3),
+            "user_id": entry["user_id"],
+            "size": size,
+            "remote_addr": environ.get("REMOTE_ADDR"),
+        }
+        self.logger.info(json.dumps(record, separators=(",", ":")))
+
+
+def init_app(app):
+    """Wrap the WSGI application, outside of the other middlewares."""
+    if not app.config["FLASK_ACCESS_LOG"]:
+        return
+    logger = logging.getLogger(app.name + ".access")
+    logger.setLevel(logging.INFO)
+    # the access log has its own handler, it is not repeated by the handlers of
+    # the application logger
+    logger.propagate = False
+    if not logger.handlers:
+        handler = logging.StreamHandler(sys.stdout)
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        logs.add_handler(app, handler, logger)
+    app.after_request(_record_request)
+    app.wsgi_app = AccessLogMiddleware(app.wsgi_app, logger, app.config)
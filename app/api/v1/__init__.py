@@ -2,4 +2,12 @@ from flask import Blueprint
 
 api = Blueprint("api", __name__)
 
-from . import authentication, errors, image_history, image_upload, model_matrix, users
+from . import (
+    authentication,
+    batch,
+    errors,
+    image_history,
+    image_upload,
+    model_matrix,
+    users,
+)
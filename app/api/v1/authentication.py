@@ -1,9 +1,12 @@
-from flask import g, jsonify
+from flask import g, jsonify, request
 from flask_httpauth import HTTPBasicAuth
 
+from ... import queries
+from ...exceptions import TooManyRequests
 from ...models import User
+from ...ratelimit import login_throttle
 from . import api
-from .errors import forbidden, unauthorized
+from .errors import forbidden, too_many_requests, unauthorized
 
 auth = HTTPBasicAuth()
 
@@ -27,17 +30,29 @@ def verify_password(email_or_token, password):
         return g.current_user is not None
     # If email_or_token and password fields are nonempty then
     # regular email and password authentication is assumed.
-    user = User.query.filter_by(email=email_or_token).first()
+    # Password checks are throttled per client address and per account, and
+    # repeated calls with the same valid credentials skip the password hash.
+    user = queries.user_by_email(email_or_token)
+    try:
+        verified = login_throttle.check_password(
+            user, email_or_token, password, request.remote_addr
+        )
+    except TooManyRequests as e:
+        g.rate_limited = e
+        return False
     if not user:
         return False
     g.current_user = user
     g.token_used = False
-    return user.verify_password(password)
+    return verified
 
 
 # To ensure that the response is consistent with other errors returned by the APIs
 @auth.error_handler
 def auth_error():
+    rate_limited = g.get("rate_limited")
+    if rate_limited is not None:
+        return too_many_requests(rate_limited.args[0], rate_limited.retry_after)
     return unauthorized("Invalid credentials")
 
 
@@ -0,0 +1,114 @@
+"""
+Several API calls in one round trip.
+
+POST /api/v1/batch takes {"requests": [{"method": "GET", "path":
+"/api/v1/users/1"}, ...]}, each with optional "headers" and a JSON "body", and
+answers {"responses": [{"status": 200, "headers": {...}, "body": ...}, ...]} in
+the same order. The client is authenticated once, by the batch request itself,
+and every sub-request is dispatched in turn to the view of the blueprint its
+path matches, in its own request context but the same application context, so
+they share g.current_user and the database session. A sub-request that fails
+does not stop the others.
+
+Before the dispatch, the GETs of the endpoints with a prefetcher are resolved
+together: the users of all the GET /api/v1/users/<id> of a batch are loaded by a
+single IN query, and the views then find them in the identity map.
+"""
+from flask import current_app, g, jsonify, request
+from werkzeug.exceptions import HTTPException, NotFound
+
+from ... import db, queries
+from . import api
+from .errors import bad_request, internal_server_error
+
+# endpoint -> function loading what the GETs of the endpoint, given their view
+# arguments, are going to look up
+prefetchers = {
+    "api.get_user": lambda args: queries.users(a["id"] for a in args).values(),
+}
+
+RESPONSE_HEADERS = ("Content-Type", "Location", "ETag", "Retry-After")
+
+
+def _prefetch(subrequests):
+    adapter = current_app.create_url_adapter(request)
+    args = {}
+    for sub in subrequests:
+        if sub["method"] != "GET":
+            continue
+        try:
+            endpoint, view_args = adapter.match(sub["path"].split("?")[0], "GET")
+        except HTTPException:
+            continue
+        if endpoint in prefetchers:
+            args.setdefault(endpoint, []).append(view_args)
+    return [list(prefetchers[endpoint](a)) for endpoint, a in args.items()]
+
+
+def _dispatch(sub):
+    headers = {"Accept": "application/json"}
+    headers.update(sub.get("headers") or {})
+    with current_app.test_request_context(
+        sub["path"],
+        base_url=request.host_url,
+        method=sub["method"],
+        headers=headers,
+        json=sub.get("body"),
+    ):
+        try:
+            if request.routing_exception is not None:
+                raise request.routing_exception
+            if request.blueprint != api.name or request.endpoint == "api.batch":
+                raise NotFound()
+            view = current_app.view_functions[request.endpoint]
+            rv = view(**request.view_args)
+        except Exception as e:
+            # the error handlers of the application and of the blueprint
+            try:
+                rv = current_app.handle_user_exception(e)
+            except Exception:
+                current_app.logger.exception("Batch sub-request failed")
+                db.session.rollback()
+                rv = internal_server_error("sub-request failed")
+        response = current_app.make_response(rv)
+        if response.is_streamed:
+            response.close()
+            response = bad_request("streamed responses cannot be batched")
+        if response.is_json:
+            body = response.get_json()
+        else:
+            body = response.get_data(as_text=True)
+        return {
+            "status": response.status_code,
+            "headers": {
+                name: response.headers[name]
+                for name in RESPONSE_HEADERS
+                if name in response.headers
+            },
+            "body": body,
+        }
+
+
+@api.route("/batch", methods=["POST"])
+def batch():
+    data = request.get_json(silent=True)
+    subrequests = data.get("requests") if isinstance(data, dict) else data
+    if not isinstance(subrequests, list):
+        return bad_request("expected a list of requests")
+    limit = current_app.config["FLASK_BATCH_MAX_REQUESTS"]
+    if len(subrequests) > limit:
+        return bad_request("at most %d requests per batch" % limit)
+    for sub in subrequests:
+        if not isinstance(sub, dict) or not isinstance(sub.get("path"), str):
+            return bad_request("every request needs a path")
+        headers = sub.get("headers") or {}
+        # the keys of JSON objects are strings already
+        if not isinstance(headers, dict) or not all(
+            isinstance(value, str) for value in headers.values()
+        ):
+            return bad_request("request headers must be an object of strings")
+        sub["method"] = str(sub.get("method", "GET")).upper()
+    # kept referenced until the end of the batch, the identity map only holds
+    # weak references
+    g.batch_prefetched = _prefetch(subrequests)
+    return jsonify({"responses": [_dispatch(sub) for sub in subrequests]})
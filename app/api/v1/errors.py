@@ -23,6 +23,42 @@ def forbidden(message):
     return response
 
 
+def too_many_requests(message, retry_after=None):
+    response = jsonify({"error": "too many requests", "message": message})
+    response.status_code = 429
+    if retry_after:
+        response.headers["Retry-After"] = str(retry_after)
+    return response
+
+
+def not_found(message):
+    response = jsonify({"error": "not found", "message": message})
+    response.status_code = 404
+    return response
+
+
+def method_not_allowed(message):
+    response = jsonify({"error": "method not allowed", "message": message})
+    response.status_code = 405
+    return response
+
+
+def internal_server_error(message):
+    response = jsonify({"error": "internal server error", "message": message})
+    response.status_code = 500
+    return response
+
+
+def init_app_errors(app):
+    """
+    Application wide JSON error responses, used by the API-only profile where the
+    main blueprint and its HTML error pages are not registered.
+    """
+    app.register_error_handler(404, lambda e: not_found(e.description))
+    app.register_error_handler(405, lambda e: method_not_allowed(e.description))
+    app.register_error_handler(500, lambda e: internal_server_error(e.description))
+
+
 @api.errorhandler(ValidationError)
 def validation_error(e):
     return bad_request(e.args[0])
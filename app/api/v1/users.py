@@ -1,20 +1,91 @@
-from flask import current_app, g, jsonify, request, url_for
+import json
+import time
 
+from flask import (
+    Response,
+    current_app,
+    g,
+    jsonify,
+    request,
+    stream_with_context,
+    url_for,
+)
+
+from ... import changes, export, queries
+from ...exceptions import ValidationError
 from ...models import Permission, User, db
+from ...records import paginate_users, select_users, user_records
 from . import api
 from .decorators import permission_required
 
+# largest value of the Integer primary keys, larger ids overflow in the drivers
+MAX_ID = 2**31 - 1
+
+
+def _conditional(response):
+    """Tag a JSON response with an ETag and answer If-None-Match with a 304."""
+    response.add_etag()
+    return response.make_conditional(request)
+
+
+def _parse_ids(ids):
+    if isinstance(ids, str):
+        ids = [id for id in ids.split(",") if id.strip()]
+    if not isinstance(ids, list):
+        raise ValidationError("ids must be a list of user ids")
+    if not all(
+        type(id) is int or isinstance(id, str) and id.strip().isdecimal() for id in ids
+    ):
+        raise ValidationError("ids must be integers")
+    try:
+        ids = [int(id) for id in ids]
+    except ValueError:
+        # more digits than int() converts from a string
+        raise ValidationError("ids out of the range of user ids")
+    if not all(-MAX_ID - 1 <= id <= MAX_ID for id in ids):
+        raise ValidationError("ids out of the range of user ids")
+    limit = current_app.config["FLASK_USERS_MAX_IDS"]
+    if len(ids) > limit:
+        raise ValidationError("at most %d ids per request" % limit)
+    return list(dict.fromkeys(ids))
+
+
+def _users_by_id(ids):
+    ids = _parse_ids(ids)
+    found = queries.users(ids)
+    return _conditional(
+        jsonify(
+            {
+                "users": [found[id].to_json() for id in ids if id in found],
+                "missing": [id for id in ids if id not in found],
+            }
+        )
+    )
+
 
 @api.route("/users/")
 def get_users():
-    users = User.query.all()
+    """
+    All the users, or with "ids=1,2,3" those users in that order, and the ids
+    that match no user under "missing".
+    """
+    if "ids" in request.args:
+        return _users_by_id(request.args["ids"])
+    users = user_records(select_users())
     return jsonify({"users": [user.to_json() for user in users]})
 
 
-@api.route("/users/<int:id>")
+@api.route("/users/", methods=["POST"])
+def get_users_by_id():
+    """The same as GET /users/?ids=..., for lists too long for a URL: {"ids": [...]}."""
+    data = request.get_json(silent=True)
+    return _users_by_id(data.get("ids") if isinstance(data, dict) else data)
+
+
+@api.route("/users/<int(max=%d):id>" % MAX_ID)
 def get_user(id):
-    user = User.query.get_or_404(id)
-    return jsonify(user.to_json())
+    user = queries.user_or_404(id)
+    return _conditional(jsonify(user.to_json()))
 
 
 @api.route("/add_new_user/", methods=["POST"])
@@ -53,7 +124,7 @@ def new_user():
 def get_users_per_page():
     per_page = current_app.config["FLASK_USERS_PER_PAGE"]
     page = request.args.get("page", 1, type=int)
-    pagination = User.query.paginate(page, per_page=per_page, error_out=False)
+    pagination = paginate_users(select_users(), page, per_page)
     users = pagination.items
     prev = None
     if pagination.has_prev:
@@ -69,3 +140,96 @@ def get_users_per_page():
             "count": pagination.total,
         }
     )
+
+
+@api.route("/users/export")
+@permission_required(Permission.ADMIN)
+def export_users():
+    """
+    Streams all the users as CSV (the default), JSON lines or Parquet, given by
+    the "format" argument. "columns" selects a comma separated list of columns
+    and "gzip=1" compresses the file.
+    """
+    format = request.args.get("format", "csv")
+    gzip = request.args.get("gzip", "").lower() in ["true", "on", "1"]
+    columns = export.parse_columns(request.args.get("columns"))
+    chunks = export.export_users(format, columns, gzip)
+    mimetype = export.MIMETYPES[format]
+    if gzip and format != "parquet":
+        mimetype = "application/gzip"
+    return Response(
+        stream_with_context(chunks),
+        mimetype=mimetype,
+        headers={
+            "Content-Disposition": "attachment; filename="
+            + export.filename(format, gzip)
+        },
+    )
+
+
+def _event(change):
+    data = {
+        "id": change.row_id,
+        "op": change.op,
+        "url": url_for("api.get_user", id=change.row_id),
+        "changed_at": change.changed_at.isoformat(),
+    }
+    return "id: %d\nevent: %s\ndata: %s\n\n" % (change.id, change.op, json.dumps(data))
+
+
+@api.route("/users/changes")
+@permission_required(Permission.ADMIN)
+def user_changes():
+    """
+    Server-Sent Events stream of the inserted, updated and deleted users. With a
+    Last-Event-ID header (or a last_event_id argument) the changes since that
+    event are sent first, otherwise only the changes to come. The stream ends
+    after FLASK_CHANGES_STREAM_SECONDS, so that it does not hold a worker for
+    good; EventSource clients reconnect and resume on their own.
+    """
+    last_id = request.headers.get("Last-Event-ID", request.args.get("last_event_id"))
+    try:
+        last_id = int(last_id) if last_id is not None else None
+    except ValueError:
+        raise ValidationError("invalid Last-Event-ID")
+    # checked before the stream starts, which cannot answer with an error
+    if last_id is not None and not 0 <= last_id <= MAX_ID:
+        raise ValidationError("Last-Event-ID out of the range of event ids")
+    config = current_app.config
+    poll_interval = config["FLASK_CHANGES_POLL_INTERVAL"]
+    grace = config["FLASK_CHANGES_GAP_GRACE"]
+    deadline = time.monotonic() + config["FLASK_CHANGES_STREAM_SECONDS"]
+    hub = changes.hub()
+
+    def stream(last_id):
+        yield "retry: %d\n\n" % (poll_interval * 1000)
+        if last_id is None:
+            last_id = changes.start_id(grace)
+        elif changes.pruned_after(last_id, grace):
+            yield "event: reset\ndata: {}\n\n"
+        while True:
+            # anything published from now on wakes the wait below up
+            newest_id = hub.newest_id()
+            new = hub.since(last_id)
+            if not new:
+                new = changes.read(last_id, grace)
+                # no transaction and no connection are held while waiting
+                db.session.rollback()
+            for change in new:
+                last_id = change.id
+                if change.table_name == User.__tablename__:
+                    yield _event(change)
+            if time.monotonic() >= deadline:
+                return
+            if not new:
+                yield ": keep-alive\n\n"
+                hub.wait(
+                    max(last_id, newest_id),
+                    min(poll_interval, deadline - time.monotonic()),
+                )
+
+    return Response(
+        stream_with_context(stream(last_id)),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
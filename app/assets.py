@@ -0,0 +1,172 @@
+"""
+Fingerprinted and precompressed static assets.
+
+``flask assets build`` copies every file of the application static folder and
+of the Flask-Bootstrap static folder to static/dist/, with the first digits of
+the SHA-256 of its content added to the file name, and writes gzip (and brotli,
+if the brotli package is installed) variants of the compressible ones. A
+manifest maps the original names to the fingerprinted ones.
+
+When the manifest exists, url_for('static', filename=...) and
+url_for('bootstrap.static', filename=...) emit the fingerprinted URLs, and the
+files under dist/ are served with an immutable one year cache lifetime and the
+best precompressed variant the client accepts. Any change to a file changes its
+URL, so browsers never need to revalidate them.
+"""
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import posixpath
+import re
+import shutil
+
+from flask import current_app, request, send_from_directory
+
+DIST = "dist"
+MANIFEST = "manifest.json"
+
+# files that are already compressed gain nothing from gzip or brotli
+COMPRESSIBLE = {".css", ".js", ".map", ".svg", ".eot", ".ttf", ".html", ".txt"}
+
+_css_url_re = re.compile(r"""url\((['"]?)([^'")]+)\1\)""")
+_source_map_re = re.compile(r"(sourceMappingURL=)(\S+?)(\s|\*/|$)")
+
+
+def _sources(app):
+    """Yield (endpoint, folder) pairs of the static folders to fingerprint."""
+    yield "static", app.static_folder
+    bootstrap = app.blueprints.get("bootstrap")
+    if bootstrap is not None and bootstrap.static_folder:
+        yield "bootstrap.static", bootstrap.static_folder
+
+
+def _fingerprint(name, content):
+    stem, ext = posixpath.splitext(name)
+    return "%s.%s%s" % (stem, hashlib.sha256(content).hexdigest()[:12], ext)
+
+
+def _rewrite_references(name, content, names):
+    """Point the relative url() and source map references to fingerprinted names."""
+    base = posixpath.dirname(name)
+
+    def resolve(reference):
+        path, suffix = re.match(r"([^?#]*)(.*)", reference).groups()
+        if not path or ":" in path or path.startswith("/"):
+            return reference
+        target = posixpath.normpath(posixpath.join(base, path))
+        if target not in names:
+            return reference
+        return posixpath.relpath(names[target], base or ".") + suffix
+
+    text = content.decode("utf-8")
+    text = _css_url_re.sub(
+        lambda m: "url(%s%s%s)" % (m.group(1), resolve(m.group(2)), m.group(1)), text
+    )
+    text = _source_map_re.sub(
+        lambda m: m.group(1) + resolve(m.group(2)) + m.group(3), text
+    )
+    return text.encode("utf-8")
+
+
+def build(app):
+    """Write the fingerprinted assets and their manifest, return the manifest."""
+    try:
+        import brotli
+    except ImportError:
+        brotli = None
+
+    dist = os.path.join(app.static_folder, DIST)
+    shutil.rmtree(dist, ignore_errors=True)
+    manifest = {}
+    for endpoint, folder in _sources(app):
+        prefix = "" if endpoint == "static" else endpoint.split(".")[0] + "/"
+        files = {}
+        for root, dirs, filenames in os.walk(folder):
+            dirs[:] = [d for d in dirs if os.path.join(root, d) != dist]
+            for filename in filenames:
+                path = os.path.join(root, filename)
+                name = os.path.relpath(path, folder).replace(os.sep, "/")
+                with open(path, "rb") as f:
+                    files[name] = f.read()
+
+        # stylesheets and scripts refer to other files, so they are fingerprinted
+        # after the files they refer to have their final names
+        names = {}
+        referencing = [n for n in files if n.endswith((".css", ".js"))]
+        for name in [n for n in files if n not in referencing] + referencing:
+            content = files[name]
+            if name in referencing:
+                content = _rewrite_references(name, content, names)
+            names[name] = _fingerprint(name, content)
+            target = os.path.join(dist, prefix + names[name])
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            with open(target, "wb") as f:
+                f.write(content)
+            if posixpath.splitext(name)[1] in COMPRESSIBLE:
+                with open(target + ".gz", "wb") as f:
+                    f.write(gzip.compress(content, compresslevel=9, mtime=0))
+                if brotli is not None:
+                    with open(target + ".br", "wb") as f:
+                        f.write(brotli.compress(content))
+        manifest[endpoint] = {
+            name: "%s/%s%s" % (DIST, prefix, hashed) for name, hashed in names.items()
+        }
+
+    with open(os.path.join(dist, MANIFEST), "w") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    return manifest
+
+
+def _serve_dist(view):
+    """Wrap a static view so that files under dist/ are served precompressed."""
+
+    def serve(filename):
+        if not filename.startswith(DIST + "/"):
+            return view(filename=filename)
+        folder = current_app.static_folder
+        mimetype = mimetypes.guess_type(filename)[0] or "application/octet-stream"
+        encoding = None
+        for name, extension in (("br", ".br"), ("gzip", ".gz")):
+            if request.accept_encodings[name] and os.path.isfile(
+                os.path.join(folder, filename + extension)
+            ):
+                encoding = name
+                filename += extension
+                break
+        response = send_from_directory(
+            folder,
+            filename,
+            mimetype=mimetype,
+            max_age=current_app.config["FLASK_ASSETS_MAX_AGE"],
+        )
+        if encoding is not None:
+            response.headers["Content-Encoding"] = encoding
+        response.vary.add("Accept-Encoding")
+        response.cache_control.public = True
+        response.cache_control.immutable = True
+        return response
+
+    return serve
+
+
+def init_app(app):
+    """Serve the fingerprinted assets if `flask assets build` has been run."""
+    path = os.path.join(app.static_folder, DIST, MANIFEST)
+    if not os.path.exists(path):
+        return
+    with open(path) as f:
+        manifest = json.load(f)
+
+    @app.url_defaults
+    def fingerprinted_url(endpoint, values):
+        names = manifest.get(endpoint)
+        if names is not None:
+            filename = names.get(values.get("filename"))
+            if filename is not None:
+                values["filename"] = filename
+
+    for endpoint in manifest:
+        if endpoint in app.view_functions:
+            app.view_functions[endpoint] = _serve_dist(app.view_functions[endpoint])
@@ -1,8 +1,9 @@
 from flask import flash, redirect, render_template, request, url_for
 from flask_login import current_user, login_required, login_user, logout_user
 
-from .. import db
-from ..models import User
+from .. import db, queries
+from ..exceptions import TooManyRequests
+from ..ratelimit import login_throttle
 from . import auth
 from .forms import LoginForm
 
@@ -31,8 +32,15 @@ def unconfirmed():
 def login():
     form = LoginForm()
     if form.validate_on_submit():
-        user = User.query.filter_by(email=form.email.data).first()
-        if user is not None and user.verify_password(form.password.data):
+        user = queries.user_by_email(form.email.data)
+        try:
+            verified = login_throttle.check_password(
+                user, form.email.data, form.password.data, request.remote_addr
+            )
+        except TooManyRequests:
+            flash("Too many login attempts, please try again later.")
+            return render_template("auth/login.html", form=form), 429
+        if verified:
             # invoked to record the user as logged in for the user session
             login_user(user, form.remember_me.data)
             # Flask-Login will have saved original URL in next query string argument,
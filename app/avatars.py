@@ -0,0 +1,93 @@
+"""
+Identicons generated in-process from the avatar hash of a user, so that profile
+pictures do not depend on a third-party host.
+
+An identicon is a 5x5 grid mirrored around its vertical axis, in a colour taken
+from the hash, encoded as a PNG of the requested size. Generated images are
+content addressed by hash and size. Only the sizes the templates ask for are
+served, and only the identicons of existing users are written, once, to a
+directory shared by all the workers, so that requests for made-up hashes cannot
+fill the disk.
+"""
+import os
+import re
+import struct
+import tempfile
+import zlib
+
+GRID = 5
+# the sizes of the avatars in the templates, and the default of User.gravatar()
+SIZES = (18, 40, 100, 256)
+BACKGROUND = (240, 240, 240)
+
+_hash_re = re.compile(r"^[0-9a-f]{32}$")
+
+
+def valid_hash(hash):
+    return bool(_hash_re.match(hash))
+
+
+def fit_size(size):
+    """The smallest served size at least as large as size."""
+    for served in SIZES:
+        if served >= size:
+            return served
+    return SIZES[-1]
+
+
+def _png_chunk(kind, data):
+    chunk = kind + data
+    return struct.pack(">I", len(data)) + chunk + struct.pack(">I", zlib.crc32(chunk))
+
+
+def identicon(hash, size):
+    """Return the PNG image of the identicon of a 32 digit hex hash."""
+    digest = bytes.fromhex(hash)
+    colour = bytes((digest[0], digest[1], digest[2]))
+    background = bytes(BACKGROUND)
+    # the left three columns come from the hash, the right two mirror them
+    bits = int.from_bytes(digest[3:], "big")
+    cells = []
+    for row in range(GRID):
+        left = [(bits >> (row * 3 + col)) & 1 == 1 for col in range(3)]
+        cells.append(left + left[1::-1])
+
+    # every pixel row of a grid row is identical, so each one is built once
+    columns = [x * GRID // size for x in range(size)]
+    rows = []
+    for pattern in cells:
+        pixels = b"".join(colour if pattern[c] else background for c in columns)
+        rows.append(b"\0" + pixels)
+    raw = b"".join(rows[y * GRID // size] for y in range(size))
+
+    header = struct.pack(">IIBBBBB", size, size, 8, 2, 0, 0, 0)
+    return b"".join(
+        [
+            b"\x89PNG\r\n\x1a\n",
+            _png_chunk(b"IHDR", header),
+            _png_chunk(b"IDAT", zlib.compress(raw, 9)),
+            _png_chunk(b"IEND", b""),
+        ]
+    )
+
+
+class AvatarStore:
+    """On-disk cache of the generated identicons, keyed by hash and size."""
+
+    def __init__(self, directory):
+        self.directory = directory
+
+    def path(self, hash, size):
+        return os.path.join(self.directory, hash[:2], "%s-%d.png" % (hash, size))
+
+    def get(self, hash, size):
+        """Return the path of the identicon, generating it on first use."""
+        path = self.path(hash, size)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+            with os.fdopen(fd, "wb") as f:
+                f.write(identicon(hash, size))
+            # concurrent workers write identical bytes, the last rename wins
+            os.replace(tmp, path)
+        return path
@@ -0,0 +1,197 @@
+"""
+Online backfills.
+
+A backfill fills a column of an existing table in small batches, each one an
+UPDATE of a primary key range committed in its own short transaction, so the
+table is never locked for longer than one batch and the application keeps
+serving requests while it runs. The last primary key of every batch is saved
+in the backfill_checkpoints table in the same transaction, so an interrupted
+backfill resumes where it stopped.
+
+Migrations only add the columns (and their indexes, with
+create_index_online()); the backfills are registered next to the models and
+run by `flask backfill` once the new code is deployed.
+"""
+import time
+from datetime import datetime
+
+from sqlalchemy import bindparam, func, select, text
+
+from . import db
+
+backfill_checkpoints = db.Table(
+    "backfill_checkpoints",
+    db.Column("name", db.String(64), primary_key=True),
+    db.Column("last_key", db.BigInteger),
+    db.Column("rows", db.BigInteger, nullable=False, default=0),
+    db.Column("done", db.Boolean, nullable=False, default=False),
+    db.Column("updated_at", db.DateTime, nullable=False, default=datetime.utcnow),
+)
+
+# name -> Backfill, in registration order
+backfills = {}
+
+
+class Backfill:
+    """
+    Fill the rows of `table` matching `where`, either with the SQL expressions
+    of `values` (column name -> expression), or with the values returned by
+    `compute(row)` for the `columns` read from every row.
+    """
+
+    def __init__(
+        self,
+        name,
+        table,
+        values=None,
+        where=None,
+        compute=None,
+        columns=(),
+        batch_size=1000,
+    ):
+        if (values is None) == (compute is None):
+            raise ValueError("Give either values or compute")
+        self.name = name
+        self.table = table
+        self.values = values
+        self.where = where
+        self.compute = compute
+        self.columns = columns
+        self.batch_size = batch_size
+        (self.key,) = table.primary_key.columns
+
+    def _range(self, last):
+        if last is None:
+            return self.key.isnot(None)
+        return self.key > last
+
+    def next_bound(self, connection, last, batch_size):
+        """Return the greatest key of the next batch, or None when done."""
+        keys = select(self.key).where(self._range(last)).order_by(self.key)
+        upper = connection.execute(keys.offset(batch_size - 1).limit(1)).scalar()
+        if upper is None:
+            # last, incomplete batch
+            upper = connection.execute(
+                select(func.max(self.key)).where(self._range(last))
+            ).scalar()
+        return upper
+
+    def run_batch(self, connection, last, upper):
+        """Update the rows with a key in (last, upper], return their number."""
+        condition = self._range(last) & (self.key <= upper)
+        if self.where is not None:
+            condition &= self.where
+        if self.values is not None:
+            result = connection.execute(
+                self.table.update().where(condition).values(self.values)
+            )
+            return result.rowcount
+        rows = connection.execute(
+            select(self.key.label("_key"), *self.columns).where(condition)
+        ).fetchall()
+        updates = [dict(self.compute(row), _key=row._key) for row in rows]
+        if updates:
+            statement = self.table.update().where(self.key == bindparam("_key"))
+            names = [name for name in updates[0] if name != "_key"]
+            connection.execute(
+                statement.values({name: bindparam(name) for name in names}), updates
+            )
+        return len(updates)
+
+    def checkpoint(self, connection):
+        return connection.execute(
+            backfill_checkpoints.select().where(
+                backfill_checkpoints.c.name == self.name
+            )
+        ).first()
+
+    def run(self, engine, batch_size=None, sleep=0, progress=None):
+        """
+        Run or resume the backfill, sleeping `sleep` seconds between batches to
+        leave room for the regular traffic. `progress(rows, last_key)` is called
+        after every batch. Return the total number of updated rows.
+        """
+        batch_size = batch_size or self.batch_size
+        with engine.begin() as connection:
+            checkpoint = self.checkpoint(connection)
+            if checkpoint is None:
+                connection.execute(
+                    backfill_checkpoints.insert().values(name=self.name, rows=0)
+                )
+            elif checkpoint.done:
+                return checkpoint.rows
+        last = checkpoint.last_key if checkpoint is not None else None
+        total = checkpoint.rows if checkpoint is not None else 0
+
+        while True:
+            with engine.begin() as connection:
+                upper = self.next_bound(connection, last, batch_size)
+                if upper is not None:
+                    total += self.run_batch(connection, last, upper)
+                    last = upper
+                connection.execute(
+                    backfill_checkpoints.update()
+                    .where(backfill_checkpoints.c.name == self.name)
+                    .values(
+                        last_key=last,
+                        rows=total,
+                        done=upper is None,
+                        updated_at=datetime.utcnow(),
+                    )
+                )
+            if upper is None:
+                return total
+            if progress is not None:
+                progress(total, last)
+            if sleep:
+                time.sleep(sleep)
+
+    def reset(self, engine):
+        """Forget the checkpoint, the next run starts from the first row."""
+        with engine.begin() as connection:
+            connection.execute(
+                backfill_checkpoints.delete().where(
+                    backfill_checkpoints.c.name == self.name
+                )
+            )
+
+
+def register(backfill):
+    backfills[backfill.name] = backfill
+    return backfill
+
+
+def create_index_online(connection, name, table, columns, unique=False):
+    """
+    Create an index without blocking the writes to the table where the database
+    supports it: CREATE INDEX CONCURRENTLY on PostgreSQL, an in-place ALTER
+    TABLE without lock on MySQL. SQLite has no online index build, the index is
+    created as usual, and skipped if it already exists.
+
+    In a migration pass op.get_bind(). On PostgreSQL the index cannot be
+    created inside the migration transaction, wrap the call in
+    op.get_context().autocommit_block().
+    """
+    dialect = connection.dialect.name
+    quote = connection.dialect.identifier_preparer.quote
+    index = "%sINDEX %s" % ("UNIQUE " if unique else "", quote(name))
+    column_list = ", ".join(quote(column) for column in columns)
+    if dialect == "postgresql":
+        statement = "CREATE %s ON %s (%s)" % (
+            index.replace("INDEX", "INDEX CONCURRENTLY IF NOT EXISTS", 1),
+            quote(table),
+            column_list,
+        )
+    elif dialect == "mysql":
+        statement = "ALTER TABLE %s ADD %s (%s), ALGORITHM=INPLACE, LOCK=NONE" % (
+            quote(table),
+            index,
+            column_list,
+        )
+    else:
+        statement = "CREATE %s ON %s (%s)" % (
+            index.replace("INDEX", "INDEX IF NOT EXISTS", 1),
+            quote(table),
+            column_list,
+        )
+    connection.execute(text(statement))
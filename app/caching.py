@@ -0,0 +1,110 @@
+import threading
+import time
+
+from flask import current_app, has_app_context
+
+from . import db
+
+# Version counters of the process-wide caches. A counter is bumped in the same
+# transaction that changes the cached rows, so every worker process notices the
+# change the next time it checks the counter.
+cache_versions = db.Table(
+    "cache_versions",
+    db.Column("name", db.String(64), primary_key=True),
+    db.Column("version", db.Integer, nullable=False, default=0),
+)
+
+# mapped class -> names of the caches that depend on its rows
+_watched_models = {}
+
+
+class VersionedCache:
+    """
+    A value built from the database once per process and rebuilt only when the
+    version counter of the cache changes. The counter is read at most once every
+    FLASK_CACHE_VERSION_TTL seconds, and changes committed by this process
+    invalidate the value immediately.
+
+    The value is kept in app.extensions, so every application instance (and in
+    the unit tests every fresh database) gets its own copy.
+    """
+
+    def __init__(self, name, loader):
+        self.name = name
+        self.loader = loader
+        self._lock = threading.Lock()
+
+    def _states(self):
+        return current_app.extensions.setdefault("versioned_caches", {})
+
+    def get(self):
+        states = self._states()
+        state = states.get(self.name)
+        now = time.monotonic()
+        if state is not None and now - state[2] < current_app.config.get(
+            "FLASK_CACHE_VERSION_TTL", 5
+        ):
+            return state[1]
+        with self._lock:
+            version = self.version()
+            if state is None or state[0] != version:
+                state = (version, self.loader(), now)
+            else:
+                state = (version, state[1], now)
+            states[self.name] = state
+        return state[1]
+
+    def version(self):
+        return (
+            db.session.execute(
+                db.select(cache_versions.c.version).where(
+                    cache_versions.c.name == self.name
+                )
+            ).scalar()
+            or 0
+        )
+
+    def invalidate(self):
+        self._states().pop(self.name, None)
+
+
+def bump_version(connection, name):
+    """Increment the version counter of a cache inside the current transaction."""
+    result = connection.execute(
+        cache_versions.update()
+        .where(cache_versions.c.name == name)
+        .values(version=cache_versions.c.version + 1)
+    )
+    if result.rowcount == 0:
+        connection.execute(cache_versions.insert().values(name=name, version=1))
+
+
+def watch_model(model, name):
+    """Bump the version of cache name whenever instances of model are flushed."""
+    _watched_models.setdefault(model, set()).add(name)
+
+
+@db.event.listens_for(db.session, "after_flush")
+def _bump_watched_caches(session, flush_context):
+    names = set()
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        names.update(_watched_models.get(type(obj), ()))
+    if names:
+        connection = session.connection()
+        for name in sorted(names):
+            bump_version(connection, name)
+        session.info.setdefault("bumped_caches", set()).update(names)
+
+
+@db.event.listens_for(db.session, "after_commit")
+def _invalidate_bumped_caches(session):
+    names = session.info.pop("bumped_caches", None)
+    if names and has_app_context():
+        states = current_app.extensions.get("versioned_caches", {})
+        for name in names:
+            states.pop(name, None)
+
+
+@db.event.listens_for(db.session, "after_rollback")
+def _forget_bumped_caches(session):
+    session.info.pop("bumped_caches", None)
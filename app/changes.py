@@ -0,0 +1,228 @@
+"""
+Change log of the models, read by the Server-Sent Events change feeds.
+
+log_changes() registers after_insert, after_update and after_delete listeners
+on a model that add a row to the change_log table within the flush, so a change
+and its log entry are committed or rolled back together. The id of the entry is
+the id of the event, which clients send back in the Last-Event-ID header to
+resume where they stopped.
+
+Once committed, the entries are also published to the ChangeHub of the
+application, which wakes the feeds of this process up right away and hands them
+the entries from memory when it has all of them since the last one a feed sent.
+Otherwise, and at least every FLASK_CHANGES_POLL_INTERVAL seconds for the
+changes committed by other processes, the feeds read the table.
+
+Ids are handed out when the entries are inserted, not when they are committed:
+on MySQL or PostgreSQL a slow transaction can commit entry N after a feed has
+read N + 1. A feed therefore never moves past a missing id until the entry after
+it is FLASK_CHANGES_GAP_GRACE seconds old, after which the missing entry is
+taken for rolled back.
+"""
+import threading
+from collections import deque
+from datetime import datetime, timedelta
+
+from flask import current_app, has_app_context
+from sqlalchemy import select
+from sqlalchemy.orm import object_session
+
+from . import db
+
+change_log = db.Table(
+    "change_log",
+    db.Column("id", db.Integer, primary_key=True),
+    db.Column("table_name", db.String(64), nullable=False),
+    db.Column("row_id", db.Integer, nullable=False),
+    db.Column("op", db.String(8), nullable=False),
+    db.Column("changed_at", db.DateTime, nullable=False, default=datetime.utcnow),
+    # without AUTOINCREMENT SQLite reuses the ids of the pruned entries, which
+    # clients resuming from them would never see
+    sqlite_autoincrement=True,
+)
+
+# mapped class -> function telling whether the changes of a dirty instance are
+# worth an event
+_logged_models = {}
+
+
+class Change:
+    __slots__ = ("id", "table_name", "row_id", "op", "changed_at")
+
+    def __init__(self, id, table_name, row_id, op, changed_at):
+        self.id = id
+        self.table_name = table_name
+        self.row_id = row_id
+        self.op = op
+        self.changed_at = changed_at
+
+
+class ChangeHub:
+    """The last committed changes of a process, and the feeds waiting for them."""
+
+    def __init__(self, size=1000):
+        self._changes = deque(maxlen=size)
+        self._condition = threading.Condition()
+
+    def publish(self, changes):
+        with self._condition:
+            self._changes.extend(sorted(changes, key=lambda change: change.id))
+            self._condition.notify_all()
+
+    def since(self, last_id):
+        """
+        The changes after last_id, if the hub has all of them, else None. Ids
+        missing in between may belong to changes of other processes.
+        """
+        with self._condition:
+            changes = [change for change in self._changes if change.id > last_id]
+        expected = last_id + 1
+        for change in changes:
+            if change.id != expected:
+                return None
+            expected += 1
+        return changes
+
+    def newest_id(self):
+        with self._condition:
+            return self._changes[-1].id if self._changes else 0
+
+    def wait(self, last_id, timeout):
+        """Wait until a change after last_id is published or the timeout expires."""
+        with self._condition:
+            self._condition.wait_for(
+                lambda: self._changes and self._changes[-1].id > last_id, timeout
+            )
+
+
+def hub():
+    return current_app.extensions.setdefault("change_hub", ChangeHub())
+
+
+def log_changes(model, changed=None):
+    """
+    Log the inserts, deletes and updates of model instances. changed(instance)
+    can leave out updates that nobody needs to hear about.
+    """
+    _logged_models[model] = changed
+    db.event.listen(model, "after_insert", _log("insert"))
+    db.event.listen(model, "after_update", _log("update"))
+    db.event.listen(model, "after_delete", _log("delete"))
+
+
+def _log(op):
+    def listener(mapper, connection, target):
+        changed = _logged_models[type(target)]
+        if op == "update" and changed is not None and not changed(target):
+            return
+        values = dict(
+            table_name=mapper.persist_selectable.name,
+            row_id=target.id,
+            op=op,
+            changed_at=datetime.utcnow(),
+        )
+        result = connection.execute(change_log.insert().values(**values))
+        (id,) = result.inserted_primary_key
+        session = object_session(target)
+        session.info.setdefault("changes", []).append(Change(id, **values))
+
+    return listener
+
+
+def log_inserted(connection, table, ids):
+    """Log the rows of table inserted without the ORM, given a SELECT of their ids."""
+    connection.execute(
+        change_log.insert().from_select(
+            ["table_name", "row_id", "op", "changed_at"],
+            select(
+                db.literal(table.name),
+                ids.subquery().c[0],
+                db.literal("insert"),
+                db.literal(datetime.utcnow()),
+            ),
+        )
+    )
+
+
+def _settled(grace):
+    """Entries inserted before this time are committed or rolled back for good."""
+    return datetime.utcnow() - timedelta(seconds=grace)
+
+
+def read(last_id, grace, limit=500):
+    """
+    The logged changes after last_id, oldest first, up to the first missing id
+    that may still be committed: one followed by an entry younger than grace
+    seconds.
+    """
+    rows = db.session.execute(
+        select(change_log)
+        .where(change_log.c.id > last_id)
+        .order_by(change_log.c.id)
+        .limit(limit)
+    )
+    settled = _settled(grace)
+    changes = []
+    for row in rows:
+        change = Change(*row)
+        if change.id != last_id + 1 and change.changed_at > settled:
+            break
+        changes.append(change)
+        last_id = change.id
+    return changes
+
+
+def start_id(grace, limit=500):
+    """
+    Where a feed starts when it is not given a Last-Event-ID: after the last
+    entry, unless a missing id before it may still be committed.
+    """
+    newest = db.session.execute(
+        select(change_log.c.id, change_log.c.changed_at)
+        .order_by(change_log.c.id.desc())
+        .limit(limit)
+    ).all()
+    if not newest:
+        return 0
+    settled = _settled(grace)
+    start = newest[-1].id - 1
+    for id, changed_at in newest:
+        if changed_at <= settled:
+            start = id
+            break
+    changes = read(start, grace, limit)
+    return changes[-1].id if changes else start
+
+
+def pruned_after(last_id, grace):
+    """True if entries after last_id have been deleted by prune()."""
+    first = db.session.execute(
+        select(change_log.c.id, change_log.c.changed_at)
+        .order_by(change_log.c.id)
+        .limit(1)
+    ).first()
+    return (
+        first is not None
+        and first.id > last_id + 1
+        and first.changed_at <= _settled(grace)
+    )
+
+
+def prune(connection, days):
+    """Delete the entries older than days, return their number."""
+    before = datetime.utcnow() - timedelta(days=days)
+    return connection.execute(
+        change_log.delete().where(change_log.c.changed_at < before)
+    ).rowcount
+
+
+@db.event.listens_for(db.session, "after_commit")
+def _publish_changes(session):
+    changes = session.info.pop("changes", None)
+    if changes and has_app_context():
+        hub().publish(changes)
+
+
+@db.event.listens_for(db.session, "after_rollback")
+def _forget_changes(session):
+    session.info.pop("changes", None)
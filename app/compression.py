@@ -0,0 +1,142 @@
+"""
+WSGI middleware compressing responses on the fly.
+
+The encoding is negotiated from the Accept-Encoding header among brotli (when
+the brotli package is installed), gzip and deflate. Responses with a known
+Content-Length smaller than the configured minimum, responses that already
+have a Content-Encoding (the precompressed static assets) and content types
+without a configured level are passed through untouched. Other responses are
+compressed chunk by chunk as the application yields them, and responses of
+unknown length (streamed from a generator) are flushed after every chunk so
+clients receive the data as soon as it is produced.
+
+The compressed body is a different representation than the one the application
+tagged, so a strong ETag is made weak: it still answers If-None-Match, but no
+longer If-Match or Range requests, which need the exact bytes.
+"""
+import zlib
+
+from werkzeug.datastructures import Headers
+from werkzeug.http import parse_accept_header, parse_etags, unquote_etag
+
+# zlib window bits producing the gzip and the zlib ("deflate" in HTTP) formats
+WBITS = {"gzip": 16 + zlib.MAX_WBITS, "deflate": zlib.MAX_WBITS}
+
+
+class _Brotli:
+    """zlib-like interface to a brotli compressor."""
+
+    def __init__(self, brotli, level):
+        self._compressor = brotli.Compressor(quality=min(level, 11))
+
+    def compress(self, data):
+        return self._compressor.process(data)
+
+    def flush(self, mode=zlib.Z_FINISH):
+        if mode == zlib.Z_FINISH:
+            return self._compressor.finish()
+        return self._compressor.flush()
+
+
+class CompressionMiddleware:
+    def __init__(self, app, levels, min_size=500):
+        """
+        `levels` maps content types (without parameters) to a compression level
+        from 1 to 9, which is also used as the brotli quality.
+        """
+        self.app = app
+        self.levels = levels
+        self.min_size = min_size
+        try:
+            import brotli
+        except ImportError:
+            brotli = None
+        self.brotli = brotli
+        self.encodings = ["br", "gzip", "deflate"] if brotli else ["gzip", "deflate"]
+
+    def negotiate(self, environ):
+        """Return the preferred encoding accepted by the client, or None."""
+        accept = parse_accept_header(environ.get("HTTP_ACCEPT_ENCODING"))
+        best, best_quality = None, 0
+        for encoding in self.encodings:
+            quality = accept[encoding]
+            if quality > best_quality:
+                best, best_quality = encoding, quality
+        return best
+
+    def compressor(self, encoding, level):
+        if encoding == "br":
+            return _Brotli(self.brotli, level)
+        return zlib.compressobj(level, zlib.DEFLATED, WBITS[encoding])
+
+    def revalidates_compressed(self, environ, etag):
+        """
+        True if the client sent the weak form of etag, the one it got with a
+        compressed body. The content type of a 304 is not that of the body.
+        """
+        tag, _ = unquote_etag(etag)
+        return parse_etags(environ.get("HTTP_IF_NONE_MATCH")).is_weak(tag)
+
+    def level(self, status, headers):
+        """Return the compression level of a response, or None to pass it through."""
+        if status[:3] in ("204", "206", "304") or "Content-Encoding" in headers:
+            return None
+        length = headers.get("Content-Length", type=int)
+        if length is not None and length < self.min_size:
+            return None
+        content_type = headers.get("Content-Type", "").split(";")[0].strip().lower()
+        return self.levels.get(content_type)
+
+    def __call__(self, environ, start_response):
+        encoding = None
+        if environ["REQUEST_METHOD"] != "HEAD":
+            encoding = self.negotiate(environ)
+        if encoding is None:
+            return self.app(environ, start_response)
+
+        state = {}
+
+        def compressing_start_response(status, headers, exc_info=None):
+            # applications calling start_response only once iterated are passed
+            # through, their body can no longer be wrapped
+            if "returned" in state:
+                return start_response(status, headers, exc_info)
+            headers = Headers(headers)
+            level = self.level(status, headers)
+            if level is not None:
+                state["compressor"] = self.compressor(encoding, level)
+                state["streaming"] = "Content-Length" not in headers
+                del headers["Content-Length"]
+                headers["Content-Encoding"] = encoding
+            etag = headers.get("ETag")
+            if etag and not etag.startswith("W/"):
+                if level is not None:
+                    headers["ETag"] = "W/" + etag
+                elif status[:3] == "304" and self.revalidates_compressed(environ, etag):
+                    # a 304 stands for the compressed response the client has
+                    headers["ETag"] = "W/" + etag
+            vary = headers.get("Vary")
+            if not vary:
+                headers["Vary"] = "Accept-Encoding"
+            elif "accept-encoding" not in vary.lower():
+                headers["Vary"] = vary + ", Accept-Encoding"
+            return start_response(status, headers.to_wsgi_list(), exc_info)
+
+        iterable = self.app(environ, compressing_start_response)
+        state["returned"] = True
+        if "compressor" not in state:
+            return iterable
+        return self.compress(iterable, state["compressor"], state["streaming"])
+
+    def compress(self, iterable, compressor, streaming):
+        try:
+            for chunk in iterable:
+                data = compressor.compress(chunk)
+                if streaming and chunk:
+                    data += compressor.flush(zlib.Z_SYNC_FLUSH)
+                if data:
+                    yield data
+            yield compressor.flush()
+        finally:
+            if hasattr(iterable, "close"):
+                iterable.close()
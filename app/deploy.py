@@ -0,0 +1,183 @@
+"""
+Idempotent deployment.
+
+`flask deploy` stores a fingerprint of the schema (the migration scripts and
+the DDL of the models) and the version of the seed data in the deploy_state table.
+When a container restarts with the same code both match, and the deployment is
+reduced to reading that table: alembic is not loaded, the roles are not
+re-seeded and no password is hashed.
+
+The deployment runs under a database-wide advisory lock, so replicas starting
+together wait for the first one instead of migrating concurrently, and then
+find the database up to date.
+"""
+import hashlib
+import os
+from contextlib import contextmanager
+
+from flask import current_app
+from sqlalchemy import inspect, text
+from sqlalchemy.schema import CreateIndex, CreateTable
+
+from . import db
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+# Increment when the data created by seed() changes, so that it runs again on
+# the next deployment.
+SEED_VERSION = 1
+
+LOCK_NAME = "flasky-deploy"
+
+# The first migration describes the schema of the application from before the
+# migrations were tracked, plus the two tables added alongside it.
+BASELINE_REVISION = "4398540774d1"
+BASELINE_NEW_TABLES = ("cache_versions", "deploy_state")
+
+deploy_state = db.Table(
+    "deploy_state",
+    db.Column("name", db.String(64), primary_key=True),
+    db.Column("value", db.String(128), nullable=False),
+)
+
+
+def _migrations_directory():
+    migrate = current_app.extensions.get("migrate")
+    if migrate is not None:
+        return migrate.directory
+    return os.path.join(os.path.dirname(current_app.root_path), "migrations")
+
+
+def schema_fingerprint(engine):
+    """
+    Hash of the migration scripts and of the DDL of the models. The scripts are
+    hashed as files, so that checking the fingerprint does not load alembic.
+    """
+    digest = hashlib.sha256()
+    versions = os.path.join(_migrations_directory(), "versions")
+    if os.path.isdir(versions):
+        for filename in sorted(os.listdir(versions)):
+            if filename.endswith(".py"):
+                with open(os.path.join(versions, filename), "rb") as f:
+                    digest.update(filename.encode() + b"\n" + f.read())
+    for table in db.metadata.sorted_tables:
+        ddl = [CreateTable(table)]
+        ddl += [CreateIndex(index) for index in sorted(table.indexes, key=str)]
+        for statement in ddl:
+            digest.update(str(statement.compile(dialect=engine.dialect)).encode())
+    return digest.hexdigest()
+
+
+@contextmanager
+def advisory_lock(engine, name=LOCK_NAME):
+    """Hold a lock shared by all the processes deploying to the database."""
+    dialect = engine.dialect.name
+    if dialect == "postgresql":
+        key = int.from_bytes(hashlib.sha256(name.encode()).digest()[:8], "big")
+        key -= 1 << 63
+        with engine.connect() as connection:
+            connection.execute(text("SELECT pg_advisory_lock(:key)"), {"key": key})
+            try:
+                yield
+            finally:
+                connection.execute(
+                    text("SELECT pg_advisory_unlock(:key)"), {"key": key}
+                )
+    elif dialect == "mysql":
+        with engine.connect() as connection:
+            connection.execute(text("SELECT GET_LOCK(:name, -1)"), {"name": name})
+            try:
+                yield
+            finally:
+                connection.execute(text("SELECT RELEASE_LOCK(:name)"), {"name": name})
+    else:
+        # SQLite has no advisory locks, lock a file next to the database instead
+        database = engine.url.database
+        if fcntl is None or not database or database == ":memory:":
+            yield
+            return
+        with open(database + ".deploy-lock", "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def read_state(engine):
+    if not inspect(engine).has_table(deploy_state.name):
+        return {}
+    with engine.connect() as connection:
+        return dict(connection.execute(deploy_state.select()).fetchall())
+
+
+def write_state(state):
+    db.session.execute(deploy_state.delete())
+    db.session.execute(
+        deploy_state.insert(),
+        [{"name": name, "value": value} for name, value in state.items()],
+    )
+    db.session.commit()
+
+
+def migrate(engine):
+    from flask_migrate import stamp, upgrade
+
+    tables = inspect(engine).get_table_names()
+    if "alembic_version" in tables:
+        upgrade()
+    elif tables:
+        # databases created with db.create_all() before the migrations were
+        # tracked are at the first revision, the later ones add to their tables
+        for name in BASELINE_NEW_TABLES:
+            db.metadata.tables[name].create(engine, checkfirst=True)
+        stamp(revision=BASELINE_REVISION)
+        upgrade()
+    else:
+        # new databases are created from the models and marked as up to date
+        db.create_all()
+        stamp()
+
+
+def seed():
+    """Create the roles and the administrator account."""
+    from .models import Role, User
+
+    Role.insert_roles()
+    if User.query.filter_by(email="vaibhav@example.com").first() is None:
+        db.session.add(
+            User(
+                email="vaibhav@example.com",
+                username="vaibhav",
+                password="admin123",
+                confirmed=True,
+                name="Vaibhav",
+                location="India",
+                about_me="Sr Data Scientist",
+            )
+        )
+        db.session.commit()
+
+
+def run(force=False):
+    """
+    Bring the database up to date, return the names of the steps that ran,
+    "schema" and "seed", or an empty list when there was nothing to do.
+    """
+    engine = db.engine
+    with advisory_lock(engine):
+        state = read_state(engine)
+        fingerprint = schema_fingerprint(engine)
+        steps = []
+        if force or state.get("schema") != fingerprint:
+            migrate(engine)
+            steps.append("schema")
+        if force or state.get("seed") != str(SEED_VERSION):
+            seed()
+            steps.append("seed")
+        if steps:
+            write_state({"schema": fingerprint, "seed": str(SEED_VERSION)})
+        return steps
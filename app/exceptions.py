@@ -1,2 +1,8 @@
 class ValidationError(ValueError):
     pass
+
+
+class TooManyRequests(Exception):
+    def __init__(self, message, retry_after=None):
+        super(TooManyRequests, self).__init__(message)
+        self.retry_after = retry_after
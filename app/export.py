@@ -0,0 +1,164 @@
+"""
+Bulk export of the users table, for `flask export-users` and the admin API.
+
+The rows are read with a server-side cursor (stream_results), in batches of
+batch_size, and each batch is encoded and handed over before the next one is
+fetched, so exports of millions of rows run in constant memory. The formats
+are CSV, JSON lines and Parquet, the latter when pyarrow is installed. CSV and
+JSON lines can be gzipped, Parquet is compressed per column chunk instead.
+"""
+import csv
+import io
+import json
+import zlib
+
+from sqlalchemy import Boolean, DateTime, Integer
+
+from . import db
+from .exceptions import ValidationError
+from .models import User
+from .records import UserRecord
+
+FORMATS = ("csv", "jsonl", "parquet")
+# the version of the cached fragments is not worth exporting
+COLUMNS = tuple(name for name in UserRecord._fields if name != "version")
+
+MIMETYPES = {
+    "csv": "text/csv",
+    "jsonl": "application/x-ndjson",
+    "parquet": "application/vnd.apache.parquet",
+}
+
+
+def parse_columns(names):
+    """Columns of a comma separated list, or all of them for an empty one."""
+    if not names:
+        return COLUMNS
+    columns = tuple(name.strip() for name in names.split(",") if name.strip())
+    unknown = [name for name in columns if name not in COLUMNS]
+    if unknown:
+        raise ValidationError("unknown columns: %s" % ", ".join(unknown))
+    return columns
+
+
+def filename(format, gzip=False):
+    return "users.%s%s" % (format, ".gz" if gzip and format != "parquet" else "")
+
+
+def batches(columns=COLUMNS, batch_size=1000):
+    """The rows of the users table, in id order, as lists of tuples."""
+    table = User.__table__
+    statement = db.select(*[table.c[name] for name in columns]).order_by(table.c.id)
+    result = db.session.execute(statement, execution_options={"stream_results": True})
+    try:
+        for partition in result.partitions(batch_size):
+            yield [tuple(row) for row in partition]
+    finally:
+        result.close()
+
+
+def _csv(columns, rows):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    yield buffer.getvalue().encode("utf-8")
+    for batch in rows:
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerows(batch)
+        yield buffer.getvalue().encode("utf-8")
+
+
+def _json_value(value):
+    return value.isoformat() if hasattr(value, "isoformat") else value
+
+
+def _jsonl(columns, rows):
+    for batch in rows:
+        yield "".join(
+            json.dumps(dict(zip(columns, map(_json_value, row)))) + "\n"
+            for row in batch
+        ).encode("utf-8")
+
+
+class _Sink(io.RawIOBase):
+    """Write-only file collecting what pyarrow writes until it is drained."""
+
+    def __init__(self):
+        self.chunks = []
+        self.position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def drain(self):
+        data = b"".join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def _pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError:
+        raise ValidationError("the parquet format requires the pyarrow package")
+    return pyarrow, pyarrow.parquet
+
+
+def _parquet(pa, pq, columns, rows, compression):
+    def arrow_type(column):
+        if isinstance(column.type, Integer):
+            return pa.int64()
+        if isinstance(column.type, Boolean):
+            return pa.bool_()
+        if isinstance(column.type, DateTime):
+            return pa.timestamp("us")
+        return pa.string()
+
+    table = User.__table__
+    schema = pa.schema([(name, arrow_type(table.c[name])) for name in columns])
+    sink = _Sink()
+    # one row group per batch, written out before the next batch is read
+    with pq.ParquetWriter(sink, schema, compression=compression) as writer:
+        for batch in rows:
+            writer.write_table(
+                pa.Table.from_pylist(
+                    [dict(zip(columns, row)) for row in batch], schema=schema
+                )
+            )
+            yield sink.drain()
+    yield sink.drain()
+
+
+def _gzip(chunks):
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def export_users(format="csv", columns=COLUMNS, gzip=False, batch_size=1000):
+    """
+    Iterator over the bytes of an export of the users. The rows are only read as
+    it is consumed, within the application context it is consumed in.
+    """
+    if format not in FORMATS:
+        raise ValidationError("unknown format: %s" % format)
+    if format == "parquet":
+        pa, pq = _pyarrow()
+        compression = "gzip" if gzip else "snappy"
+        return _parquet(pa, pq, columns, batches(columns, batch_size), compression)
+    rows = batches(columns, batch_size)
+    chunks = _csv(columns, rows) if format == "csv" else _jsonl(columns, rows)
+    return _gzip(chunks) if gzip else chunks
@@ -0,0 +1,207 @@
+import hashlib
+import os
+import shutil
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
+from flask import current_app, has_app_context
+from jinja2 import nodes
+from jinja2.ext import Extension
+from markupsafe import Markup
+
+from . import db
+
+# mapped class -> function telling whether a dirty instance changed anything
+# that is rendered in a fragment
+_tagged_models = {}
+
+
+def tag_for(obj):
+    """Invalidation tag of the fragments that render a model instance."""
+    return "%s-%s" % (obj.__tablename__, obj.id)
+
+
+class FragmentCache:
+    """
+    Rendered template fragments, tagged with the object they display.
+
+    The first tier is an in-memory LRU bounded by max_bytes, local to the
+    process. When a directory is given, fragments are also written there, one
+    sub-directory per tag, so worker processes share them and survive restarts.
+    Entries of both tiers expire after ttl seconds, and invalidating a tag drops
+    every fragment of that object from both tiers.
+    """
+
+    def __init__(self, max_bytes, ttl, directory=None):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.directory = directory
+        self.size = 0
+        self._entries = OrderedDict()  # key -> (value, size, expires, tag)
+        self._tags = {}  # tag -> keys
+        self._lock = threading.Lock()
+
+    def _path(self, key, tag):
+        digest = hashlib.sha1(key.encode("utf-8")).hexdigest()
+        return os.path.join(self.directory, tag, digest + ".html")
+
+    def get(self, key, tag):
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[2] > now:
+                    self._entries.move_to_end(key)
+                    return entry[0]
+                self._remove(key)
+        if self.directory is None:
+            return None
+        path = self._path(key, tag)
+        try:
+            if os.path.getmtime(path) + self.ttl <= now:
+                return None
+            with open(path, encoding="utf-8") as f:
+                value = f.read()
+        except OSError:
+            return None
+        self._store(key, tag, value, now)
+        return value
+
+    def set(self, key, tag, value):
+        self._store(key, tag, value, time.time())
+        if self.directory is not None:
+            path = self._path(key, tag)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                f.write(value)
+            os.replace(tmp, path)
+
+    def _store(self, key, tag, value, now):
+        size = len(value.encode("utf-8"))
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (value, size, now + self.ttl, tag)
+            self._tags.setdefault(tag, set()).add(key)
+            self.size += size
+            while self.size > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+
+    def _remove(self, key):
+        value, size, expires, tag = self._entries.pop(key)
+        self.size -= size
+        keys = self._tags.get(tag)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._tags[tag]
+
+    def invalidate(self, tag):
+        with self._lock:
+            for key in list(self._tags.get(tag, ())):
+                self._remove(key)
+        if self.directory is not None:
+            shutil.rmtree(os.path.join(self.directory, tag), ignore_errors=True)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._tags.clear()
+            self.size = 0
+        if self.directory is not None:
+            shutil.rmtree(self.directory, ignore_errors=True)
+
+
+class FragmentCacheExtension(Extension):
+    """
+    Adds the {% cache %} tag to the templates:
+
+        {% cache "profile-about", user, user.last_seen %}
+            ...
+        {% endcache %}
+
+    The first argument names the fragment and the second is the model instance it
+    renders, which gives the key and the invalidation tag. Any further arguments
+    are version stamps that become part of the key, such as values the fragment
+    displays that change without going through the invalidation events.
+    """
+
+    tags = {"cache"}
+
+    def parse(self, parser):
+        lineno = next(parser.stream).lineno
+        args = [parser.parse_expression()]
+        while parser.stream.skip_if("comma"):
+            args.append(parser.parse_expression())
+        body = parser.parse_statements(["name:endcache"], drop_needle=True)
+        return nodes.CallBlock(
+            self.call_method("_render", [nodes.List(args)]), [], [], body
+        ).set_lineno(lineno)
+
+    def _render(self, args, caller):
+        cache = current_app.extensions.get("fragment_cache")
+        if cache is None:
+            return caller()
+        tag = tag_for(args[1])
+        key = "\x1f".join([args[0], tag] + [str(arg) for arg in args[2:]])
+        value = cache.get(key, tag)
+        if value is None:
+            value = str(caller())
+            cache.set(key, tag, value)
+        return Markup(value)
+
+
+def init_app(app):
+    """Register the {% cache %} tag, the cache itself is only created if enabled."""
+    app.jinja_env.add_extension(FragmentCacheExtension)
+    max_bytes = app.config.get("FLASK_FRAGMENT_CACHE_BYTES", 0)
+    if max_bytes:
+        app.extensions["fragment_cache"] = FragmentCache(
+            max_bytes,
+            app.config.get("FLASK_FRAGMENT_CACHE_TTL", 300),
+            app.config.get("FLASK_FRAGMENT_CACHE_DIR"),
+        )
+
+
+def tag_model(model, changed=None):
+    """
+    Invalidate the fragments that render a model instance when it is updated or
+    deleted. changed(instance) can tell apart updates that do
+    not affect any rendered fragment.
+    """
+    _tagged_models[model] = changed
+
+
+@db.event.listens_for(db.session, "after_flush")
+def _collect_changed_objects(session, flush_context):
+    tags = set()
+    for obj in session.dirty:
+        if type(obj) in _tagged_models:
+            changed = _tagged_models[type(obj)]
+            if changed is None or changed(obj):
+                tags.add(tag_for(obj))
+    for obj in session.deleted:
+        if type(obj) in _tagged_models:
+            tags.add(tag_for(obj))
+    if tags:
+        session.info.setdefault("changed_fragments", set()).update(tags)
+
+
+@db.event.listens_for(db.session, "after_commit")
+def _invalidate_changed_fragments(session):
+    tags = session.info.pop("changed_fragments", None)
+    if tags and has_app_context():
+        cache = current_app.extensions.get("fragment_cache")
+        if cache is not None:
+            for tag in tags:
+                cache.invalidate(tag)
+
+
+@db.event.listens_for(db.session, "after_rollback")
+def _forget_changed_fragments(session):
+    session.info.pop("changed_fragments", None)
@@ -0,0 +1,352 @@
+"""
+Bulk import of users, for `flask import-users`.
+
+The CSV or JSON lines input is read as a stream, in chunks that worker processes
+validate and complete (password hash, avatar hash, role) in parallel, with only
+a few chunks in flight at a time, so the memory used does not depend on the size
+of the input. The valid rows are then loaded in batches:
+
+- the emails and usernames of a batch already in the database are looked up
+  with two IN queries and those rows skipped, as are repeated rows of the batch
+  itself; the batches loaded before are in the database by then, so repeated
+  rows of the input are caught as well;
+- the rows left are inserted through the fastest path of the dialect: a
+  multi-row INSERT, LOAD DATA LOCAL INFILE on MySQL, and executemany() on
+  SQLite, where the whole import is a single transaction. On the other
+  databases every batch is committed on its own.
+
+The columns read are those of `flask export-users`, and its files can be
+imported as they are, plus "password" and "role", a role name. Ids and avatar
+hashes are not imported, other columns are ignored.
+"""
+import csv
+import gzip
+import hashlib
+import io
+import json
+import multiprocessing
+import os
+import re
+import sys
+import tempfile
+from collections import deque
+from datetime import datetime
+
+from email_validator import EmailNotValidError, validate_email
+from sqlalchemy import create_engine, select
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.pool import NullPool
+from werkzeug.security import generate_password_hash
+
+from . import changes
+from .models import User
+
+FORMATS = ("csv", "jsonl")
+USERNAME = re.compile(r"^[A-Za-z][A-Za-z0-9_.]*$")
+STRINGS = {"name": 64, "location": 64, "about_me": None}
+DATES = ("member_since", "last_seen")
+
+users = User.__table__
+
+
+class ImportStats:
+    def __init__(self):
+        self.read = 0
+        self.imported = 0
+        self.duplicates = 0
+        self.invalid = 0
+
+    def __repr__(self):
+        return "%d read, %d imported, %d duplicates, %d invalid" % (
+            self.read,
+            self.imported,
+            self.duplicates,
+            self.invalid,
+        )
+
+
+def read_records(f, format):
+    """The (line number, dict) of the records of a text file."""
+    if format == "csv":
+        reader = csv.DictReader(f)
+        for record in reader:
+            yield reader.line_num, record
+    else:
+        for line, text in enumerate(f, 1):
+            if text.strip():
+                try:
+                    record = json.loads(text)
+                except ValueError:
+                    record = "not valid JSON"
+                yield line, record
+
+
+def settings(app, roles):
+    """What the workers need to know to validate and complete a record."""
+    return {
+        "hash_method": app.config["FLASK_PASSWORD_HASH_METHOD"],
+        "admin_email": app.config["APP_ADMIN"],
+        "roles": {name: id for id, name in roles.names.items()},
+        "default_role_id": roles.default_id,
+    }
+
+
+def _boolean(value):
+    if isinstance(value, bool):
+        return value
+    text = str(value).strip().lower()
+    if text in ("1", "true", "yes", "on"):
+        return True
+    if text in ("", "0", "false", "no", "off"):
+        return False
+    raise ValueError("not a boolean: %s" % value)
+
+
+def validate(record, settings):
+    """The row to insert for a record, or raises TypeError or ValueError."""
+    if not isinstance(record, dict):
+        raise ValueError(record)
+    record = {key: value for key, value in record.items() if value not in ("", None)}
+    email = str(record.get("email", "")).strip()
+    username = str(record.get("username", "")).strip()
+    if not email or len(email) > 64:
+        raise ValueError("invalid email")
+    try:
+        validate_email(email, check_deliverability=False)
+    except EmailNotValidError as e:
+        raise ValueError("invalid email: %s" % e)
+    if len(username) > 64 or not USERNAME.match(username):
+        raise ValueError(
+            "usernames must have only letters, numbers, dots or underscores"
+        )
+    row = {
+        "email": email,
+        "username": username,
+        "confirmed": _boolean(record.get("confirmed", False)),
+        "avatar_hash": hashlib.md5(email.lower().encode("utf-8")).hexdigest(),
+        "password_hash": None,
+    }
+    for name, length in STRINGS.items():
+        value = record.get(name)
+        if value is not None and length is not None and len(str(value)) > length:
+            raise ValueError("%s longer than %d characters" % (name, length))
+        row[name] = None if value is None else str(value)
+    now = datetime.utcnow()
+    for name in DATES:
+        try:
+            row[name] = datetime.fromisoformat(record[name]) if name in record else now
+        except (TypeError, ValueError):
+            raise ValueError("invalid %s" % name)
+    if "role" in record:
+        if record["role"] not in settings["roles"]:
+            raise ValueError("unknown role: %s" % record["role"])
+        row["role_id"] = settings["roles"][record["role"]]
+    elif "role_id" in record:
+        if int(record["role_id"]) not in settings["roles"].values():
+            raise ValueError("unknown role id: %s" % record["role_id"])
+        row["role_id"] = int(record["role_id"])
+    elif email == settings["admin_email"]:
+        row["role_id"] = settings["roles"].get(
+            "Administrator", settings["default_role_id"]
+        )
+    else:
+        row["role_id"] = settings["default_role_id"]
+    if "password" in record:
+        # hashing is most of the work of the workers
+        row["password_hash"] = generate_password_hash(
+            str(record["password"]), settings["hash_method"]
+        )
+    return row
+
+
+_worker_settings = None
+
+
+def _init_worker(settings):
+    global _worker_settings
+    _worker_settings = settings
+
+
+def validate_chunk(chunk, settings=None):
+    """Validate (line, record) pairs, return (line, row, error) triples."""
+    settings = settings or _worker_settings
+    results = []
+    for line, record in chunk:
+        try:
+            results.append((line, validate(record, settings), None))
+        except (TypeError, ValueError) as e:
+            results.append((line, None, str(e)))
+    return results
+
+
+def _chunks(iterable, size):
+    chunk = []
+    for item in iterable:
+        chunk.append(item)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def validated(records, settings, processes=None, chunk_size=500):
+    """
+    Validate the records in worker processes, one per CPU by default, keeping
+    the order and at most two chunks per process in flight.
+    """
+    chunks = _chunks(records, chunk_size)
+    if processes == 1:
+        for chunk in chunks:
+            yield from validate_chunk(chunk, settings)
+        return
+    processes = processes or os.cpu_count()
+    context = multiprocessing.get_context("fork")
+    with context.Pool(processes, _init_worker, (settings,)) as pool:
+        pending = deque()
+        for chunk in chunks:
+            pending.append(pool.apply_async(validate_chunk, (chunk,)))
+            if len(pending) >= 2 * processes:
+                yield from pending.popleft().get()
+        while pending:
+            yield from pending.popleft().get()
+
+
+def _new_rows(connection, rows):
+    """The rows whose email and username are neither in the database nor repeated."""
+    taken_emails = set(
+        connection.execute(
+            select(users.c.email).where(users.c.email.in_([r["email"] for r in rows]))
+        ).scalars()
+    )
+    taken_usernames = set(
+        connection.execute(
+            select(users.c.username).where(
+                users.c.username.in_([r["username"] for r in rows])
+            )
+        ).scalars()
+    )
+    new = []
+    for row in rows:
+        if row["email"] in taken_emails or row["username"] in taken_usernames:
+            continue
+        taken_emails.add(row["email"])
+        taken_usernames.add(row["username"])
+        new.append(row)
+    return new
+
+
+def _executemany(connection, rows):
+    connection.execute(users.insert(), rows)
+
+
+def _multirow_insert(connection, rows):
+    connection.execute(users.insert().values(rows))
+
+
+def _mysql_value(value):
+    if value is None:
+        return "\\N"
+    if isinstance(value, bool):
+        return int(value)
+    if isinstance(value, datetime):
+        return value.isoformat(" ")
+    return str(value).replace("\\", "\\\\")
+
+
+def _load_data_infile(connection, rows):
+    columns = list(rows[0])
+    with tempfile.NamedTemporaryFile(
+        "w", suffix=".csv", encoding="utf-8", newline="", delete=False
+    ) as f:
+        writer = csv.writer(f, lineterminator="\n")
+        for row in rows:
+            writer.writerow([_mysql_value(row[column]) for column in columns])
+    try:
+        connection.exec_driver_sql(
+            "LOAD DATA LOCAL INFILE %%s INTO TABLE %s CHARACTER SET utf8mb4 "
+            "FIELDS TERMINATED BY ',' OPTIONALLY ENCLOSED BY '\"' "
+            "LINES TERMINATED BY '\\n' (%s)" % (users.name, ", ".join(columns)),
+            (f.name,),
+        )
+    finally:
+        os.remove(f.name)
+
+
+def _loader(engine):
+    if engine.dialect.name == "sqlite":
+        return _executemany
+    if engine.dialect.name == "mysql":
+        return _load_data_infile
+    return _multirow_insert
+
+
+def _load(connection, rows, stats, load):
+    new = _new_rows(connection, rows)
+    if new:
+        load(connection, new)
+        emails = [row["email"] for row in new]
+        changes.log_inserted(
+            connection, users, select(users.c.id).where(users.c.email.in_(emails))
+        )
+    stats.imported += len(new)
+    stats.duplicates += len(rows) - len(new)
+
+
+def import_users(
+    engine, records, settings, processes=None, batch_size=1000, errors=None
+):
+    """
+    Import the (line, record) pairs, return the ImportStats. errors(line,
+    message) is called for every invalid record.
+    """
+    stats = ImportStats()
+    load = _loader(engine)
+    if load is _load_data_infile:
+        # the client side of LOAD DATA LOCAL has to be enabled when connecting
+        engine = create_engine(
+            engine.url, connect_args={"local_infile": True}, poolclass=NullPool
+        )
+
+    def rows():
+        for line, row, error in validated(records, settings, processes):
+            stats.read += 1
+            if error is None:
+                yield row
+            else:
+                stats.invalid += 1
+                if errors is not None:
+                    errors(line, error)
+
+    batches = _chunks(rows(), batch_size)
+    if load is _executemany:
+        with engine.begin() as connection:
+            for batch in batches:
+                _load(connection, batch, stats, load)
+        return stats
+    for batch in batches:
+        try:
+            with engine.begin() as connection:
+                _load(connection, batch, stats, load)
+        except DBAPIError:
+            if load is not _load_data_infile or stats.imported:
+                raise
+            # LOAD DATA LOCAL disabled on the server, fall back for good
+            load = _multirow_insert
+            with engine.begin() as connection:
+                _load(connection, batch, stats, load)
+    return stats
+
+
+def open_input(path, format=None):
+    """The text file and format of a path, "-" being stdin; .gz is decompressed."""
+    name = path[:-3] if path.endswith(".gz") else path
+    if format is None:
+        format = "jsonl" if name.endswith((".jsonl", ".json", ".ndjson")) else "csv"
+    if path == "-":
+        f = io.TextIOWrapper(sys.stdin.buffer, encoding="utf-8", newline="")
+    elif path.endswith(".gz"):
+        f = gzip.open(path, "rt", encoding="utf-8", newline="")
+    else:
+        f = open(path, encoding="utf-8", newline="")
+    return f, format
@@ -0,0 +1,211 @@
+"""
+Non-blocking log pipeline.
+
+The handlers configured in config.py are not attached to the application
+logger directly: records are put on a queue by a QueueHandler and a single
+background thread per process hands them to the slow handlers (files, syslog,
+SMTP). Logging a message therefore never blocks a request on I/O.
+
+Error emails are sent by DigestSMTPHandler, which sends the first error right
+away and then at most one email every `interval` seconds, with identical errors
+(same logger, level and source line) collapsed into a single entry with their
+number of occurrences.
+"""
+import atexit
+import logging
+import os
+import queue
+import smtplib
+import threading
+import time
+from email.message import EmailMessage
+from email.utils import localtime
+from logging.handlers import QueueHandler, QueueListener, SMTPHandler
+
+# format of the text logs written to files, stderr and syslog
+TEXT_FORMAT = (
+    "%(levelname)s - [%(filename)s] - %(asctime)s - %(process)d -  %(lineno)d"
+    " - %(message)s "
+)
+
+_queue = queue.Queue(-1)
+_listener = None
+_lock = threading.Lock()
+
+
+class _Listener(QueueListener):
+    """Dispatch every record to the handlers of the QueueHandler that queued it."""
+
+    def handle(self, record):
+        for handler in record.queue_handlers:
+            if record.levelno >= handler.level:
+                handler.handle(record)
+
+
+class AppQueueHandler(QueueHandler):
+    def __init__(self):
+        super().__init__(_queue)
+        self.targets = []
+
+    def add(self, handler):
+        self.targets.append(handler)
+        # records none of the targets would handle are not queued
+        self.setLevel(min(target.level for target in self.targets))
+
+    def enqueue(self, record):
+        # the module queue, which is replaced in forked processes
+        _queue.put_nowait(record)
+
+    def prepare(self, record):
+        record = super().prepare(record)
+        record.queue_handlers = tuple(self.targets)
+        return record
+
+
+def _start_listener():
+    global _listener
+    with _lock:
+        if _listener is None:
+            _listener = _Listener(_queue)
+            _listener.start()
+            # runs before logging.shutdown, which flushes and closes the handlers
+            atexit.register(_listener.stop)
+
+
+def _restart_listener():
+    # The listener thread does not survive a fork (gunicorn --preload, parallel
+    # test runs), the child process starts its own on a new queue: the records
+    # left in the copy of the queue are handled by the parent, and its locks may
+    # have been copied in any state.
+    global _queue, _listener, _lock
+    _queue = queue.Queue(-1)
+    _lock = threading.Lock()
+    if _listener is not None:
+        _listener = None
+        _start_listener()
+
+
+os.register_at_fork(after_in_child=_restart_listener)
+
+
+def add_handler(app, handler, logger=None):
+    """
+    Attach `handler` through the log queue to `logger`, by default the
+    application logger.
+    """
+    if logger is None:
+        logger = app.logger
+    for queue_handler in logger.handlers:
+        if isinstance(queue_handler, AppQueueHandler):
+            break
+    else:
+        queue_handler = AppQueueHandler()
+        logger.addHandler(queue_handler)
+    queue_handler.add(handler)
+    _start_listener()
+
+
+def text_formatter():
+    return logging.Formatter(TEXT_FORMAT, datefmt="%d-%b-%y %H:%M:%S")
+
+
+def flush():
+    """Wait until all the queued records have been handled."""
+    _queue.join()
+
+
+class DigestSMTPHandler(SMTPHandler):
+    def __init__(self, *args, interval=60, max_entries=100, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.interval = interval
+        self.max_entries = max_entries
+        self.pending = {}
+        self.dropped = 0
+        self.last_sent = None
+        self.timer = None
+
+    def emit(self, record):
+        key = (record.name, record.levelno, record.pathname, record.lineno)
+        entry = self.pending.get(key)
+        if entry is not None:
+            entry[0] += 1
+            entry[1] = record.created
+        elif len(self.pending) < self.max_entries:
+            self.pending[key] = [1, record.created, self.format(record), record]
+        else:
+            self.dropped += 1
+
+        wait = 0
+        if self.last_sent is not None:
+            wait = self.last_sent + self.interval - time.monotonic()
+        if wait <= 0:
+            self.send_pending()
+        elif self.timer is None:
+            self.timer = threading.Timer(wait, self.flush)
+            self.timer.daemon = True
+            self.timer.start()
+
+    def flush(self):
+        with self.lock:
+            if self.timer is not None:
+                self.timer.cancel()
+                self.timer = None
+            self.send_pending()
+
+    def close(self):
+        self.flush()
+        super().close()
+
+    def send_pending(self):
+        if not self.pending:
+            return
+        entries = list(self.pending.values())
+        occurrences = sum(entry[0] for entry in entries) + self.dropped
+        dropped = self.dropped
+        self.pending = {}
+        self.dropped = 0
+        self.last_sent = time.monotonic()
+
+        subject = self.subject
+        if occurrences > 1:
+            subject += " (%d occurrences of %d errors)" % (occurrences, len(entries))
+        parts = []
+        for count, last, text, record in entries:
+            if count > 1:
+                parts.append(
+                    "%d occurrences, last at %s\n\n%s"
+                    % (
+                        count,
+                        time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(last)),
+                        text,
+                    )
+                )
+            else:
+                parts.append(text)
+        if dropped:
+            parts.append("%d more errors were not included." % dropped)
+        try:
+            self.send(subject, ("\n\n" + "-" * 70 + "\n\n").join(parts))
+        except Exception:
+            self.handleError(entries[-1][3])
+
+    def send(self, subject, body):
+        message = EmailMessage()
+        message["From"] = self.fromaddr
+        message["To"] = ",".join(self.toaddrs)
+        message["Subject"] = subject
+        message["Date"] = localtime()
+        message.set_content(body)
+        smtp = smtplib.SMTP(
+            self.mailhost, self.mailport or smtplib.SMTP_PORT, timeout=self.timeout
+        )
+        try:
+            if self.username:
+                if self.secure is not None:
+                    smtp.ehlo()
+                    smtp.starttls(*self.secure)
+                    smtp.ehlo()
+                smtp.login(self.username, self.password)
+            smtp.send_message(message)
+        finally:
+            smtp.quit()
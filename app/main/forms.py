@@ -10,7 +10,8 @@ from wtforms import (
 )
 from wtforms.validators import DataRequired, Email, Length, Regexp
 
-from ..models import Role, User
+from .. import db
+from ..models import User, role_table
 
 
 class NameForm(FlaskForm):
@@ -25,7 +26,60 @@ class EditProfileForm(FlaskForm):
     submit = SubmitField("Submit")
 
 
-class EditProfileAdminForm(FlaskForm):
+class UniqueUserMixin:
+    """
+    Email and username uniqueness checks for the admin profile forms. Both fields
+    are checked with a single query, run by whichever validator comes first, and
+    only values that differ from those of the user being edited are looked up.
+    """
+
+    user = None
+
+    def _taken(self):
+        if getattr(self, "_taken_values", None) is None:
+            conditions = []
+            if self.user is None or self.email.data != self.user.email:
+                conditions.append(User.email == self.email.data)
+            if self.user is None or self.username.data != self.user.username:
+                conditions.append(User.username == self.username.data)
+            rows = []
+            if conditions:
+                query = db.session.query(User.email, User.username).filter(
+                    db.or_(*conditions)
+                )
+                if self.user is not None and self.user.id is not None:
+                    query = query.filter(User.id != self.user.id)
+                rows = query.all()
+            self._taken_values = (
+                {row.email for row in rows},
+                {row.username for row in rows},
+            )
+        return self._taken_values
+
+    def validate_email(self, field):
+        if field.data in self._taken()[0]:
+            raise ValidationError("Email already registered.")
+
+    def validate_username(self, field):
+        if field.data in self._taken()[1]:
+            raise ValidationError("Username already in use.")
+
+    def unique_violation(self):
+        """
+        Turn a unique constraint violation raised on commit, which means another
+        request took the email or username after validation, into field errors.
+        """
+        self._taken_values = None
+        emails, usernames = self._taken()
+        if self.email.data in emails:
+            self.email.errors.append("Email already registered.")
+        if self.username.data in usernames:
+            self.username.errors.append("Username already in use.")
+        if self.email.data not in emails and self.username.data not in usernames:
+            self.email.errors.append("Email or username already in use.")
+
+
+class EditProfileAdminForm(UniqueUserMixin, FlaskForm):
     email = StringField("Email", validators=[DataRequired(), Length(1, 64), Email()])
     username = StringField(
         "Username",
@@ -50,35 +104,20 @@ class EditProfileAdminForm(FlaskForm):
     about_me = TextAreaField("About me")
     submit = SubmitField("Submit")
 
-    def __init__(self, user, *args, **kwargs):
-        super(EditProfileAdminForm, self).__init__(*args, **kwargs)
-        self.role.choices = [
-            (role.id, role.name) for role in Role.query.order_by(Role.name).all()
-        ]
-        self.user = user
-
     # The validation condition used for email and username fields must first check
     # whether a change to the field was made, and only when there is a change
     # should it ensure that the new value does not duplicate another user’s.
     # To implement this logic, the form’s constructor receives the user object as an
-    # argument and saves it as a member variable, which is later used in the
-    # custom validation methods.
-    def validate_email(self, field):
-        if (
-            field.data != self.user.email
-            and User.query.filter_by(email=field.data).first()
-        ):
-            raise ValidationError("Email already registered.")
-
-    def validate_username(self, field):
-        if (
-            field.data != self.user.username
-            and User.query.filter_by(username=field.data).first()
-        ):
-            raise ValidationError("Username already in use.")
+    # argument and saves it as a member variable, which UniqueUserMixin uses to
+    # leave the user's own row out of the uniqueness check.
+    def __init__(self, user, *args, **kwargs):
+        super(EditProfileAdminForm, self).__init__(*args, **kwargs)
+        # the role choices come from the process-wide role table
+        self.role.choices = role_table.get().choices
+        self.user = user
 
 
-class AddProfileAdminForm(FlaskForm):
+class AddProfileAdminForm(UniqueUserMixin, FlaskForm):
     email = StringField("Email", validators=[DataRequired(), Length(1, 64), Email()])
     username = StringField(
         "Username",
@@ -102,14 +141,4 @@ class AddProfileAdminForm(FlaskForm):
 
     def __init__(self, *args, **kwargs):
         super(AddProfileAdminForm, self).__init__(*args, **kwargs)
-        self.role.choices = [
-            (role.id, role.name) for role in Role.query.order_by(Role.name).all()
-        ]
-
-    def validate_email(self, field):
-        if User.query.filter_by(email=field.data).first():
-            raise ValidationError("Email already registered.")
-
-    def validate_username(self, field):
-        if User.query.filter_by(username=field.data).first():
-            raise ValidationError("Username already in use.")
+        self.role.choices = role_table.get().choices
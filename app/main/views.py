@@ -1,12 +1,27 @@
+import io
+import os
 from datetime import datetime
 
-from flask import current_app, flash, redirect, render_template, session, url_for
+from flask import (
+    abort,
+    current_app,
+    flash,
+    redirect,
+    render_template,
+    request,
+    send_file,
+    session,
+    url_for,
+)
 from flask_login import current_user, login_required
 from flask_sqlalchemy import get_debug_queries
+from sqlalchemy.exc import IntegrityError
 
-from .. import db
+from .. import avatars, db, queries
 from ..decorators import admin_required
 from ..models import Role, User
+from ..records import select_users, user_records
+from ..routing import use_primary
 from . import main
 from .forms import AddProfileAdminForm, EditProfileAdminForm, EditProfileForm, NameForm
 
@@ -32,7 +47,7 @@ def index():
         # old_name = session.get('name')
         # if old_name is not None and old_name != form.name.data:
         # flash('Looks like you have changed your name!')
-        user = User.query.filter_by(username=form.name.data).first()
+        user = queries.user_by_username(form.name.data)
         session["name"] = form.name.data
         if user is None:
             user = User(username=form.name.data)
@@ -54,12 +69,41 @@ def index():
 
 @main.route("/user/<username>")
 def user(username):
-    user = User.query.filter_by(username=username).first_or_404()
+    user = queries.user_by_username(username)
+    if user is None:
+        abort(404)
     return render_template("user.html", user=user)
 
 
+# Locally generated identicons. The URL is content addressed (hash and size), so
+# responses can be cached by browsers and proxies for as long as they want.
+@main.route("/avatar/<hash>")
+def avatar(hash):
+    size = request.args.get("s", 100, type=int)
+    if not avatars.valid_hash(hash) or size not in avatars.SIZES:
+        abort(404)
+    store = avatars.AvatarStore(current_app.config["FLASK_AVATAR_DIR"])
+    path = store.path(hash, size)
+    if os.path.exists(path) or queries.has_avatar(hash):
+        image = store.get(hash, size)
+    else:
+        # the hash of no user, or of one the avatar_hash backfill has not reached
+        image = io.BytesIO(avatars.identicon(hash, size))
+    response = send_file(
+        image,
+        mimetype="image/png",
+        max_age=current_app.config["FLASK_AVATAR_MAX_AGE"],
+        conditional=True,
+        etag="%s-%d" % (hash, size),
+    )
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    return response
+
+
 @main.route("/edit-profile", methods=["GET", "POST"])
 @login_required
+@use_primary
 def edit_profile():
     form = EditProfileForm()
     if form.validate_on_submit():
@@ -79,19 +123,26 @@ def edit_profile():
 @main.route("/edit-profile/<int:id>", methods=["GET", "POST"])
 @login_required
 @admin_required
+@use_primary
 def edit_profile_admin(id):
-    user = User.query.get_or_404(id)
+    user = queries.user_or_404(id)
     form = EditProfileAdminForm(user=user)
     if form.validate_on_submit():
         user.email = form.email.data
         user.username = form.username.data
         user.confirmed = form.confirmed.data
-        user.role = Role.query.get(form.role.data)
+        # the choices of the role field are validated against the role table
+        user.role_id = form.role.data
         user.name = form.name.data
         user.location = form.location.data
         user.about_me = form.about_me.data
         db.session.add(user)
-        db.session.commit()
+        try:
+            db.session.commit()
+        except IntegrityError:
+            db.session.rollback()
+            form.unique_violation()
+            return render_template("edit_profile.html", form=form, user=user)
         flash("The profile has been updated.")
         return redirect(url_for("main.user", username=user.username))
     form.email.data = user.email
@@ -120,7 +171,12 @@ def create_profile_admin():
         user.location = form.location.data
         user.about_me = form.about_me.data
         db.session.add(user)
-        db.session.commit()
+        try:
+            db.session.commit()
+        except IntegrityError:
+            db.session.rollback()
+            form.unique_violation()
+            return render_template("create_profile.html", form=form, user=user)
         flash("The profile has been created.")
         return redirect(url_for("main.user", username=user.username))
     form.email.data = user.email
@@ -137,15 +193,16 @@ def create_profile_admin():
 @login_required
 @admin_required
 def show_profile_admin():
-    users = User.query.order_by(User.id.desc()).all()
+    users = user_records(select_users().order_by(User.id.desc()))
     return render_template("show_profiles.html", users=users)
 
 
 @main.route("/delete-profile/<int:id>", methods=["GET", "POST"])
 @login_required
 @admin_required
+@use_primary
 def delete_profile_admin(id):
-    user = User.query.get_or_404(id)
+    user = queries.user_or_404(id)
     db.session.delete(user)
     db.session.commit()
     return redirect(url_for("main.show_profile_admin"))
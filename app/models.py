@@ -1,14 +1,19 @@
 import hashlib
 from datetime import datetime
 
-from flask import current_app, url_for
+from flask import current_app, has_app_context, url_for
 from flask_login import AnonymousUserMixin, UserMixin
-from itsdangerous import TimedJSONWebSignatureSerializer as Serializer
 from werkzeug.security import check_password_hash, generate_password_hash
 
 from app.exceptions import ValidationError
 
-from . import db, login_manager
+from . import avatars, db, login_manager, tokens
+from .backfill import Backfill, register
+from .caching import VersionedCache, watch_model
+from .changes import log_changes
+from .deploy import deploy_state  # noqa: F401, adds the table to the metadata
+from .fragments import tag_model
+from .routing import track_model
 
 # from flask import g
 
@@ -91,6 +96,40 @@ class Role(db.Model):
         return self.permissions & perm == perm
 
 
+class RoleTable:
+    """
+    Process-wide snapshot of the roles table. Roles change rarely, so permission
+    checks read the permission bits of a role from here instead of loading the
+    Role relationship of every user through the ORM.
+    """
+
+    def __init__(self, rows):
+        self.permissions = {}
+        self.names = {}
+        self.default_id = None
+        for id, name, permissions, default in rows:
+            self.permissions[id] = permissions or 0
+            self.names[id] = name
+            if default:
+                self.default_id = id
+        # (id, name) pairs ordered by name, as offered by the role select fields
+        self.choices = sorted(self.names.items(), key=lambda choice: choice[1])
+
+    @staticmethod
+    def load():
+        return RoleTable(
+            db.session.execute(
+                db.select(Role.id, Role.name, Role.permissions, Role.default)
+            ).all()
+        )
+
+
+# Role.insert_roles() and any other change to a role bump the "roles" version,
+# which makes every process reload the table.
+role_table = VersionedCache("roles", RoleTable.load)
+watch_model(Role, "roles")
+
+
 class User(UserMixin, db.Model):
     """
     UserMixin class that has default implementations of is_authenticated, is_active,
@@ -111,16 +150,26 @@ class User(UserMixin, db.Model):
     # SQLAlchemy invokes the datetime.utcnow function to produce default values
     member_since = db.Column(db.DateTime(), default=datetime.utcnow)
     last_seen = db.Column(db.DateTime(), default=datetime.utcnow)
-    avatar_hash = db.Column(db.String(32))
+    avatar_hash = db.Column(db.String(32), index=True)
+    # incremented by every UPDATE of the row, through the ORM or not, except
+    # ping(): part of the keys of the cached fragments, so that every worker
+    # process renders them again once the row changes
+    version = db.Column(
+        db.Integer,
+        nullable=False,
+        default=0,
+        server_default="0",
+        onupdate=db.literal_column("version") + 1,
+    )
 
     # Role Assignment: defining a default role for users
     def __init__(self, **kwargs):
         super(User, self).__init__(**kwargs)
         if self.role is None:
             if self.email == current_app.config["APP_ADMIN"]:
-                self.role = Role.query.filter_by(name="Administrator").first()
+                self.role = queries.role_by_name("Administrator")
             if self.role is None:
-                self.role = Role.query.filter_by(default=True).first()
+                self.role = queries.default_role()
         if self.email is not None and self.avatar_hash is None:
             self.avatar_hash = self.gravatar_hash()
 
@@ -134,7 +183,10 @@ class User(UserMixin, db.Model):
 
     @password.setter
     def password(self, password):
-        self.password_hash = generate_password_hash(password)
+        method = "pbkdf2:sha256"
+        if has_app_context():
+            method = current_app.config["FLASK_PASSWORD_HASH_METHOD"]
+        self.password_hash = generate_password_hash(password, method)
 
     def verify_password(self, password):
         return check_password_hash(self.password_hash, password)
@@ -142,8 +194,7 @@ class User(UserMixin, db.Model):
     # The generate_confirmation_token() method generates a token with
     # a default validity time of one hour
     def generate_confirmation_token(self, expiration=3600):
-        s = Serializer(current_app.config["SECRET_KEY"], expiration)
-        return s.dumps({"confirm": self.id}).decode("utf-8")
+        return tokens.dumps(tokens.CONFIRM, self.id, expiration)
 
     # The confirm() method verifies the token and, if valid, sets
     # the new confirmed attribute in the user model to True. In addition
@@ -152,12 +203,7 @@ class User(UserMixin, db.Model):
     # current_user. This ensures that a confirmation token for a given
     # user cannot be used to confirm a different user.
     def confirm(self, token):
-        s = Serializer(current_app.config["SECRET_KEY"])
-        try:
-            data = s.loads(token.encode("utf-8"))
-        except:
-            return False
-        if data.get("confirm") != self.id:
+        if tokens.loads(tokens.CONFIRM, token) != self.id:
             return False
         self.confirmed = True
         db.session.add(self)
@@ -165,15 +211,51 @@ class User(UserMixin, db.Model):
 
     # Role Verification: evaluating whether a user has a given permission
     def can(self, perm):
-        return self.role is not None and self.role.has_permission(perm)
+        return self.permissions & perm == perm
+
+    @property
+    def permissions(self):
+        """
+        Permission bits of the user's role. They are looked up once in the role
+        table and stored on the instance, so repeated checks on the current user
+        are plain integer operations. The stored bits are discarded when the
+        role of the user changes or the instance is expired by a commit.
+        """
+        bits = self.__dict__.get("_permissions")
+        if bits is None:
+            if self.role_id is None:
+                # not flushed yet, the role can only come from the relationship
+                role = self.role
+                bits = role.permissions if role is not None else 0
+            else:
+                bits = role_table.get().permissions.get(self.role_id, 0)
+            self.__dict__["_permissions"] = bits
+        return bits
 
     def is_administrator(self):
         return self.can(Permission.ADMIN)
 
+    @property
+    def role_name(self):
+        return role_table.get().names.get(self.role_id)
+
+    def has_profile_changes(self):
+        """
+        True if the pending changes of the user touch anything but the last_seen
+        time refreshed by ping() on every request.
+        """
+        state = db.inspect(self)
+        return any(
+            attr.key not in ("last_seen", "version") and attr.history.has_changes()
+            for attr in state.attrs
+        )
+
     # refreshing a user’s last visit time
     # Ref: app/auth/views.py: pinging the logged-in user
     def ping(self):
         self.last_seen = datetime.utcnow()
+        # the cached fragments that do not show the last visit time stay valid
+        self.version = User.version
         db.session.add(self)
         db.session.commit()
 
@@ -183,8 +265,11 @@ class User(UserMixin, db.Model):
         )
 
     def gravatar(self, size=100, default="identicon", rating="g"):
-        url = "https://secure.gravatar.com/avatar"
         hash = self.avatar_hash or self.gravatar_hash()
+        # nodes without access to gravatar.com serve identicons themselves
+        if current_app.config["FLASK_LOCAL_AVATARS"]:
+            return url_for("main.avatar", hash=hash, s=avatars.fit_size(size))
+        url = "https://secure.gravatar.com/avatar"
         return "{url}/{hash}?s={size}&d={default}&r={rating}".format(
             url=url, hash=hash, size=size, default=default, rating=rating
         )
@@ -192,18 +277,15 @@ class User(UserMixin, db.Model):
     # An expiration time given in seconds is also used to generate token.
     # Here token is decoded using id of the user.
     def generate_auth_token(self, expiration):
-        s = Serializer(current_app.config["SECRET_KEY"], expires_in=expiration)
-        return s.dumps({"id": self.id}).decode("utf-8")
+        return tokens.dumps(tokens.AUTH, self.id, expiration)
 
     # This is a static method, as the user will be known only after the token is decoded.
     @staticmethod
     def verify_auth_token(token):
-        s = Serializer(current_app.config["SECRET_KEY"])
-        try:
-            data = s.loads(token)
-        except:
+        user_id = tokens.loads(tokens.AUTH, token)
+        if user_id is None:
             return None
-        return User.query.get(data["id"])
+        return queries.user(user_id)
 
     def to_json(self):
         # Note : Do not use g.current_user.username in implementation of response.
@@ -231,7 +313,7 @@ class User(UserMixin, db.Model):
         if email is None or email == "":
             raise ValidationError("please provide valid email address")
         else:
-            user = User.query.filter_by(email=email).first()
+            user = queries.user_by_email(email)
             if user:
                 raise ValidationError("email exist in database")
         # check username exist in database
@@ -239,7 +321,7 @@ class User(UserMixin, db.Model):
         if username is None or username == "":
             raise ValidationError("please provide valid username")
         else:
-            user = User.query.filter_by(username=username).first()
+            user = queries.user_by_username(username)
             if user:
                 raise ValidationError("username exist in database")
         # check id exist in database
@@ -265,8 +347,40 @@ class User(UserMixin, db.Model):
         )
 
 
+def _forget_permissions(target, value, oldvalue, initiator):
+    target.__dict__.pop("_permissions", None)
+
+
+def _assign_permissions(target, value, oldvalue, initiator):
+    # until the next flush role_id still points to the previous role
+    target.__dict__["_permissions"] = (value.permissions or 0) if value else 0
+
+
+# User.role is a backref that only exists once the mappers are configured
+@db.event.listens_for(db.mapper, "after_configured", once=True)
+def _watch_user_role():
+    db.event.listen(User.role, "set", _assign_permissions)
+    db.event.listen(User.role_id, "set", _forget_permissions)
+
+
+@db.event.listens_for(User, "expire")
+def _forget_expired_permissions(target, attrs):
+    target.__dict__.pop("_permissions", None)
+
+
+# rendered profile fragments are dropped when a user is edited or deleted
+tag_model(User, User.has_profile_changes)
+# neither does the last visit time refreshed on every request need to be read
+# back from the primary
+track_model(User, User.has_profile_changes)
+# feed of /api/v1/users/changes, the last visit times are left out too
+log_changes(User, User.has_profile_changes)
+
+
 # Role Verification: evaluating whether a user has a given permission
 class AnonymousUser(AnonymousUserMixin):
+    permissions = 0
+
     def can(self, permissions):
         return False
 
@@ -274,6 +388,20 @@ class AnonymousUser(AnonymousUserMixin):
         return False
 
 
+# users created before avatar_hash was set on creation
+register(
+    Backfill(
+        "users.avatar_hash",
+        User.__table__,
+        where=User.avatar_hash.is_(None) & User.email.isnot(None),
+        columns=[User.email],
+        compute=lambda row: {
+            "avatar_hash": hashlib.md5(row.email.lower().encode("utf-8")).hexdigest()
+        },
+    )
+)
+
+
 """
 Role Verification: Flask-Login is told to use the application’s custom anonymous user
 by setting its class in the login_manager.anonymous_user attribute.
@@ -295,4 +423,8 @@ def load_user(user_id):
     Flask-Login, which will call it when it needs to retrieve information about the
     logged-in user.
     """
-    return User.query.get(int(user_id))
+    return queries.user(int(user_id))
+
+
+# imported last, the repository builds its statements from the models above
+from . import queries  # noqa: E402
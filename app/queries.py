@@ -0,0 +1,84 @@
+"""
+Repository of the lookups that run on most requests.
+
+Each lookup is a SELECT built once, at import, with bound parameters, so a call
+only binds the values and SQLAlchemy finds the compiled statement in its cache
+right away. User.query.filter_by(...).first() builds a Query, a new statement and
+its cache key on every call instead. Lookups by primary key go through
+Session.get(), which skips the Query as well and returns the instance from the
+identity map, without any SQL, when the session already holds it.
+"""
+from flask import abort
+from sqlalchemy import bindparam, select
+from sqlalchemy.orm.util import identity_key
+
+from . import db
+from .models import Role, User
+
+_user_by_email = select(User).where(User.email == bindparam("email")).limit(1)
+_user_by_username = select(User).where(User.username == bindparam("username")).limit(1)
+_user_by_avatar_hash = (
+    select(User.id).where(User.avatar_hash == bindparam("hash")).limit(1)
+)
+_role_by_name = select(Role).where(Role.name == bindparam("name")).limit(1)
+_default_role = select(Role).where(Role.default.is_(True)).limit(1)
+
+
+def _first(statement, params=None):
+    return db.session.execute(statement, params).scalars().first()
+
+
+def user(id):
+    """The user with the given id, or None."""
+    return db.session.get(User, id)
+
+
+def user_or_404(id):
+    user = db.session.get(User, id)
+    if user is None:
+        abort(404)
+    return user
+
+
+def users(ids, chunk_size=500):
+    """
+    The users with the given ids, by id. Those the session does not hold yet are
+    loaded with one IN query per chunk_size ids.
+    """
+    found = {}
+    missing = []
+    for id in dict.fromkeys(ids):
+        user = db.session.identity_map.get(identity_key(User, id))
+        if user is None:
+            missing.append(id)
+        else:
+            found[id] = user
+    for start in range(0, len(missing), chunk_size):
+        chunk = missing[start : start + chunk_size]
+        for user in db.session.execute(
+            select(User).where(User.id.in_(chunk))
+        ).scalars():
+            found[user.id] = user
+    return found
+
+
+def user_by_email(email):
+    return _first(_user_by_email, {"email": email})
+
+
+def user_by_username(username):
+    return _first(_user_by_username, {"username": username})
+
+
+def has_avatar(hash):
+    """True if a user has the given avatar hash."""
+    return _first(_user_by_avatar_hash, {"hash": hash}) is not None
+
+
+def role_by_name(name):
+    return _first(_role_by_name, {"name": name})
+
+
+def default_role():
+    """The role given to new users."""
+    return _first(_default_role)
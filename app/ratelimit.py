@@ -0,0 +1,160 @@
+import hashlib
+import hmac
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+
+from flask import current_app
+
+from .exceptions import TooManyRequests
+
+
+class MemoryStore:
+    """Sliding window log of hit timestamps per key, local to the process."""
+
+    def __init__(self, max_keys=100000):
+        self.max_keys = max_keys
+        self._hits = {}
+        self._lock = threading.Lock()
+
+    def hit(self, key, window, now):
+        """Record a hit and return the number of hits inside the window."""
+        with self._lock:
+            hits = self._hits.get(key)
+            if hits is None:
+                if len(self._hits) >= self.max_keys:
+                    self._sweep(now - window)
+                hits = self._hits[key] = deque()
+            while hits and hits[0] <= now - window:
+                hits.popleft()
+            hits.append(now)
+            return len(hits)
+
+    def _sweep(self, oldest):
+        for key in [k for k, hits in self._hits.items() if hits[-1] <= oldest]:
+            del self._hits[key]
+
+
+class RedisStore:
+    """
+    Sliding window log kept in a Redis sorted set per key, so that every worker
+    and every node sharing the Redis server enforce the same limits.
+    """
+
+    def __init__(self, url, prefix="flasky:ratelimit:"):
+        import redis
+
+        self._redis = redis.Redis.from_url(url)
+        self.prefix = prefix
+
+    def hit(self, key, window, now):
+        key = self.prefix + key
+        pipeline = self._redis.pipeline()
+        pipeline.zremrangebyscore(key, 0, now - window)
+        pipeline.zadd(key, {"%.6f:%s" % (now, os.urandom(4).hex()): now})
+        pipeline.zcard(key)
+        pipeline.expire(key, int(window) + 1)
+        return pipeline.execute()[2]
+
+
+class SlidingWindowLimiter:
+    def __init__(self, store, prefix):
+        self.store = store
+        self.prefix = prefix
+
+    def hit(self, key, limit, window):
+        """Record an attempt and return False if the limit is exceeded."""
+        return self.store.hit(self.prefix + key, window, time.time()) <= limit
+
+
+class CredentialCache:
+    """
+    Short lived record of successful password checks. Entries are keyed by a
+    keyed hash of the email and password, so the password is never kept, and
+    store the password hash that was verified, so a password change invalidates
+    them. The cache is deliberately local to the process.
+    """
+
+    def __init__(self, max_entries=10000):
+        self.max_entries = max_entries
+        self._secret = os.urandom(32)
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _key(self, email, password):
+        message = email.lower().encode("utf-8") + b"\0" + password.encode("utf-8")
+        return hmac.new(self._secret, message, hashlib.sha256).digest()
+
+    def verified(self, email, password, password_hash):
+        key = self._key(email, password)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return False
+            if entry[1] < time.monotonic() or entry[0] != password_hash:
+                del self._entries[key]
+                return False
+            return True
+
+    def remember(self, email, password, password_hash, ttl):
+        key = self._key(email, password)
+        with self._lock:
+            self._entries[key] = (password_hash, time.monotonic() + ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+class LoginThrottle:
+    """
+    Guards password checks, the most expensive operation of a request. Repeated
+    logins with the same credentials are answered from the credential cache, and
+    every password that has to go through the key derivation function counts
+    against a sliding window limit for the client address and for the account.
+    """
+
+    def init_app(self, app):
+        url = app.config.get("FLASK_RATELIMIT_STORAGE_URL")
+        store = RedisStore(url) if url else MemoryStore()
+        app.extensions["login_throttle"] = {
+            "ip": SlidingWindowLimiter(store, "ip:"),
+            "account": SlidingWindowLimiter(store, "account:"),
+            "credentials": CredentialCache(
+                app.config.get("FLASK_CREDENTIAL_CACHE_SIZE", 10000)
+            ),
+        }
+
+    def check_password(self, user, email, password, remote_addr):
+        """
+        Return True if password is the password of user. user may be None when
+        no account matches email, the attempt is then counted all the same.
+        Raises TooManyRequests when the client or the account is over its limit.
+        """
+        config = current_app.config
+        state = current_app.extensions["login_throttle"]
+        if user is not None and state["credentials"].verified(
+            email, password, user.password_hash
+        ):
+            return True
+        window = config.get("FLASK_LOGIN_ATTEMPT_WINDOW", 60)
+        # both windows record the attempt, even when one of them is already full
+        ip_allowed = state["ip"].hit(
+            remote_addr or "unknown",
+            config.get("FLASK_LOGIN_ATTEMPTS_PER_IP", 100),
+            window,
+        )
+        account_allowed = state["account"].hit(
+            email.lower(), config.get("FLASK_LOGIN_ATTEMPTS_PER_ACCOUNT", 10), window
+        )
+        if not (ip_allowed and account_allowed):
+            raise TooManyRequests("Too many login attempts", retry_after=int(window))
+        if user is None or not user.verify_password(password):
+            return False
+        ttl = config.get("FLASK_CREDENTIAL_CACHE_TTL", 60)
+        if ttl:
+            state["credentials"].remember(email, password, user.password_hash, ttl)
+        return True
+
+
+login_throttle = LoginThrottle()
@@ -0,0 +1,70 @@
+"""
+Read models of the list views.
+
+The views listing users only serialize or render them, so they run Core SELECTs
+and get UserRecord tuples, without the instrumentation, identity map and change
+tracking of ORM instances. A UserRecord shares the to_json(), gravatar() and
+role_name of User, so templates and serializers take either.
+"""
+from collections import namedtuple
+
+from flask_sqlalchemy import Pagination
+from sqlalchemy import func, select
+
+from . import db
+from .models import User
+
+_users = User.__table__
+
+_UserRow = namedtuple(
+    "_UserRow",
+    [
+        "id",
+        "email",
+        "username",
+        "role_id",
+        "confirmed",
+        "name",
+        "location",
+        "about_me",
+        "member_since",
+        "last_seen",
+        "avatar_hash",
+        "version",
+    ],
+)
+
+
+class UserRecord(_UserRow):
+    """A row of the users table, read-only, without the password hash."""
+
+    __slots__ = ()
+    # the invalidation tag of the cached fragments, see app/fragments.py
+    __tablename__ = User.__tablename__
+
+    to_json = User.to_json
+    gravatar = User.gravatar
+    gravatar_hash = User.gravatar_hash
+    role_name = User.role_name
+
+
+def select_users():
+    """SELECT of the UserRecord columns, to be narrowed and ordered by callers."""
+    return select(*[_users.c[name] for name in UserRecord._fields])
+
+
+def user_records(statement):
+    return [UserRecord._make(row) for row in db.session.execute(statement)]
+
+
+def paginate_users(statement, page, per_page):
+    """Page of UserRecords, like Query.paginate(page, per_page, error_out=False)."""
+    if page < 1:
+        page = 1
+    if per_page < 0:
+        per_page = 20
+    items = user_records(statement.limit(per_page).offset((page - 1) * per_page))
+    total = db.session.execute(
+        select(func.count()).select_from(statement.order_by(None).subquery())
+    ).scalar()
+    return Pagination(None, page, per_page, total, items)
@@ -0,0 +1,126 @@
+"""
+Read/write splitting between the primary database and its read replicas.
+
+The replicas are binds of SQLALCHEMY_BINDS listed in SQLALCHEMY_REPLICA_BINDS.
+During GET and HEAD requests the session reads the tables of the primary from
+one of them, picked once per session, while everything else goes to the
+primary: flushes, INSERT, UPDATE and DELETE statements, textual SQL, reads
+outside of requests and reads of views decorated with @use_primary.
+
+Replicas lag behind the primary, so once a session has written to the primary
+its later reads stay there (read-your-writes). The user session cookie also
+remembers the last write for SQLALCHEMY_REPLICA_LAG seconds, so that the page
+a form redirects to shows the change. track_model() can tell apart the changes
+that do not need to be read back, such as the time of the last visit.
+"""
+import random
+import time
+
+from flask import has_request_context, request, session
+from flask.sessions import NullSession
+from flask_sqlalchemy import SignallingSession, SQLAlchemy
+from sqlalchemy import event, orm
+from sqlalchemy.sql.dml import UpdateBase
+from sqlalchemy.sql.elements import TextClause
+
+from . import sqlite
+
+READ_METHODS = ("GET", "HEAD")
+
+# key of the user session holding the time until which reads use the primary
+PRIMARY_UNTIL = "_primary_until"
+
+# mapped class -> function telling whether the changes of a dirty instance have
+# to be read back from the primary
+_tracked_models = {}
+
+
+def use_primary(f):
+    """Read from the primary database during the requests of a view."""
+    f.use_primary = True
+    return f
+
+
+def track_model(model, changed):
+    """
+    Only the updates of model instances for which changed(instance) is True keep
+    the later reads on the primary. New and deleted instances always do.
+    """
+    _tracked_models[model] = changed
+
+
+class RoutingSession(SignallingSession):
+    def get_bind(self, mapper=None, clause=None):
+        replicas = self.app.config["SQLALCHEMY_REPLICA_BINDS"]
+        if not replicas or self._bind_key(mapper) is not None:
+            return super().get_bind(mapper, clause)
+        if isinstance(clause, (UpdateBase, TextClause)):
+            # the flushes are looked at by _record_writes
+            self.info["wrote"] = True
+        elif not self._flushing and self._read_from_replica():
+            name = self.info.get("replica")
+            if name is None:
+                name = self.info["replica"] = random.choice(replicas)
+            db = self.app.extensions["sqlalchemy"].db
+            return db.get_engine(self.app, bind=name)
+        return super().get_bind(mapper, clause)
+
+    @staticmethod
+    def _bind_key(mapper):
+        if mapper is None:
+            return None
+        return mapper.persist_selectable.info.get("bind_key")
+
+    def _read_from_replica(self):
+        if self.info.get("wrote") or not has_request_context():
+            return False
+        if request.method not in READ_METHODS:
+            return False
+        view = self.app.view_functions.get(request.endpoint)
+        if getattr(view, "use_primary", False):
+            return False
+        return session.get(PRIMARY_UNTIL, 0) <= time.time()
+
+
+class RoutingSQLAlchemy(SQLAlchemy):
+    """
+    Flask-SQLAlchemy with sessions routing reads to the read replicas, and the
+    performance profile of app/sqlite.py on SQLite database files.
+    """
+
+    def apply_driver_hacks(self, app, sa_url, options):
+        sa_url, options = super().apply_driver_hacks(app, sa_url, options)
+        sqlite.apply_profile(app, sa_url, options)
+        return sa_url, options
+
+    def create_session(self, options):
+        factory = orm.sessionmaker(class_=RoutingSession, db=self, **options)
+        # the listeners of a session class do not reach the subclass made by
+        # sessionmaker, they are registered on the factory instead
+        event.listen(factory, "after_flush", _record_writes)
+        event.listen(factory, "after_commit", _remember_writes)
+        return factory
+
+
+def _record_writes(db_session, flush_context):
+    if db_session.new or db_session.deleted:
+        db_session.info["wrote"] = True
+        return
+    for obj in db_session.dirty:
+        changed = _tracked_models.get(type(obj), db_session.is_modified)
+        if changed(obj):
+            db_session.info["wrote"] = True
+            return
+
+
+def _remember_writes(db_session):
+    if not db_session.info.get("wrote") or not has_request_context():
+        return
+    if not db_session.app.config["SQLALCHEMY_REPLICA_BINDS"]:
+        return
+    # the next requests of the user read from the primary until the replicas
+    # have caught up
+    if not isinstance(session, NullSession):
+        session[PRIMARY_UNTIL] = (
+            time.time() + db_session.app.config["SQLALCHEMY_REPLICA_LAG"]
+        )
@@ -0,0 +1,131 @@
+"""
+Performance profile of the SQLite database files.
+
+SQLALCHEMY_SQLITE_PRAGMAS are applied to every new connection, by default:
+
+    journal_mode=wal      readers and the writer no longer block each other
+    synchronous=normal    commits append to the WAL without waiting for fsync,
+                          which only happens at checkpoints
+    mmap_size, cache_size the database is read through a memory map and each
+                          connection keeps a larger page cache
+    busy_timeout          a writer waits for the lock instead of failing with
+                          "database is locked"
+
+The connections are kept in a pool instead of being opened for every session,
+so the page cache and the pragmas survive between requests.
+
+With SQLALCHEMY_SQLITE_SERIALIZE_WRITES the threads of a process queue for a
+process-wide lock before their first write of a transaction and hold it until
+the commit or rollback, so only one of them at a time competes with the other
+processes for the SQLite write lock.
+"""
+import re
+import sqlite3
+import threading
+
+from sqlalchemy.pool import QueuePool
+
+WRITE_STATEMENT = re.compile(
+    r"\s*(INSERT|UPDATE|DELETE|REPLACE|CREATE|DROP|ALTER)\b", re.IGNORECASE
+)
+
+
+class WriteQueue:
+    """The lock writers to one database file take in turn."""
+
+    def __init__(self, timeout):
+        self.timeout = timeout
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        if not self._lock.acquire(timeout=self.timeout):
+            # what SQLite itself raises when busy_timeout expires
+            raise sqlite3.OperationalError("database is locked")
+
+    def release(self):
+        self._lock.release()
+
+
+def connection_class(pragmas, queue=None):
+    """
+    Return the sqlite3.Connection subclass applying the pragmas when it is
+    opened and, given a WriteQueue, holding it during its write transactions.
+    """
+
+    class Cursor(sqlite3.Cursor):
+        def execute(self, sql, *args):
+            self.connection.before_statement(sql)
+            try:
+                return super().execute(sql, *args)
+            finally:
+                self.connection.after_statement()
+
+        def executemany(self, sql, *args):
+            self.connection.before_statement(sql)
+            try:
+                return super().executemany(sql, *args)
+            finally:
+                self.connection.after_statement()
+
+    class Connection(sqlite3.Connection):
+        writing = False
+
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            for name, value in pragmas.items():
+                super().execute("PRAGMA %s = %s" % (name, value))
+
+        def cursor(self, factory=Cursor):
+            return super().cursor(factory)
+
+        def before_statement(self, sql):
+            if queue is not None and not self.writing and WRITE_STATEMENT.match(sql):
+                queue.acquire()
+                self.writing = True
+
+        def after_statement(self):
+            # statements executed outside of a transaction are committed already
+            if self.writing and not self.in_transaction:
+                self.release()
+
+        def release(self):
+            if self.writing:
+                self.writing = False
+                queue.release()
+
+        def commit(self):
+            try:
+                super().commit()
+            finally:
+                self.release()
+
+        def rollback(self):
+            try:
+                super().rollback()
+            finally:
+                self.release()
+
+        def close(self):
+            try:
+                super().close()
+            finally:
+                self.release()
+
+    return Connection
+
+
+def apply_profile(app, sa_url, options):
+    """Add the profile to the engine options of a SQLite database file."""
+    pragmas = app.config["SQLALCHEMY_SQLITE_PRAGMAS"]
+    if not pragmas or sa_url.drivername != "sqlite":
+        return
+    if sa_url.database in (None, "", ":memory:"):
+        return
+    queue = None
+    if app.config["SQLALCHEMY_SQLITE_SERIALIZE_WRITES"]:
+        queue = WriteQueue(int(pragmas.get("busy_timeout", 5000)) / 1000)
+    connect_args = options.setdefault("connect_args", {})
+    connect_args["factory"] = connection_class(pragmas, queue)
+    # pooled connections are handed from thread to thread, one at a time
+    connect_args["check_same_thread"] = False
+    options["poolclass"] = QueuePool
@@ -0,0 +1,128 @@
+"""
+Compact signed tokens for authentication and account confirmation.
+
+A token is the version prefix "1." followed by the unpadded URL-safe base64
+encoding of a fixed 17 byte payload and its HMAC-SHA256 signature:
+
+    purpose (1 byte) | key id (uint32) | expires (uint32) | user id (uint64)
+
+Compared to the JSON Web Signature tokens issued before, there is no JSON to
+encode or parse and the HMAC state of every key is computed once per process and
+copied for each token. The key id makes key rotation possible: FLASK_TOKEN_KEYS
+lists the signing keys, the first one signs new tokens and the others are only
+accepted for verification. Tokens issued in the previous format are still
+verified with itsdangerous until FLASK_LEGACY_TOKENS is turned off.
+"""
+import hashlib
+import hmac
+import struct
+import time
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+
+from flask import current_app
+
+PREFIX = "1."
+
+# token purposes, a token issued for one purpose is never accepted for another
+AUTH = 1
+CONFIRM = 2
+
+# name of the user id field in the legacy JSON tokens of each purpose
+LEGACY_FIELDS = {AUTH: "id", CONFIRM: "confirm"}
+
+_payload = struct.Struct(">BIIQ")
+_digest_size = hashlib.sha256().digest_size
+
+
+class TokenSigner:
+    def __init__(self, keys):
+        if not keys:
+            raise ValueError("at least one token signing key is required")
+        self._macs = {}
+        self.current_kid = None
+        for key in keys:
+            if isinstance(key, str):
+                key = key.encode("utf-8")
+            # derive a dedicated key so tokens can never be confused with other
+            # values signed with the application secret key
+            derived = hmac.new(key, b"flasky-token", hashlib.sha256).digest()
+            # wide enough for the keys of a rotation to practically never collide
+            (kid,) = struct.unpack_from(">I", derived)
+            if kid in self._macs:
+                raise ValueError("token signing keys must have distinct key ids")
+            self._macs[kid] = hmac.new(derived, digestmod=hashlib.sha256)
+            if self.current_kid is None:
+                self.current_kid = kid
+
+    def _sign(self, kid, payload):
+        mac = self._macs[kid].copy()
+        mac.update(payload)
+        return mac.digest()
+
+    def dumps(self, purpose, user_id, expiration, now=None):
+        expires = int(now if now is not None else time.time()) + int(expiration)
+        payload = _payload.pack(purpose, self.current_kid, expires, user_id)
+        token = urlsafe_b64encode(payload + self._sign(self.current_kid, payload))
+        return PREFIX + token.rstrip(b"=").decode("ascii")
+
+    def loads(self, purpose, token, now=None):
+        """Return the user id of a valid token, or None."""
+        if not token.startswith(PREFIX):
+            return None
+        data = token[len(PREFIX) :]
+        try:
+            raw = urlsafe_b64decode(data + "=" * (-len(data) % 4))
+        except (ValueError, TypeError):
+            return None
+        if len(raw) != _payload.size + _digest_size:
+            return None
+        payload, signature = raw[: _payload.size], raw[_payload.size :]
+        token_purpose, kid, expires, user_id = _payload.unpack(payload)
+        if token_purpose != purpose or kid not in self._macs:
+            return None
+        if not hmac.compare_digest(self._sign(kid, payload), signature):
+            return None
+        if expires < (now if now is not None else time.time()):
+            return None
+        return user_id
+
+
+def get_signer():
+    signer = current_app.extensions.get("token_signer")
+    if signer is None:
+        keys = current_app.config.get("FLASK_TOKEN_KEYS") or [
+            current_app.config["SECRET_KEY"]
+        ]
+        signer = current_app.extensions["token_signer"] = TokenSigner(keys)
+    return signer
+
+
+def dumps(purpose, user_id, expiration):
+    return get_signer().dumps(purpose, user_id, expiration)
+
+
+def loads(purpose, token):
+    """
+    Return the user id carried by a valid token of the given purpose, or None if
+    the token is invalid, expired or issued for a different purpose.
+    """
+    if isinstance(token, bytes):
+        token = token.decode("utf-8", "replace")
+    if token.startswith(PREFIX):
+        return get_signer().loads(purpose, token)
+    if current_app.config.get("FLASK_LEGACY_TOKENS", True):
+        return _loads_legacy(purpose, token)
+    return None
+
+
+def _loads_legacy(purpose, token):
+    from itsdangerous import TimedJSONWebSignatureSerializer as Serializer
+
+    s = Serializer(current_app.config["SECRET_KEY"])
+    try:
+        data = s.loads(token.encode("utf-8"))
+    except Exception:
+        return None
+    if not isinstance(data, dict):
+        return None
+    return data.get(LEGACY_FIELDS[purpose])
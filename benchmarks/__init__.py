@@ -0,0 +1,6 @@
+"""
+Benchmark scripts for the application.
+
+Each module can be run on its own with ``python -m benchmarks.<name>`` from the
+project root and prints its measurements to the console.
+"""
@@ -0,0 +1,71 @@
+"""
+Request overhead of the API-only profile.
+
+Issues the same token authenticated GET /api/v1/users/<id> request against an
+application built with the full "testing" profile and one built with the slim
+"api" profile, both on an in-memory SQLite database, and reports the mean time
+per request.
+
+    (venv) $ python -m benchmarks.api_profile --requests 2000
+"""
+import argparse
+import os
+import time
+from base64 import b64encode
+
+# the api profile reads its database URL from the environment
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+import click  # noqa: E402
+
+from app import create_app, db  # noqa: E402
+from app.models import Role, User  # noqa: E402
+
+
+def run(config_name, requests):
+    app = create_app(config_name)
+    with app.app_context():
+        db.create_all()
+        Role.insert_roles()
+        user = User(
+            email="john@example.com", username="john", password="cat", confirmed=True
+        )
+        db.session.add(user)
+        db.session.commit()
+        url = "/api/v1/users/{}".format(user.id)
+        token = user.generate_auth_token(expiration=3600)
+        headers = {
+            "Authorization": "Basic "
+            + b64encode((token + ":").encode("utf-8")).decode("utf-8"),
+            "Accept": "application/json",
+        }
+        client = app.test_client()
+        for _ in range(50):
+            client.get(url, headers=headers)
+        start = time.perf_counter()
+        for _ in range(requests):
+            response = client.get(url, headers=headers)
+        elapsed = time.perf_counter() - start
+        assert response.status_code == 200, response.status_code
+        db.session.remove()
+        db.drop_all()
+    return elapsed / requests
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--requests", type=int, default=1000)
+    args = parser.parse_args()
+
+    full = run("testing", args.requests)
+    slim = run("api", args.requests)
+    click.echo("full profile: %8.1f us/request" % (full * 1e6))
+    click.echo("api profile:  %8.1f us/request" % (slim * 1e6))
+    click.echo(
+        "saved:        %8.1f us/request (%.0f%%)"
+        % ((full - slim) * 1e6, 100 * (full - slim) / full)
+    )
+
+
+if __name__ == "__main__":
+    main()
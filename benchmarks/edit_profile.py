@@ -0,0 +1,81 @@
+"""
+Cost of the admin edit-profile POST path.
+
+Logs in as the administrator through the test client and repeatedly submits
+the edit-profile form of another user, reporting the mean time and the number
+of SQL statements per request.
+
+    (venv) $ python -m benchmarks.edit_profile --requests 500
+"""
+import argparse
+import time
+
+import click
+from sqlalchemy import event
+
+from app import create_app, db
+from app.models import Role, User
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--requests", type=int, default=300)
+    args = parser.parse_args()
+
+    app = create_app("testing")
+    with app.app_context():
+        db.create_all()
+        Role.insert_roles()
+        admin = User(
+            email=app.config["APP_ADMIN"],
+            username="admin",
+            password="admin123",
+            confirmed=True,
+        )
+        user = User(email="john@example.com", username="john", password="cat")
+        db.session.add_all([admin, user])
+        db.session.commit()
+        url = "/edit-profile/{}".format(user.id)
+        role_id = Role.query.filter_by(name="User").first().id
+
+        client = app.test_client(use_cookies=True)
+        client.post(
+            "/auth/login",
+            data={"email": app.config["APP_ADMIN"], "password": "admin123"},
+        )
+
+        statements = []
+        event.listen(
+            db.engine, "before_cursor_execute", lambda *args: statements.append(1)
+        )
+
+        def submit(i):
+            return client.post(
+                url,
+                data={
+                    "email": "john@example.com",
+                    "username": "john",
+                    "confirmed": "y",
+                    "role": role_id,
+                    "name": "John %d" % i,
+                    "location": "Jaipur",
+                    "about_me": "benchmark",
+                },
+            )
+
+        for i in range(20):
+            submit(i)
+        del statements[:]
+        start = time.perf_counter()
+        for i in range(args.requests):
+            response = submit(i)
+        elapsed = time.perf_counter() - start
+        assert response.status_code == 302, response.status_code
+        click.echo(
+            "edit-profile POST: %8.1f us/request, %.1f SQL statements/request"
+            % (elapsed / args.requests * 1e6, len(statements) / args.requests)
+        )
+
+
+if __name__ == "__main__":
+    main()
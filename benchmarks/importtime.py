@@ -0,0 +1,69 @@
+"""
+Import time breakdown of the WSGI entry point.
+
+Runs ``python -X importtime -c "import manage"`` in a fresh interpreter for
+each profile and reports the total import time together with the most
+expensive packages, so the cost of a cold start or of a worker
+respawn can be compared between configurations.
+
+    (venv) $ python -m benchmarks.importtime
+    (venv) $ python -m benchmarks.importtime --top 15 --repeat 5
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+import click
+
+basedir = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir))
+
+PROFILES = {
+    "full": {"FLASK_BLUEPRINTS": "main,auth,api"},
+    "api-only": {"FLASK_BLUEPRINTS": "api"},
+}
+
+
+def measure(env_overrides, module="manage"):
+    """Return a {package: self microseconds} mapping for one cold import."""
+    env = dict(os.environ, FLASK_CONFIG="testing", **env_overrides)
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import %s" % module],
+        cwd=basedir,
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    timings = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        self_time, _, name = line[len("import time:") :].split("|")
+        # attribute the time spent in each module to its top level package
+        package = name.strip().split(".")[0]
+        timings[package] = timings.get(package, 0) + int(self_time)
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--top", type=int, default=10)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    for profile, env in PROFILES.items():
+        runs = [measure(env) for _ in range(args.repeat)]
+        totals = [sum(run.values()) for run in runs]
+        click.echo(
+            "%-10s total import time: %7.1f ms (median of %d)"
+            % (profile, statistics.median(totals) / 1000, args.repeat)
+        )
+        last = runs[-1]
+        for name, self_time in sorted(last.items(), key=lambda i: -i[1])[: args.top]:
+            click.echo("    %-30s %7.1f ms" % (name, self_time / 1000))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,262 @@
+"""
+Load test of the API driven by the Postman collection.
+
+Every request of the collection in api_collections/postman is a scenario. For
+each database size the scenarios are sent to the application, through the Flask
+test client or a locally started gunicorn, and the throughput and the p50, p95
+and p99 latencies of each one are reported. The results are saved as JSON
+together with the commit they were measured on, so that two runs can be compared.
+
+    (venv) $ flask bench --users 1000 100000 1000000
+    (venv) $ flask bench --server gunicorn --workers 4 --concurrency 8
+    (venv) $ flask bench --scenario token --compare bench-results/<earlier>.json
+
+The databases are SQLite files seeded once per size in bench-data/, the results
+are written to bench-results/.
+"""
+import argparse
+import itertools
+import json
+import logging
+import os
+import platform
+import subprocess
+import time
+from contextlib import contextmanager
+
+import click
+
+from app import create_app, db
+
+from . import collection, runner, seed
+
+RESULTS_DIR = "bench-results"
+
+
+def _git(*args):
+    try:
+        return subprocess.run(
+            ("git",) + args, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def app_factory(config_name):
+    """Return create_app(database_url) for a configuration."""
+
+    def factory(url):
+        app = create_app(config_name)
+        app.config["SQLALCHEMY_DATABASE_URI"] = url
+        return app
+
+    return factory
+
+
+@contextmanager
+def _discard_access_log(discard):
+    """
+    Through the test client the access log is formatted as in production, but
+    not printed. The handler is there before the application adds its own.
+    """
+    logger = logging.getLogger("app.access")
+    handlers = logger.handlers
+    if discard:
+        logger.handlers = [logging.StreamHandler(open(os.devnull, "w"))]
+    try:
+        yield
+    finally:
+        logger.handlers = handlers
+
+
+def run(
+    users=(1000,),
+    server="client",
+    config_name="production",
+    workers=4,
+    concurrency=1,
+    requests=200,
+    warmup=10,
+    max_seconds=60,
+    scenarios=(),
+    collection_path=collection.COLLECTION,
+    data_dir=seed.DATA_DIR,
+    report=print,
+):
+    """Run the scenarios on every database size and return the results."""
+    all_scenarios, initial_variables = collection.load(collection_path)
+    selected = [
+        scenario
+        for scenario in all_scenarios
+        if not scenarios or any(name in scenario.name for name in scenarios)
+    ]
+    factory = app_factory(config_name)
+
+    results = {
+        "commit": _git("rev-parse", "HEAD"),
+        "dirty": bool(_git("status", "--porcelain", "--untracked-files=no")),
+        "time": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "python": platform.python_version(),
+        "server": server,
+        "config": config_name,
+        "workers": workers if server == "gunicorn" else None,
+        "concurrency": concurrency,
+        "results": [],
+    }
+    for count in users:
+        report("seeding %d users" % count)
+        path = seed.database(factory, config_name, count, data_dir)
+        url = "sqlite:///" + os.path.abspath(path)
+        with _discard_access_log(server == "client"):
+            if server == "gunicorn":
+                target = runner.GunicornTarget(url, config_name, workers)
+            else:
+                app = factory(url)
+                target = runner.ClientTarget(app)
+            try:
+                variables = dict(initial_variables)
+                numbers = {scenario: itertools.count() for scenario in all_scenarios}
+                # the scenarios setting variables run once first, as the later
+                # ones may depend on them
+                for scenario in all_scenarios:
+                    if scenario.sets:
+                        request = scenario.request(variables, next(numbers[scenario]))
+                        status, body = target.request(*request)
+                        if status < 300:
+                            scenario.update(variables, body)
+                # the POST scenarios create users with ids after the seeded ones
+                options = dict(
+                    concurrency=concurrency, first_id=count + 1, max_seconds=max_seconds
+                )
+                for scenario in selected:
+                    n = numbers[scenario]
+                    runner.measure(target, scenario, variables, warmup, n, **options)
+                    stats = runner.measure(
+                        target, scenario, variables, requests, n, **options
+                    )
+                    report(_format(count, scenario, stats))
+                    results["results"].append(
+                        dict(
+                            users=count,
+                            scenario=scenario.name,
+                            method=scenario.method,
+                            path=scenario.path,
+                            **stats,
+                        )
+                    )
+            finally:
+                target.close()
+                if server == "client":
+                    with app.app_context():
+                        db.engine.dispose()
+                os.remove(path)
+    return results
+
+
+def _format(count, scenario, stats):
+    return "%8d users  %-28s %8.1f req/s  p50 %8.1f  p95 %8.1f  p99 %8.1f ms  %s" % (
+        count,
+        scenario.name,
+        stats["throughput"],
+        stats["p50_ms"] or 0,
+        stats["p95_ms"] or 0,
+        stats["p99_ms"] or 0,
+        " ".join("%s:%d" % status for status in stats["statuses"].items()),
+    )
+
+
+def save(results, path=None):
+    """Write the results as JSON, by default to bench-results/, return the path."""
+    if path is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        path = os.path.join(
+            RESULTS_DIR,
+            "%s-%s.json"
+            % (
+                time.strftime("%Y%m%dT%H%M%S", time.gmtime()),
+                (results["commit"] or "unknown")[:10],
+            ),
+        )
+    with open(path, "w") as f:
+        json.dump(results, f, indent=2)
+        f.write("\n")
+    return path
+
+
+def compare(baseline, results, report=print):
+    """Report the throughput and p95 changes of the scenarios run in both."""
+    before = {(r["users"], r["scenario"]): r for r in baseline["results"]}
+    commit = (baseline["commit"] or "unknown")[:10]
+    if baseline["dirty"]:
+        commit += " (dirty)"
+    report("compared with %s" % commit)
+    for result in results["results"]:
+        old = before.get((result["users"], result["scenario"]))
+        if old is None or not old["throughput"] or not old["p95_ms"]:
+            continue
+        report(
+            "%8d users  %-28s req/s %+7.1f%%  p95 %+7.1f%%"
+            % (
+                result["users"],
+                result["scenario"],
+                100 * (result["throughput"] / old["throughput"] - 1),
+                100 * ((result["p95_ms"] or 0) / old["p95_ms"] - 1),
+            )
+        )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="flask bench", description=__doc__.splitlines()[1]
+    )
+    parser.add_argument(
+        "--users",
+        type=int,
+        nargs="+",
+        default=[1000],
+        help="database sizes, e.g. 1000 100000 1000000 (default: 1000)",
+    )
+    parser.add_argument("--server", choices=["client", "gunicorn"], default="client")
+    parser.add_argument("--config", default="production")
+    parser.add_argument("--workers", type=int, default=4, help="gunicorn workers")
+    parser.add_argument("--concurrency", type=int, default=1, help="client threads")
+    parser.add_argument("--requests", type=int, default=200, help="per scenario")
+    parser.add_argument("--warmup", type=int, default=10, help="per scenario")
+    parser.add_argument(
+        "--max-seconds",
+        type=float,
+        default=60,
+        help="stop a scenario after this time, whatever the number of requests",
+    )
+    parser.add_argument(
+        "--scenario",
+        action="append",
+        default=[],
+        help="only run the scenarios whose name contains this text",
+    )
+    parser.add_argument("--collection", default=collection.COLLECTION)
+    parser.add_argument("--data-dir", default=seed.DATA_DIR)
+    parser.add_argument("--output", help="results file (default: bench-results/)")
+    parser.add_argument("--compare", help="results file of an earlier run")
+    args = parser.parse_args(argv)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+    results = run(
+        users=args.users,
+        server=args.server,
+        config_name=args.config,
+        workers=args.workers,
+        concurrency=args.concurrency,
+        requests=args.requests,
+        warmup=args.warmup,
+        max_seconds=args.max_seconds,
+        scenarios=args.scenario,
+        collection_path=args.collection,
+        data_dir=args.data_dir,
+    )
+    click.echo("results saved to %s" % save(results, args.output))
+    if baseline is not None:
+        compare(baseline, results)
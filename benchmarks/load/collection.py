@@ -0,0 +1,133 @@
+"""
+Load scenarios read from a Postman collection.
+
+Every request of the collection becomes a Scenario, in collection order.
+Collection variables ({{token}}) are substituted from the values set by the
+test scripts of earlier requests, e.g.
+
+    pm.collectionVariables.set("token", jsonData.token);
+
+stores the "token" key of the JSON response in the "token" variable.
+"""
+import copy
+import json
+import re
+from base64 import b64encode
+from urllib.parse import urlencode
+
+COLLECTION = "api_collections/postman/Flask Application.postman_collection.json"
+
+VARIABLE = re.compile(r"{{\s*(\w+)\s*}}")
+SET_VARIABLE = re.compile(
+    r"pm\.(?:collectionVariables|environment|globals)\.set\(\s*"
+    r"[\"'](\w+)[\"']\s*,\s*\w+\.(\w+)\s*\)"
+)
+
+# fields of the JSON bodies that identify a new resource, they are made unique
+# for each request so that repeated POSTs keep creating resources
+UNIQUE_FIELDS = ("email", "username")
+
+
+class Scenario:
+    def __init__(self, name, method, path, auth=None, body=None, sets=None):
+        self.name = name
+        self.method = method
+        self.path = path
+        self.auth = auth
+        self.body = body
+        # {variable: key of the JSON response}
+        self.sets = sets or {}
+
+    def __repr__(self):
+        return "<Scenario %r %s %s>" % (self.name, self.method, self.path)
+
+    def request(self, variables, n=0, first_id=None):
+        """
+        Return the method, path, headers and body of the n-th request of the
+        scenario. Resource ids in the body are renumbered from first_id.
+        """
+        headers = {"Accept": "application/json"}
+        if self.auth is not None:
+            username, password = (substitute(value, variables) for value in self.auth)
+            credentials = ("%s:%s" % (username, password)).encode("utf-8")
+            headers["Authorization"] = "Basic " + b64encode(credentials).decode()
+        body = None
+        if self.body is not None:
+            data = copy.deepcopy(self.body)
+            if isinstance(data, dict):
+                for field in UNIQUE_FIELDS:
+                    if isinstance(data.get(field), str):
+                        data[field] = "bench%d-%s" % (n, data[field])
+                if first_id is not None and "id" in data:
+                    data["id"] = first_id + n
+            body = json.dumps(data).encode("utf-8")
+            headers["Content-Type"] = "application/json"
+        return self.method, substitute(self.path, variables), headers, body
+
+    def update(self, variables, response):
+        """Set the variables of the test script from the JSON response."""
+        if not self.sets:
+            return
+        data = json.loads(response)
+        for variable, key in self.sets.items():
+            variables[variable] = data[key]
+
+
+def substitute(value, variables):
+    return VARIABLE.sub(lambda m: str(variables.get(m.group(1), "")), value)
+
+
+def _path(url):
+    if isinstance(url, str):
+        return "/" + url.split("://", 1)[-1].split("/", 1)[-1]
+    path = "/" + "/".join(url.get("path", []))
+    query = [
+        (q["key"], q.get("value") or "")
+        for q in url.get("query", [])
+        if not q.get("disabled")
+    ]
+    if query:
+        path += "?" + urlencode(query)
+    return path
+
+
+def _auth(auth):
+    if not auth or auth.get("type") != "basic":
+        return None
+    values = {item["key"]: item.get("value", "") for item in auth["basic"]}
+    return values.get("username", ""), values.get("password", "")
+
+
+def _sets(events):
+    sets = {}
+    for event in events or []:
+        if event.get("listen") == "test":
+            sets.update(SET_VARIABLE.findall("\n".join(event["script"]["exec"])))
+    return sets
+
+
+def _walk(items, auth):
+    for item in items:
+        if "item" in item:
+            yield from _walk(item["item"], item.get("auth", auth))
+            continue
+        request = item["request"]
+        body = None
+        if request.get("body", {}).get("mode") == "raw":
+            body = json.loads(request["body"]["raw"])
+        yield Scenario(
+            item["name"],
+            request["method"],
+            _path(request["url"]),
+            auth=_auth(request.get("auth", auth)),
+            body=body,
+            sets=_sets(item.get("event")),
+        )
+
+
+def load(path=COLLECTION):
+    """Return the scenarios and the initial variables of a collection."""
+    with open(path) as f:
+        collection = json.load(f)
+    variables = {v["key"]: v.get("value", "") for v in collection.get("variable", [])}
+    return list(_walk(collection["item"], collection.get("auth"))), variables
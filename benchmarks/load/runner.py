@@ -0,0 +1,185 @@
+"""
+Targets the scenarios are run against, and the latency measurements.
+"""
+import http.client
+import itertools
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+from collections import Counter
+from urllib.parse import urlsplit
+
+# redirects followed by HTTPTarget, as Postman does
+REDIRECTS = (301, 302, 303, 307, 308)
+MAX_REDIRECTS = 5
+
+
+class ClientTarget:
+    """The application in this process, through the Flask test client."""
+
+    def __init__(self, app):
+        self.app = app
+        self.local = threading.local()
+
+    def request(self, method, path, headers, body):
+        client = getattr(self.local, "client", None)
+        if client is None:
+            client = self.local.client = self.app.test_client()
+        # Postman follows redirects, e.g. to the URL with a trailing slash
+        response = client.open(
+            path,
+            method=method,
+            headers=headers,
+            data=body,
+            buffered=True,
+            follow_redirects=True,
+        )
+        return response.status_code, response.get_data()
+
+    def close(self):
+        pass
+
+
+class HTTPTarget:
+    """A server listening on host:port, with one connection per thread."""
+
+    def __init__(self, host, port):
+        self.host = host
+        self.port = port
+        self.local = threading.local()
+
+    def request(self, method, path, headers, body):
+        connection = getattr(self.local, "connection", None)
+        if connection is None:
+            connection = http.client.HTTPConnection(self.host, self.port, timeout=300)
+            self.local.connection = connection
+        try:
+            for _ in range(MAX_REDIRECTS):
+                connection.request(method, path, body=body, headers=headers)
+                response = connection.getresponse()
+                data = response.read()
+                location = response.getheader("Location")
+                if response.status not in REDIRECTS or location is None:
+                    break
+                path = urlsplit(location)._replace(scheme="", netloc="").geturl()
+                if response.status == 303:
+                    method, body = "GET", None
+            return response.status, data
+        except (http.client.HTTPException, OSError):
+            connection.close()
+            self.local.connection = None
+            raise
+
+    def close(self):
+        pass
+
+
+class GunicornTarget(HTTPTarget):
+    """gunicorn serving manage:app from a database URL on a free local port."""
+
+    def __init__(self, database_url, config_name, workers, timeout=60):
+        with socket.socket() as s:
+            s.bind(("127.0.0.1", 0))
+            port = s.getsockname()[1]
+        super().__init__("127.0.0.1", port)
+        env = dict(os.environ, FLASK_CONFIG=config_name)
+        # each configuration reads the database URL from its own variable
+        for name in ("DATABASE_URL", "DEV_DATABASE_URL", "TEST_DATABASE_URL"):
+            env[name] = database_url
+        self.process = subprocess.Popen(
+            [
+                sys.executable,
+                "-m",
+                "gunicorn",
+                "-b",
+                "%s:%d" % (self.host, port),
+                "-w",
+                str(workers),
+                "--timeout",
+                "300",
+                "--log-level",
+                "warning",
+                "manage:app",
+            ],
+            env=env,
+            # the access log is written as it would be in production, and
+            # discarded
+            stdout=subprocess.DEVNULL,
+        )
+        deadline = time.monotonic() + timeout
+        while True:
+            if self.process.poll() is not None:
+                raise RuntimeError("gunicorn exited with %d" % self.process.returncode)
+            try:
+                socket.create_connection((self.host, port), timeout=1).close()
+                break
+            except OSError:
+                if time.monotonic() > deadline:
+                    self.close()
+                    raise RuntimeError("gunicorn did not start in %ds" % timeout)
+                time.sleep(0.1)
+
+    def close(self):
+        self.process.terminate()
+        self.process.wait()
+
+
+def percentile(latencies, p):
+    """Nearest rank percentile of a sorted list."""
+    if not latencies:
+        return None
+    return latencies[max(0, -(-len(latencies) * p // 100) - 1)]
+
+
+def measure(
+    target,
+    scenario,
+    variables,
+    requests,
+    numbers,
+    concurrency=1,
+    first_id=None,
+    max_seconds=None,
+):
+    """
+    Send `requests` requests of a scenario from `concurrency` threads, or as many
+    as fit in max_seconds, and return their statistics. `numbers` is the
+    iterator of the request numbers of the scenario.
+    """
+    remaining = itertools.count()
+    samples = []
+
+    def worker():
+        while next(remaining) < requests:
+            if max_seconds is not None and time.perf_counter() - start > max_seconds:
+                break
+            request = scenario.request(variables, next(numbers), first_id)
+            sent = time.perf_counter()
+            try:
+                status = target.request(*request)[0]
+            except (http.client.HTTPException, OSError):
+                status = "error"
+            samples.append((time.perf_counter() - sent, status))
+
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    latencies = sorted(round(latency * 1000, 3) for latency, _ in samples)
+    statuses = Counter(str(status) for _, status in samples)
+    return {
+        "requests": len(samples),
+        "seconds": round(elapsed, 3),
+        "throughput": round(len(samples) / elapsed, 1) if samples else 0.0,
+        "p50_ms": percentile(latencies, 50),
+        "p95_ms": percentile(latencies, 95),
+        "p99_ms": percentile(latencies, 99),
+        "statuses": dict(sorted(statuses.items())),
+    }
@@ -0,0 +1,88 @@
+"""
+Seeded SQLite databases of a given number of users.
+
+Each size is seeded once into <data dir>/<config>-users-<count>.sqlite and
+reused by the later runs; the configuration is part of the name as it selects
+the password hashing method. A run works on a copy of it, so the users created
+by the POST scenarios do not leak into the next run and every run starts from
+the same data.
+"""
+import hashlib
+import os
+import shutil
+from datetime import datetime
+
+from werkzeug.security import generate_password_hash
+
+from app import db, deploy
+from app.models import Role, User
+
+DATA_DIR = "bench-data"
+
+# the regular user account of the collection, next to the administrator
+# created by the deployment
+COLLECTION_USER = dict(
+    email="vaibhav22@example.com", username="vaibhav22", password="user123"
+)
+
+
+def seed(app, users, batch_size=10000):
+    """Create the schema and bulk insert users up to a total of `users`."""
+    with app.app_context():
+        db.create_all()
+        deploy.seed()
+        if User.query.filter_by(email=COLLECTION_USER["email"]).first() is None:
+            db.session.add(User(confirmed=True, **COLLECTION_USER))
+            db.session.commit()
+        role_id = Role.query.filter_by(default=True).first().id
+        # hashing a password per user would dominate the seeding time, they
+        # all share the same one
+        password_hash = generate_password_hash(
+            "password", app.config["FLASK_PASSWORD_HASH_METHOD"]
+        )
+        now = datetime.utcnow()
+        first = User.query.count()
+        for start in range(first, users, batch_size):
+            rows = []
+            for i in range(start, min(start + batch_size, users)):
+                email = "user%d@example.com" % i
+                rows.append(
+                    {
+                        "email": email,
+                        "username": "user%d" % i,
+                        "role_id": role_id,
+                        "password_hash": password_hash,
+                        "confirmed": True,
+                        "name": "User %d" % i,
+                        "location": "Location %d" % (i % 100),
+                        "about_me": "Seeded for the benchmarks.",
+                        "member_since": now,
+                        "last_seen": now,
+                        "avatar_hash": hashlib.md5(email.encode("utf-8")).hexdigest(),
+                    }
+                )
+            db.session.execute(User.__table__.insert(), rows)
+            db.session.commit()
+        db.session.remove()
+        db.engine.dispose()
+
+
+def database(create_app, config_name, users, data_dir=DATA_DIR):
+    """
+    Return the path of a fresh copy of the database seeded with `users` users,
+    seeding it first if needed. create_app(url) returns an application bound to
+    the database URL.
+    """
+    os.makedirs(data_dir, exist_ok=True)
+    seeded = os.path.join(data_dir, "%s-users-%d.sqlite" % (config_name, users))
+    if not os.path.exists(seeded):
+        # seeded under another name, so that an interrupted seeding is not
+        # mistaken for a complete one
+        partial = seeded + ".partial"
+        if os.path.exists(partial):
+            os.remove(partial)
+        seed(create_app("sqlite:///" + os.path.abspath(partial)), users)
+        os.replace(partial, seeded)
+    path = os.path.join(data_dir, "run.sqlite")
+    shutil.copyfile(seeded, path)
+    return path
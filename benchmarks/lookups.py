@@ -0,0 +1,96 @@
+"""
+Per-lookup overhead of the query repository against Query.filter_by().
+
+Looks up users of an in-memory database by email, by username and by id, once
+with the Query API the views used (filter_by().first() and Query.get()) and once
+with the prebuilt statements of app/queries.py, and reports the time per lookup.
+The lookups by id are measured with the user already in the identity map, as
+for the logged in user of a request, and with an empty one.
+
+    (venv) $ python -m benchmarks.lookups --number 20000
+"""
+import argparse
+import timeit
+
+import click
+
+from app import create_app, db, queries
+from app.models import Role, User
+
+USERS = 1000
+
+
+def seed():
+    db.create_all()
+    Role.insert_roles()
+    db.session.execute(
+        User.__table__.insert(),
+        [
+            {"email": "user%d@example.com" % i, "username": "user%d" % i}
+            for i in range(USERS)
+        ],
+    )
+    db.session.commit()
+
+
+def lookups():
+    email, username, id = "user500@example.com", "user500", 501
+
+    def expunged(lookup):
+        def run():
+            db.session.expunge_all()
+            return lookup()
+
+        return run
+
+    # the identity map only holds weak references, the request holds its user
+    loaded = queries.user(id)
+
+    return [
+        (
+            "by email",
+            lambda: User.query.filter_by(email=email).first(),
+            lambda: queries.user_by_email(email),
+        ),
+        (
+            "by username",
+            lambda: User.query.filter_by(username=username).first(),
+            lambda: queries.user_by_username(username),
+        ),
+        (
+            "by id, in identity map",
+            lambda: loaded and User.query.get(id),
+            lambda: loaded and queries.user(id),
+        ),
+        (
+            "by id, not loaded",
+            expunged(lambda: User.query.get(id)),
+            expunged(lambda: queries.user(id)),
+        ),
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--number", type=int, default=20000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    app = create_app("testing")
+    with app.app_context():
+        seed()
+        for name, query, repository in lookups():
+            query(), repository()
+            before, after = (
+                min(timeit.repeat(f, number=args.number, repeat=args.repeat))
+                / args.number
+                for f in (query, repository)
+            )
+            click.echo(
+                "%-24s filter_by/get: %6.1f us  repository: %6.1f us  (%+.0f%%)"
+                % (name, before * 1e6, after * 1e6, 100 * (after / before - 1))
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""
+Memory and CPU of ORM users against UserRecords, per 10k rows.
+
+Loads the users of an in-memory database as ORM instances, as the list views
+did, and as the UserRecords of app/records.py, then serializes them with
+to_json(), and reports the time of each step and the memory held by the loaded
+rows, measured with tracemalloc.
+
+    (venv) $ python -m benchmarks.read_models --rows 10000
+"""
+import argparse
+import gc
+import time
+import tracemalloc
+
+import click
+
+from app import create_app, db
+from app.models import Role, User
+from app.records import select_users, user_records
+
+
+def seed(rows):
+    db.create_all()
+    Role.insert_roles()
+    db.session.execute(
+        User.__table__.insert(),
+        [
+            {
+                "email": "user%d@example.com" % i,
+                "username": "user%d" % i,
+                "role_id": 1,
+                "name": "User %d" % i,
+                "about_me": "About user %d" % i,
+                "avatar_hash": "%032x" % i,
+            }
+            for i in range(rows)
+        ],
+    )
+    db.session.commit()
+
+
+def measure(load):
+    db.session.remove()
+    gc.collect()
+    tracemalloc.start()
+    users = load()
+    held = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    # serialized without tracemalloc, which slows down allocations
+    start_json = time.perf_counter()
+    [user.to_json() for user in users]
+    end = time.perf_counter()
+    return end - start_json, held
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rows", type=int, default=10000)
+    args = parser.parse_args()
+
+    app = create_app("testing")
+    app.config["SERVER_NAME"] = "localhost"
+    with app.app_context():
+        seed(args.rows)
+        loads = (
+            ("ORM", lambda: User.query.all()),
+            ("records", lambda: user_records(select_users())),
+        )
+        for name, load in loads:
+            load()
+            # the load time without tracemalloc
+            db.session.remove()
+            start = time.perf_counter()
+            load()
+            load_seconds = time.perf_counter() - start
+            json_seconds, held = measure(load)
+            scale = 10000 / args.rows
+            click.echo(
+                "%-8s load: %7.1f ms  to_json: %7.1f ms  memory: %6.1f MiB  per 10k rows"
+                % (
+                    name,
+                    load_seconds * scale * 1000,
+                    json_seconds * scale * 1000,
+                    held * scale / 2**20,
+                )
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+"""
+Concurrent reads and writes on a SQLite database file.
+
+Runs the same mix of transactions, from several processes with several threads
+each, once with the SQLite defaults and once with the SQLite profile of the
+application (WAL journal, synchronous=NORMAL, memory map, page cache, busy
+timeout, pooled connections and a per-process write queue), and reports the
+throughput, the latency of the writes and the "database is locked" errors.
+
+    (venv) $ python -m benchmarks.sqlite_concurrency --processes 4 --threads 4
+"""
+import argparse
+import multiprocessing
+import os
+import random
+import shutil
+import tempfile
+import threading
+import time
+
+import click
+from sqlalchemy.exc import OperationalError
+
+from app import create_app, db
+from app.models import Role, User
+
+USERS = 1000
+
+
+def make_app(path, profile):
+    app = create_app("testing")
+    app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite:///" + path
+    if not profile:
+        app.config["SQLALCHEMY_SQLITE_PRAGMAS"] = {}
+    return app
+
+
+def seed(path):
+    app = make_app(path, profile=True)
+    with app.app_context():
+        db.create_all()
+        Role.insert_roles()
+        db.session.execute(
+            User.__table__.insert(),
+            [
+                {"email": "user%d@example.com" % i, "username": "user%d" % i}
+                for i in range(USERS)
+            ],
+        )
+        db.session.commit()
+        db.engine.dispose()
+
+
+def worker(args):
+    path, profile, threads, seconds, write_ratio = args
+    app = make_app(path, profile)
+    samples = []
+    deadline = time.perf_counter() + seconds
+
+    def run():
+        rng = random.Random()
+        with app.app_context():
+            while time.perf_counter() < deadline:
+                write = rng.random() < write_ratio
+                start = time.perf_counter()
+                try:
+                    user = db.session.get(User, rng.randint(1, USERS))
+                    if write:
+                        user.about_me = "updated at %f" % start
+                        db.session.commit()
+                    else:
+                        user.about_me
+                        db.session.rollback()
+                    ok = True
+                except OperationalError:
+                    db.session.rollback()
+                    ok = False
+                samples.append((write, time.perf_counter() - start, ok))
+            db.session.remove()
+
+    pool = [threading.Thread(target=run) for _ in range(threads)]
+    for thread in pool:
+        thread.start()
+    for thread in pool:
+        thread.join()
+    return samples
+
+
+def measure(path, profile, processes, threads, seconds, write_ratio):
+    with multiprocessing.get_context("fork").Pool(processes) as pool:
+        results = pool.map(
+            worker, [(path, profile, threads, seconds, write_ratio)] * processes
+        )
+    samples = [sample for result in results for sample in result]
+    writes = sorted(latency for write, latency, ok in samples if write and ok)
+    return {
+        "reads": sum(1 for write, _, ok in samples if not write and ok) / seconds,
+        "writes": len(writes) / seconds,
+        "errors": sum(1 for _, _, ok in samples if not ok),
+        "p50": writes[len(writes) // 2] if writes else 0,
+        "p95": writes[int(len(writes) * 0.95)] if writes else 0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--processes", type=int, default=4)
+    parser.add_argument("--threads", type=int, default=4)
+    parser.add_argument("--seconds", type=float, default=5)
+    parser.add_argument("--write-ratio", type=float, default=0.2)
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp()
+    try:
+        for name, profile in (("defaults", False), ("profile", True)):
+            path = os.path.join(directory, "%s.sqlite" % name)
+            seed(path)
+            stats = measure(
+                path,
+                profile,
+                args.processes,
+                args.threads,
+                args.seconds,
+                args.write_ratio,
+            )
+            click.echo(
+                "%-9s reads: %7.0f/s  writes: %6.0f/s  write p50: %6.1f ms  "
+                "p95: %7.1f ms  locked errors: %d"
+                % (
+                    name,
+                    stats["reads"],
+                    stats["writes"],
+                    stats["p50"] * 1000,
+                    stats["p95"] * 1000,
+                    stats["errors"],
+                )
+            )
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == "__main__":
+    main()
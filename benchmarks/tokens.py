@@ -0,0 +1,59 @@
+"""
+Sign and verify throughput of authentication tokens.
+
+Compares the compact tokens of app.tokens with the itsdangerous JSON Web
+Signature tokens they replace.
+
+    (venv) $ python -m benchmarks.tokens --number 20000
+"""
+import argparse
+import timeit
+import warnings
+
+import click
+from itsdangerous import TimedJSONWebSignatureSerializer as Serializer
+
+from app import tokens
+
+SECRET_KEY = "hard to guess string"
+
+
+def report(name, number, sign, verify):
+    sign_time = timeit.timeit(sign, number=number)
+    verify_time = timeit.timeit(verify, number=number)
+    click.echo(
+        "%-12s sign: %9.0f tokens/s  verify: %9.0f tokens/s"
+        % (name, number / sign_time, number / verify_time)
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--number", type=int, default=10000)
+    args = parser.parse_args()
+
+    warnings.simplefilter("ignore", DeprecationWarning)
+    serializer = Serializer(SECRET_KEY, expires_in=3600)
+    legacy_token = serializer.dumps({"id": 12345})
+    report(
+        "itsdangerous",
+        args.number,
+        lambda: Serializer(SECRET_KEY, expires_in=3600).dumps({"id": 12345}),
+        lambda: Serializer(SECRET_KEY).loads(legacy_token)["id"],
+    )
+
+    signer = tokens.TokenSigner([SECRET_KEY])
+    token = signer.dumps(tokens.AUTH, 12345, 3600)
+    report(
+        "compact",
+        args.number,
+        lambda: signer.dumps(tokens.AUTH, 12345, 3600),
+        lambda: signer.loads(tokens.AUTH, token),
+    )
+    click.echo(
+        "token length: itsdangerous %d, compact %d" % (len(legacy_token), len(token))
+    )
+
+
+if __name__ == "__main__":
+    main()
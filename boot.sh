@@ -1,7 +1,6 @@
 #!/bin/sh
 source venv/bin/activate
 while true; do
-    flask dropdeploy
     flask deploy
     if [[ "$?" == "0" ]]; then
         break
@@ -9,4 +8,5 @@ while true; do
     echo Deploying First Time command failed, retrying in 5 secs...
     sleep 5
 done
-exec gunicorn -b :5000 --access-logfile - --error-logfile - manage:app
+flask assets build
+exec gunicorn -b :5000 --error-logfile - manage:app
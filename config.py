@@ -9,15 +9,143 @@ class Config:
     FLASK_USERS_PER_PAGE = 5
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     SQLALCHEMY_RECORD_QUERIES = True
+    # Read replicas of the primary database, as comma separated URLs. They are
+    # the binds replica0, replica1... and serve the reads of the GET requests,
+    # except for SQLALCHEMY_REPLICA_LAG seconds after a user wrote something.
+    SQLALCHEMY_BINDS = {
+        "replica%d" % i: url
+        for i, url in enumerate(
+            url for url in os.environ.get("DATABASE_REPLICA_URLS", "").split(",") if url
+        )
+    } or None
+    SQLALCHEMY_REPLICA_BINDS = sorted(SQLALCHEMY_BINDS or ())
+    SQLALCHEMY_REPLICA_LAG = float(os.environ.get("DATABASE_REPLICA_LAG", "5"))
+    # Pragmas of the connections to SQLite database files, with the writes of
+    # the threads of a process serialized, see app/sqlite.py. SQLITE_PROFILE=0
+    # keeps the SQLite defaults.
+    SQLALCHEMY_SQLITE_PRAGMAS = {
+        "journal_mode": "wal",
+        "synchronous": "normal",
+        "mmap_size": 256 * 1024 * 1024,
+        "cache_size": -64 * 1024,  # KiB
+        "busy_timeout": 5000,  # ms
+    }
+    if os.environ.get("SQLITE_PROFILE", "true").lower() not in ["true", "on", "1"]:
+        SQLALCHEMY_SQLITE_PRAGMAS = {}
+    SQLALCHEMY_SQLITE_SERIALIZE_WRITES = True
     FLASK_SLOW_DB_QUERY_TIME = 0.5
+    # werkzeug password hash method, the number of iterations defaults to the
+    # werkzeug recommendation
+    FLASK_PASSWORD_HASH_METHOD = "pbkdf2:sha256"
+    # Password checks allowed per client address and per account within a sliding
+    # window of FLASK_LOGIN_ATTEMPT_WINDOW seconds. Limits are kept in memory unless
+    # FLASK_RATELIMIT_STORAGE_URL points to a Redis server shared by all workers.
+    FLASK_LOGIN_ATTEMPTS_PER_IP = int(
+        os.environ.get("FLASK_LOGIN_ATTEMPTS_PER_IP", "100")
+    )
+    FLASK_LOGIN_ATTEMPTS_PER_ACCOUNT = int(
+        os.environ.get("FLASK_LOGIN_ATTEMPTS_PER_ACCOUNT", "10")
+    )
+    FLASK_LOGIN_ATTEMPT_WINDOW = int(os.environ.get("FLASK_LOGIN_ATTEMPT_WINDOW", "60"))
+    FLASK_RATELIMIT_STORAGE_URL = os.environ.get("FLASK_RATELIMIT_STORAGE_URL")
+    # seconds a successful email/password check is remembered by the process, so
+    # clients that send their password with every request skip the password hash
+    FLASK_CREDENTIAL_CACHE_TTL = int(os.environ.get("FLASK_CREDENTIAL_CACHE_TTL", "60"))
+    FLASK_CREDENTIAL_CACHE_SIZE = 10000
+    # Rendered profile and navbar fragments are kept in an in-memory LRU of up to
+    # FLASK_FRAGMENT_CACHE_BYTES (0 disables the cache), and also shared between
+    # workers through FLASK_FRAGMENT_CACHE_DIR when it is set.
+    FLASK_FRAGMENT_CACHE_BYTES = int(
+        os.environ.get("FLASK_FRAGMENT_CACHE_BYTES", str(8 * 1024 * 1024))
+    )
+    FLASK_FRAGMENT_CACHE_TTL = int(os.environ.get("FLASK_FRAGMENT_CACHE_TTL", "300"))
+    FLASK_FRAGMENT_CACHE_DIR = os.environ.get("FLASK_FRAGMENT_CACHE_DIR")
+    # Serve identicons generated by the application from /avatar/<hash> instead of
+    # linking to gravatar.com, with the generated images kept in FLASK_AVATAR_DIR.
+    FLASK_LOCAL_AVATARS = os.environ.get("FLASK_LOCAL_AVATARS", "false").lower() in [
+        "true",
+        "on",
+        "1",
+    ]
+    FLASK_AVATAR_DIR = os.environ.get("FLASK_AVATAR_DIR") or os.path.join(
+        basedir, "avatar-cache"
+    )
+    FLASK_AVATAR_MAX_AGE = 365 * 24 * 3600
+    # Responses of these content types are compressed with the given level (1-9)
+    # when the client accepts it, unless they are smaller than
+    # FLASK_COMPRESS_MIN_SIZE bytes. An empty mapping disables the compression.
+    FLASK_COMPRESS_LEVELS = {
+        "text/html": 6,
+        "text/plain": 6,
+        "text/csv": 6,
+        "text/css": 6,
+        "application/json": 6,
+        "application/x-ndjson": 6,
+        "application/javascript": 6,
+        "image/svg+xml": 6,
+        "text/event-stream": 1,
+    }
+    FLASK_COMPRESS_MIN_SIZE = int(os.environ.get("FLASK_COMPRESS_MIN_SIZE", "500"))
+    # cache lifetime of the fingerprinted assets written by `flask assets build`
+    FLASK_ASSETS_MAX_AGE = 365 * 24 * 3600
+    # seconds between checks of the version counters of the process-wide caches
+    FLASK_CACHE_VERSION_TTL = float(os.environ.get("FLASK_CACHE_VERSION_TTL", "5"))
+    # the change feeds read the change log at least every
+    # FLASK_CHANGES_POLL_INTERVAL seconds, for the changes of other processes,
+    # and end after FLASK_CHANGES_STREAM_SECONDS, when clients reconnect
+    FLASK_CHANGES_POLL_INTERVAL = float(
+        os.environ.get("FLASK_CHANGES_POLL_INTERVAL", "5")
+    )
+    FLASK_CHANGES_STREAM_SECONDS = float(
+        os.environ.get("FLASK_CHANGES_STREAM_SECONDS", "300")
+    )
+    # seconds after which a missing change log id is taken for a rolled back
+    # transaction rather than one that has not committed yet
+    FLASK_CHANGES_GAP_GRACE = float(os.environ.get("FLASK_CHANGES_GAP_GRACE", "30"))
+    # sub-requests accepted by one /api/v1/batch request
+    FLASK_BATCH_MAX_REQUESTS = int(os.environ.get("FLASK_BATCH_MAX_REQUESTS", "20"))
+    # ids accepted by one multi-get of /api/v1/users/
+    FLASK_USERS_MAX_IDS = int(os.environ.get("FLASK_USERS_MAX_IDS", "1000"))
     MAIL_SERVER = os.environ.get("MAIL_SERVER", "smtp.googlemail.com")
     MAIL_PORT = int(os.environ.get("MAIL_PORT", "587"))
     MAIL_USE_TLS = os.environ.get("MAIL_USE_TLS", "true").lower() in ["true", "on", "1"]
     MAIL_USERNAME = os.environ.get("MAIL_USERNAME")
     MAIL_PASSWORD = os.environ.get("MAIL_PASSWORD")
     FLASK_MAIL_SUBJECT_PREFIX = "[Flask]"
+    # JSON access log written to stdout: errors and requests slower than
+    # FLASK_ACCESS_LOG_SLOW_REQUEST seconds are always logged, other requests
+    # only with a probability of FLASK_ACCESS_LOG_SAMPLE_RATE
+    FLASK_ACCESS_LOG = os.environ.get("FLASK_ACCESS_LOG", "true").lower() in [
+        "true",
+        "on",
+        "1",
+    ]
+    FLASK_ACCESS_LOG_SAMPLE_RATE = float(
+        os.environ.get("FLASK_ACCESS_LOG_SAMPLE_RATE", "1")
+    )
+    FLASK_ACCESS_LOG_SLOW_REQUEST = float(
+        os.environ.get("FLASK_ACCESS_LOG_SLOW_REQUEST", "0.5")
+    )
+    # minimum number of seconds between two error emails, the errors logged in
+    # between are sent together in a digest
+    FLASK_MAIL_DIGEST_INTERVAL = int(os.environ.get("FLASK_MAIL_DIGEST_INTERVAL", "60"))
     FLASK_MAIL_SENDER = "Flask Admin <vaibhav.hiwase@celebaltech.com>"
     SSL_REDIRECT = False
+    # Comma separated token signing keys, the first one signs new tokens and the
+    # others are still accepted while they are rotated out. Defaults to SECRET_KEY.
+    FLASK_TOKEN_KEYS = [
+        key for key in os.environ.get("FLASK_TOKEN_KEYS", "").split(",") if key
+    ]
+    # accept the JSON Web Signature tokens issued by earlier releases
+    FLASK_LEGACY_TOKENS = os.environ.get("FLASK_LEGACY_TOKENS", "true").lower() in [
+        "true",
+        "on",
+        "1",
+    ]
+    # Comma separated list of the blueprints registered by create_app. Workers
+    # that only serve the API can set FLASK_BLUEPRINTS=api to skip importing the
+    # HTML blueprints and their template-only extensions.
+    FLASK_BLUEPRINTS = os.environ.get("FLASK_BLUEPRINTS", "main,auth,api").split(",")
 
     @staticmethod
     def init_app(app):
@@ -37,21 +165,27 @@ class DevelopmentConfig(Config):
         # log to stderr
         import logging
 
+        from app.logs import add_handler, text_formatter
+
         # Create formatters and add it to handlers
-        log_format = "%(levelname)s - [%(filename)s] - %(asctime)s - %(process)d -  %(lineno)d - %(message)s "
-        f_format = logging.Formatter(log_format, datefmt="%d-%b-%y %H:%M:%S")
+        f_format = text_formatter()
         # Create handlers
         f_handler = logging.FileHandler("dev-error.log")
         f_handler.setLevel(logging.ERROR)
         f_handler.setFormatter(f_format)
         # Add handlers to the logger
-        app.logger.addHandler(f_handler)
+        add_handler(app, f_handler)
 
 
 class TestingConfig(Config):
     TESTING = True
     SQLALCHEMY_DATABASE_URI = os.environ.get("TEST_DATABASE_URL") or "sqlite://"
     WTF_CSRF_ENABLED = False
+    FLASK_ACCESS_LOG = False
+    SQLALCHEMY_BINDS = None
+    SQLALCHEMY_REPLICA_BINDS = []
+    # the tests check passwords, not the strength of their hashes
+    FLASK_PASSWORD_HASH_METHOD = "pbkdf2:sha256:1"
 
     @classmethod
     def init_app(cls, app):
@@ -60,15 +194,16 @@ class TestingConfig(Config):
         # log to stderr
         import logging
 
+        from app.logs import add_handler, text_formatter
+
         # Create formatters and add it to handlers
-        log_format = "%(levelname)s - [%(filename)s] - %(asctime)s - %(process)d -  %(lineno)d - %(message)s "
-        f_format = logging.Formatter(log_format, datefmt="%d-%b-%y %H:%M:%S")
+        f_format = text_formatter()
         # Create handlers
         f_handler = logging.FileHandler("test-error.log")
         f_handler.setLevel(logging.ERROR)
         f_handler.setFormatter(f_format)
         # Add handlers to the logger
-        app.logger.addHandler(f_handler)
+        add_handler(app, f_handler)
 
 
 class ProductionConfig(Config):
@@ -80,9 +215,10 @@ class ProductionConfig(Config):
     def init_app(cls, app):
         Config.init_app(app)
 
-        # email errors to the administrators
+        # email errors to the administrators, in digests sent from the log thread
         import logging
-        from logging.handlers import SMTPHandler
+
+        from app.logs import DigestSMTPHandler, add_handler
 
         credentials = None
         secure = None
@@ -90,16 +226,27 @@ class ProductionConfig(Config):
             credentials = (cls.MAIL_USERNAME, cls.MAIL_PASSWORD)
             if getattr(cls, "MAIL_USE_TLS", None):
                 secure = ()
-        mail_handler = SMTPHandler(
+        mail_handler = DigestSMTPHandler(
             mailhost=(cls.MAIL_SERVER, cls.MAIL_PORT),
             fromaddr=cls.FLASK_MAIL_SENDER,
             toaddrs=[cls.APP_ADMIN],
             subject=cls.FLASK_MAIL_SUBJECT_PREFIX + " Application Error",
             credentials=credentials,
             secure=secure,
+            interval=cls.FLASK_MAIL_DIGEST_INTERVAL,
         )
         mail_handler.setLevel(logging.ERROR)
-        app.logger.addHandler(mail_handler)
+        add_handler(app, mail_handler)
+
+
+# Slim profile for nodes that only serve the REST API: the HTML blueprints, their
+# template extensions, the session cookie, Flask-Login and the global request
+# hooks of the main and auth blueprints are all left out.
+class ApiConfig(ProductionConfig):
+    FLASK_BLUEPRINTS = ["api"]
+    # the slow query report is written by the main blueprint, so there is no
+    # consumer for the recorded queries
+    SQLALCHEMY_RECORD_QUERIES = False
 
 
 class AzureConfig(ProductionConfig):
@@ -119,12 +266,13 @@ class AzureConfig(ProductionConfig):
         import logging
         from logging import StreamHandler
 
+        from app.logs import add_handler, text_formatter
+
         file_handler = StreamHandler()
-        log_format = "%(levelname)s - [%(filename)s] - %(asctime)s - %(process)d -  %(lineno)d - %(message)s "
-        log_formatter = logging.Formatter(log_format, datefmt="%d-%b-%y %H:%M:%S")
+        log_formatter = text_formatter()
         file_handler.setFormatter(log_formatter)
         file_handler.setLevel(logging.INFO)
-        app.logger.addHandler(file_handler)
+        add_handler(app, file_handler)
 
 
 # class DockerConfig(ProductionConfig):
@@ -138,12 +286,13 @@ class DockerConfig(DevelopmentConfig):
         import logging
         from logging import StreamHandler
 
+        from app.logs import add_handler, text_formatter
+
         file_handler = StreamHandler()
-        log_format = "%(levelname)s - [%(filename)s] - %(asctime)s - %(process)d -  %(lineno)d - %(message)s "
-        log_formatter = logging.Formatter(log_format, datefmt="%d-%b-%y %H:%M:%S")
+        log_formatter = text_formatter()
         file_handler.setFormatter(log_formatter)
         file_handler.setLevel(logging.INFO)
-        app.logger.addHandler(file_handler)
+        add_handler(app, file_handler)
 
 
 # With this configuration, application logs will be written to the
@@ -158,18 +307,20 @@ class UnixConfig(ProductionConfig):
         import logging
         from logging.handlers import SysLogHandler
 
+        from app.logs import add_handler, text_formatter
+
         syslog_handler = SysLogHandler()
-        log_format = "%(levelname)s - [%(filename)s] - %(asctime)s - %(process)d -  %(lineno)d - %(message)s "
-        log_formatter = logging.Formatter(log_format, datefmt="%d-%b-%y %H:%M:%S")
+        log_formatter = text_formatter()
         syslog_handler.setFormatter(log_formatter)
         syslog_handler.setLevel(logging.WARNING)
-        app.logger.addHandler(syslog_handler)
+        add_handler(app, syslog_handler)
 
 
 config = {
     "development": DevelopmentConfig,
     "testing": TestingConfig,
     "production": ProductionConfig,
+    "api": ApiConfig,
     "azure": AzureConfig,
     "docker": DockerConfig,
     "default": DevelopmentConfig,
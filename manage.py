@@ -1,5 +1,6 @@
 import os
 import sys
+import time
 
 import click
 from dotenv import load_dotenv
@@ -26,13 +27,18 @@ if os.environ.get("FLASK_COVERAGE"):
     COV = coverage.coverage(branch=True, include="app/*")
     COV.start()
 
-from flask_migrate import Migrate, upgrade
-
 from app import create_app, db
-from app.models import Permission, Role, User
 
 app = create_app(os.getenv("FLASK_CONFIG") or "default")
-migrate = Migrate(app, db)
+
+# Flask-Migrate pulls in alembic, which is by far the most expensive import of the
+# application. The migration commands are only available from the flask command
+# line, which loads this module inside a click context, so WSGI servers such as
+# gunicorn skip the import altogether.
+if click.get_current_context(silent=True) is not None:
+    from flask_migrate import Migrate
+
+    migrate = Migrate(app, db)
 
 dotenv_path = os.path.join(os.path.dirname(__file__), ".env")
 if os.path.exists(dotenv_path):
@@ -51,6 +57,8 @@ def make_shell_context():
     instance and the models. The flask shell command will import these items
     automatically into the shell, in addition to app, which is imported by default.
     """
+    from app.models import Permission, Role, User
+
     return dict(db=db, User=User, Role=Role, Permission=Permission)
 
 
@@ -58,8 +66,16 @@ def make_shell_context():
 @click.option(
     "--coverage/--no-coverage", default=False, help="Run tests under code coverage."
 )
-def test(coverage):
+@click.option(
+    "-j",
+    "--processes",
+    default=1,
+    help="Run the tests in parallel processes, 0 for one per CPU.",
+)
+def test(coverage, processes):
     """Run the unit tests."""
+    if coverage and processes != 1:
+        raise click.UsageError("--coverage can only be used with a single process")
     if coverage and not os.environ.get("FLASK_COVERAGE"):
         import subprocess
 
@@ -69,6 +85,11 @@ def test(coverage):
     import unittest
 
     tests = unittest.TestLoader().discover("tests")
+    if processes != 1:
+        from tests import parallel
+
+        parallel.run(tests, processes or None)
+        return
     unittest.TextTestRunner(verbosity=2).run(tests)
     if COV:
         COV.stop()
@@ -107,37 +128,179 @@ def profile(length, profile_dir):
     app.run(debug=False)
 
 
+@app.cli.command(
+    context_settings=dict(ignore_unknown_options=True), add_help_option=False
+)
+@click.argument("args", nargs=-1, type=click.UNPROCESSED)
+def bench(args):
+    """Load test the API with the scenarios of the Postman collection."""
+    from benchmarks import load
+
+    load.main(args)
+
+
+@app.cli.group()
+def assets():
+    """Manage the static assets."""
+
+
+@assets.command("build")
+def assets_build():
+    """Fingerprint and precompress the static assets."""
+    from app.assets import build
+
+    manifest = build(app)
+    click.echo(
+        "Fingerprinted %d files" % sum(len(names) for names in manifest.values())
+    )
+
+
+@app.cli.command()
+@click.argument("names", nargs=-1)
+@click.option("--batch-size", type=int, help="Rows updated per transaction.")
+@click.option(
+    "--sleep", default=0.1, show_default=True, help="Seconds to wait between batches."
+)
+@click.option("--reset", is_flag=True, help="Start over from the first row.")
+@click.option("--list", "list_only", is_flag=True, help="List the backfills.")
+def backfill(names, batch_size, sleep, reset, list_only):
+    """Run the online backfills, all of them unless NAMES are given."""
+    from app import models  # noqa: F401, registers the backfills
+    from app.backfill import backfills
+
+    unknown = set(names) - set(backfills)
+    if unknown:
+        raise click.BadParameter("unknown backfills: %s" % ", ".join(sorted(unknown)))
+    for name in names or backfills:
+        job = backfills[name]
+        if list_only:
+            with db.engine.connect() as connection:
+                checkpoint = job.checkpoint(connection)
+            state = "not started"
+            if checkpoint is not None:
+                state = "done" if checkpoint.done else "at key %s" % checkpoint.last_key
+                state += ", %d rows" % checkpoint.rows
+            click.echo("%s: %s" % (name, state))
+            continue
+        if reset:
+            job.reset(db.engine)
+        start = time.perf_counter()
+
+        def progress(rows, last_key):
+            click.echo(
+                "%s: %d rows, at key %s, %.0f rows/s"
+                % (name, rows, last_key, rows / (time.perf_counter() - start))
+            )
+
+        rows = job.run(db.engine, batch_size=batch_size, sleep=sleep, progress=progress)
+        click.echo("%s: done, %d rows" % (name, rows))
+
+
+@app.cli.command("export-users")
+@click.option(
+    "-f",
+    "--format",
+    "format_",
+    type=click.Choice(["csv", "jsonl", "parquet"]),
+    default="csv",
+    show_default=True,
+    help="Parquet requires pyarrow.",
+)
+@click.option("-o", "--output", default="-", help="Output file, stdout by default.")
+@click.option("--columns", help="Comma separated columns, all of them by default.")
+@click.option("--gzip", is_flag=True, help="Compress the file.")
+@click.option("--batch-size", default=1000, show_default=True, help="Rows per fetch.")
+def export_users(format_, output, columns, gzip, batch_size):
+    """Export the users, streaming them in constant memory."""
+    from app import export
+    from app.exceptions import ValidationError
+
+    try:
+        chunks = export.export_users(
+            format_, export.parse_columns(columns), gzip, batch_size
+        )
+    except ValidationError as e:
+        raise click.UsageError(str(e))
+    with click.open_file(output, "wb", atomic=output != "-") as f:
+        for chunk in chunks:
+            f.write(chunk)
+
+
+@app.cli.command("import-users")
+@click.argument("path")
+@click.option(
+    "-f",
+    "--format",
+    "format_",
+    type=click.Choice(["csv", "jsonl"]),
+    help="Guessed from the file name by default.",
+)
+@click.option(
+    "-j",
+    "--processes",
+    default=0,
+    help="Validation worker processes, 0 for one per CPU.",
+)
+@click.option("--batch-size", default=1000, show_default=True, help="Rows per batch.")
+def import_users(path, format_, processes, batch_size):
+    """Import users from a CSV or JSON lines file, "-" for stdin."""
+    from app import importer
+    from app.models import role_table
+
+    def error(line, message):
+        click.echo("line %d: %s" % (line, message), err=True)
+
+    f, format_ = importer.open_input(path, format_)
+    with f:
+        stats = importer.import_users(
+            db.engine,
+            importer.read_records(f, format_),
+            importer.settings(app, role_table.get()),
+            processes=processes or None,
+            batch_size=batch_size,
+            errors=error,
+        )
+    click.echo("Imported users: %s" % stats)
+
+
+@app.cli.command("prune-changes")
+@click.option(
+    "--days", default=7, show_default=True, help="Keep the changes of these days."
+)
+def prune_changes(days):
+    """Delete the old entries of the change log read by the change feeds."""
+    from app import changes
+
+    with db.engine.begin() as connection:
+        click.echo("Deleted %d changes" % changes.prune(connection, days))
+
+
 @app.cli.command()
-def deploy():
+@click.option(
+    "--force", is_flag=True, help="Migrate and seed even if the database is up to date."
+)
+def deploy(force):
     """Run deployment tasks."""
-    # migrate database to latest revision
-    upgrade()
+    from app import deploy
 
-    # create or update user roles
-    Role.insert_roles()
+    # migrate database to latest revision and create the roles and the admin,
+    # unless the schema and the seed data are already up to date
+    steps = deploy.run(force=force)
+    if steps:
+        click.echo("Deployed: %s" % ", ".join(steps))
+    else:
+        click.echo("Database is up to date")
 
 
 @app.cli.command()
 def dropdeploy():
-    """Run deployment tasks."""
+    """Drop all the data and run deployment tasks."""
+    from app import deploy
+
     db.drop_all()
-    db.create_all()
-    # create or update user roles
-    Role.insert_roles()
-    user_vaibhav = User(
-        email="vaibhav@example.com",
-        username="vaibhav",
-        password="admin123",
-        confirmed=True,
-        name="Vaibhav",
-        location="India",
-        about_me="Sr Data Scientist",
-    )
-    db.session.add_all([user_vaibhav])
+    db.session.execute(db.text("DROP TABLE IF EXISTS alembic_version"))
     db.session.commit()
-
-    # migrate database to latest revision
-    upgrade()
+    deploy.run()
 
 
 if __name__ == "__main__":
@@ -15,7 +15,8 @@ config = context.config
 
 # Interpret the config file for Python logging.
 # This line sets up loggers basically.
-fileConfig(config.config_file_name)
+# Loggers created before, such as the application logger, are left enabled.
+fileConfig(config.config_file_name, disable_existing_loggers=False)
 logger = logging.getLogger("alembic.env")
 
 # add your model's MetaData object here
@@ -33,6 +34,9 @@ else:
     get_bind_names = getattr(current_app.extensions["migrate"].db, "bind_names", None)
     if get_bind_names:
         bind_names = get_bind_names()
+# the read replicas are migrated with their primary
+replica_names = current_app.config.get("SQLALCHEMY_REPLICA_BINDS") or []
+bind_names = [bind for bind in bind_names if bind not in replica_names]
 for bind in bind_names:
     context.config.set_section_option(
         bind,
@@ -119,6 +123,11 @@ def run_migrations_online():
                     directives[:] = []
                     logger.info("No changes in schema detected.")
 
+    # SQLite keeps the AUTOINCREMENT counters (see the change_log table) in a
+    # table of its own, which is not part of the models
+    def include_name(name, type_, parent_names):
+        return not (type_ == "table" and name == "sqlite_sequence")
+
     # for the direct-to-DB use case, start a transaction on all
     # engines, then run all migrations, then commit all transactions.
     engines = {"": {"engine": current_app.extensions["migrate"].db.get_engine()}}
@@ -144,6 +153,7 @@ def run_migrations_online():
                 downgrade_token="%s_downgrades" % name,
                 target_metadata=get_metadata(name),
                 process_revision_directives=process_revision_directives,
+                include_name=include_name,
                 **current_app.extensions["migrate"].configure_args
             )
             context.run_migrations(engine_name=name)
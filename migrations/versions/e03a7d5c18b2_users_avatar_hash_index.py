@@ -0,0 +1,33 @@
+"""users avatar_hash index
+
+Revision ID: e03a7d5c18b2
+Revises: b41f0e9c6a27
+Create Date: 2026-10-19 03:40:51.730268
+
+"""
+from alembic import op
+
+from app.backfill import create_index_online
+
+# revision identifiers, used by Alembic.
+revision = "e03a7d5c18b2"
+down_revision = "b41f0e9c6a27"
+branch_labels = None
+depends_on = None
+
+
+def upgrade(engine_name):
+    globals()["upgrade_%s" % engine_name]()
+
+
+def downgrade(engine_name):
+    globals()["downgrade_%s" % engine_name]()
+
+
+def upgrade_():
+    # looked up by /avatar/<hash> before an identicon is stored
+    create_index_online(op.get_bind(), "ix_users_avatar_hash", "users", ["avatar_hash"])
+
+
+def downgrade_():
+    op.drop_index("ix_users_avatar_hash", table_name="users")
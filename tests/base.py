@@ -0,0 +1,73 @@
+"""
+Base class of the test cases using the database.
+
+The schema and the roles are created once per process, in an in-memory SQLite
+database shared by the applications of all the tests. Every test runs in a
+transaction, rolled back in tearDown, and the commits of the code under test
+only release a SAVEPOINT inside it, so each test still starts from the freshly
+seeded database without paying for db.create_all() and db.drop_all().
+"""
+import sqlite3
+import unittest
+
+from sqlalchemy import event
+
+from app import create_app, db
+from app.models import Role
+
+_connection = None
+
+
+def _shared_connection():
+    global _connection
+    if _connection is None:
+        # autocommit mode, SQLAlchemy emits BEGIN itself, see _begin below
+        _connection = sqlite3.connect(
+            ":memory:", check_same_thread=False, isolation_level=None
+        )
+    return _connection
+
+
+def _begin(connection):
+    # the sqlite3 module does not emit BEGIN before SAVEPOINT, which SQLite then
+    # treats as the start of the outer transaction
+    connection.exec_driver_sql("BEGIN")
+
+
+class DatabaseTestCase(unittest.TestCase):
+    schema_created = False
+
+    def setUp(self):
+        self.app = create_app("testing")
+        self.app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite://"
+        self.app.config["SQLALCHEMY_ENGINE_OPTIONS"] = {"creator": _shared_connection}
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        event.listen(db.engine, "begin", _begin)
+
+        if not DatabaseTestCase.schema_created:
+            db.create_all()
+            Role.insert_roles()
+            db.session.remove()
+            DatabaseTestCase.schema_created = True
+
+        self.connection = db.engine.connect()
+        self.transaction = self.connection.begin()
+        self.savepoint = self.connection.begin_nested()
+        # Flask-SQLAlchemy binds every table to the engine unless told otherwise
+        db.session.remove()
+        db.session.configure(bind=self.connection, binds={})
+        event.listen(db.session, "after_transaction_end", self._restart_savepoint)
+
+    def _restart_savepoint(self, session, transaction):
+        if not self.savepoint.is_active:
+            self.savepoint = self.connection.begin_nested()
+
+    def tearDown(self):
+        event.remove(db.session, "after_transaction_end", self._restart_savepoint)
+        db.session.remove()
+        db.session.session_factory.kw.pop("bind")
+        db.session.session_factory.kw.pop("binds")
+        self.transaction.rollback()
+        self.connection.close()
+        self.app_context.pop()
@@ -0,0 +1,61 @@
+"""
+Run a unittest suite in several processes.
+
+The tests are handed out one at a time to a pool of forked worker processes,
+each with its own in-memory database (see tests/base.py), and the reports of
+the workers are printed as they complete.
+"""
+import io
+import multiprocessing
+import time
+import unittest
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import click
+
+
+def _test_ids(suite):
+    for test in suite:
+        if isinstance(test, unittest.TestSuite):
+            yield from _test_ids(test)
+        else:
+            yield test.id()
+
+
+def _run(test_id):
+    suite = unittest.TestLoader().loadTestsFromName(test_id)
+    stream = io.StringIO()
+    result = unittest.TextTestRunner(stream=stream, verbosity=2).run(suite)
+    return (
+        result.testsRun,
+        len(result.failures),
+        len(result.errors),
+        len(result.skipped),
+        stream.getvalue(),
+    )
+
+
+def run(suite, processes=None):
+    """Run `suite` in `processes` processes, one per CPU by default."""
+    test_ids = list(_test_ids(suite))
+    start = time.perf_counter()
+    totals = [0, 0, 0, 0]
+    # the workers are forked, so they inherit the imported test modules, and
+    # unlike those of multiprocessing.Pool they are not daemonic, so tests can
+    # start process pools of their own
+    context = multiprocessing.get_context("fork")
+    with ProcessPoolExecutor(processes, mp_context=context) as executor:
+        futures = [executor.submit(_run, test_id) for test_id in test_ids]
+        for future in as_completed(futures):
+            *counts, report = future.result()
+            totals = [total + count for total, count in zip(totals, counts)]
+            # the lines of the test and its traceback, not the summary
+            click.echo(report.rsplit("\n" + "-" * 70, 1)[0].rstrip())
+    tests, failures, errors, skipped = totals
+    click.echo("-" * 70)
+    click.echo("Ran %d tests in %.3fs" % (tests, time.perf_counter() - start))
+    if failures or errors:
+        click.echo("\nFAILED (failures=%d, errors=%d)" % (failures, errors))
+    else:
+        click.echo("\nOK" + (" (skipped=%d)" % skipped if skipped else ""))
+    return not (failures or errors)
@@ -0,0 +1,64 @@
+"""
+Local SMTP server standing in for the mail server in tests.
+
+    with LocalSMTPServer() as server:
+        ...  # send to ("localhost", server.port)
+    server.messages  # list of email.message.EmailMessage
+"""
+import email
+import email.policy
+import socketserver
+import threading
+
+
+class _SMTPHandler(socketserver.StreamRequestHandler):
+    def reply(self, line):
+        self.wfile.write(line.encode("ascii") + b"\r\n")
+
+    def handle(self):
+        self.reply("220 localhost SMTP stand-in")
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = line[:4].upper()
+            if command in (b"EHLO", b"HELO"):
+                self.reply("250 localhost")
+            elif command == b"DATA":
+                self.reply("354 End data with <CR><LF>.<CR><LF>")
+                lines = []
+                for line in self.rfile:
+                    if line == b".\r\n":
+                        break
+                    # undo the dot stuffing
+                    lines.append(line[1:] if line.startswith(b"..") else line)
+                self.server.messages.append(
+                    email.message_from_bytes(
+                        b"".join(lines), policy=email.policy.default
+                    )
+                )
+                self.reply("250 OK")
+            elif command == b"QUIT":
+                self.reply("221 Bye")
+                return
+            else:
+                # MAIL, RCPT, RSET and NOOP
+                self.reply("250 OK")
+
+
+class LocalSMTPServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self):
+        super().__init__(("localhost", 0), _SMTPHandler)
+        self.port = self.server_address[1]
+        self.messages = []
+
+    def __enter__(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.shutdown()
+        self.server_close()
@@ -0,0 +1,55 @@
+import json
+from base64 import b64encode
+
+from app import accesslog, db
+from app.models import User
+from tests.base import DatabaseTestCase
+
+
+class AccessLogTestCase(DatabaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.app.config["FLASK_ACCESS_LOG"] = True
+        self.app.config["FLASK_ACCESS_LOG_SAMPLE_RATE"] = 1
+        accesslog.init_app(self.app)
+        self.client = self.app.test_client()
+
+    def get(self, url):
+        with self.assertLogs(self.app.name + ".access", "INFO") as logs:
+            response = self.client.get(
+                url,
+                buffered=True,
+                headers={
+                    "Authorization": "Basic "
+                    + b64encode(b"john@example.com:cat").decode("utf-8")
+                },
+            )
+        self.assertEqual(len(logs.records), 1)
+        return response, json.loads(logs.records[0].getMessage())
+
+    def test_entry(self):
+        u = User(email="john@example.com", password="cat", confirmed=True)
+        db.session.add(u)
+        db.session.commit()
+        response, entry = self.get("/api/v1/users/%d" % u.id)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(entry["method"], "GET")
+        self.assertEqual(entry["endpoint"], "api.get_user")
+        self.assertEqual(entry["status"], 200)
+        self.assertEqual(entry["user_id"], u.id)
+        self.assertEqual(entry["size"], len(response.data))
+        self.assertGreater(entry["db_queries"], 0)
+        self.assertGreaterEqual(entry["latency_ms"], entry["db_time_ms"])
+
+    def test_sampling(self):
+        self.app.config["FLASK_ACCESS_LOG_SAMPLE_RATE"] = 0
+        # errors are always logged
+        response, entry = self.get("/api/v1/users/")
+        self.assertEqual(entry["status"], 401)
+        self.assertIsNone(entry["user_id"])
+        # successful requests are sampled out
+        u = User(email="john@example.com", password="cat", confirmed=True)
+        db.session.add(u)
+        db.session.commit()
+        with self.assertRaises(AssertionError):
+            self.get("/api/v1/users/%d" % u.id)
@@ -1,25 +1,16 @@
 import json
-import unittest
 from base64 import b64encode
 
-from app import create_app, db
+from app import db
 from app.models import Role, User
+from tests.base import DatabaseTestCase
 
 
-class APITestCase(unittest.TestCase):
+class APITestCase(DatabaseTestCase):
     def setUp(self):
-        self.app = create_app("testing")
-        self.app_context = self.app.app_context()
-        self.app_context.push()
-        db.create_all()
-        Role.insert_roles()
+        super().setUp()
         self.client = self.app.test_client()
 
-    def tearDown(self):
-        db.session.remove()
-        db.drop_all()
-        self.app_context.pop()
-
     def get_api_headers(self, username, password):
         return {
             "Authorization": "Basic "
@@ -53,6 +44,43 @@ class APITestCase(unittest.TestCase):
         )
         self.assertEqual(response.status_code, 401)
 
+    def test_login_rate_limit(self):
+        self.app.config["FLASK_LOGIN_ATTEMPTS_PER_ACCOUNT"] = 3
+        r = Role.query.filter_by(name="User").first()
+        u = User(email="john@example.com", password="cat", confirmed=True, role=r)
+        db.session.add(u)
+        db.session.commit()
+
+        # repeated calls with valid credentials are answered from the cache
+        for _ in range(5):
+            response = self.client.get(
+                "/api/v1/users/",
+                headers=self.get_api_headers("john@example.com", "cat"),
+            )
+            self.assertEqual(response.status_code, 200)
+
+        # bad passwords count against the account until it is locked out
+        for _ in range(2):
+            response = self.client.get(
+                "/api/v1/users/",
+                headers=self.get_api_headers("john@example.com", "dog"),
+            )
+            self.assertEqual(response.status_code, 401)
+        response = self.client.get(
+            "/api/v1/users/", headers=self.get_api_headers("john@example.com", "dog")
+        )
+        self.assertEqual(response.status_code, 429)
+        json_response = json.loads(response.get_data(as_text=True))
+        self.assertEqual(json_response["error"], "too many requests")
+        self.assertIsNotNone(response.headers.get("Retry-After"))
+
+        # tokens are not affected by the password limits
+        token = u.generate_auth_token(expiration=3600)
+        response = self.client.get(
+            "/api/v1/users/", headers=self.get_api_headers(token, "")
+        )
+        self.assertEqual(response.status_code, 200)
+
     def test_token_auth(self):
         # add a user
         r = Role.query.filter_by(name="User").first()
@@ -399,3 +427,77 @@ class APITestCase(unittest.TestCase):
         json_response = json.loads(response.get_data(as_text=True))
         self.assertEqual(json_response["error"], "forbidden")
         self.assertEqual(json_response["message"], "Unconfirmed account")
+
+    def test_users_by_id(self):
+        users = [
+            User(email="user%d@example.com" % i, username="user%d" % i)
+            for i in range(3)
+        ]
+        john = User(email="john@example.com", password="cat", confirmed=True)
+        db.session.add_all(users + [john])
+        db.session.commit()
+        headers = self.get_api_headers("john@example.com", "cat")
+        ids = [users[2].id, 12345, users[0].id, users[2].id]
+
+        response = self.client.get(
+            "/api/v1/users/?ids=" + ",".join(str(id) for id in ids), headers=headers
+        )
+        self.assertEqual(response.status_code, 200)
+        json_response = json.loads(response.get_data(as_text=True))
+        self.assertEqual(
+            [user["username"] for user in json_response["users"]], ["user2", "user0"]
+        )
+        self.assertEqual(json_response["missing"], [12345])
+
+        # the POST variant answers the same
+        etag = response.headers["ETag"]
+        response = self.client.post(
+            "/api/v1/users/", headers=headers, data=json.dumps({"ids": ids})
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.headers["ETag"], etag)
+
+        url = "/api/v1/users/?ids=%d,%d" % (users[2].id, users[0].id)
+        response = self.client.get(url, headers=headers)
+        etag = response.headers["ETag"]
+        response = self.client.get(
+            url, headers=dict(headers, **{"If-None-Match": etag})
+        )
+        self.assertEqual(response.status_code, 304)
+        # gzip-accepting clients get a weak ETag, which answers If-None-Match too
+        gzip_headers = dict(headers, **{"Accept-Encoding": "gzip"})
+        response = self.client.get(url, headers=gzip_headers)
+        self.assertEqual(response.headers["Content-Encoding"], "gzip")
+        self.assertEqual(response.headers["ETag"], "W/" + etag)
+        gzip_headers["If-None-Match"] = response.headers["ETag"]
+        response = self.client.get(url, headers=gzip_headers)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.headers["ETag"], "W/" + etag)
+        users[0].name = "User"
+        db.session.commit()
+        response = self.client.get(
+            url, headers=dict(headers, **{"If-None-Match": etag})
+        )
+        self.assertEqual(response.status_code, 200)
+
+        for data in (
+            {"ids": [1, "x"]},
+            {"ids": [True]},
+            {"ids": 1},
+            {"ids": ["\u00b2"]},
+            {"ids": [99999999999999999999999]},
+            {"ids": ["9" * 5000]},
+        ):
+            response = self.client.post(
+                "/api/v1/users/", headers=headers, data=json.dumps(data)
+            )
+            self.assertEqual(response.status_code, 400)
+        response = self.client.get("/api/v1/users/?ids=%C2%B2", headers=headers)
+        self.assertEqual(response.status_code, 400)
+        response = self.client.get(
+            "/api/v1/users/99999999999999999999999", headers=headers
+        )
+        self.assertEqual(response.status_code, 404)
+        self.app.config["FLASK_USERS_MAX_IDS"] = 2
+        response = self.client.get("/api/v1/users/?ids=1,2,3", headers=headers)
+        self.assertEqual(response.status_code, 400)
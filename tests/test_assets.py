@@ -0,0 +1,53 @@
+import gzip
+import os
+import shutil
+import tempfile
+import unittest
+
+from flask import url_for
+
+from app import assets, create_app
+
+
+class AssetsTestCase(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app("testing")
+        self.static = tempfile.mkdtemp()
+        shutil.copytree(self.app.static_folder, self.static, dirs_exist_ok=True)
+        shutil.rmtree(os.path.join(self.static, assets.DIST), ignore_errors=True)
+        self.app.static_folder = self.static
+        self.manifest = assets.build(self.app)
+        assets.init_app(self.app)
+        self.client = self.app.test_client()
+
+    def tearDown(self):
+        shutil.rmtree(self.static)
+
+    def test_fingerprinted_url(self):
+        with self.app.test_request_context():
+            url = url_for("static", filename="styles.css")
+        self.assertRegex(url, r"^/static/dist/styles\.[0-9a-f]{12}\.css$")
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("immutable", response.headers["Cache-Control"])
+        self.assertNotIn("Content-Encoding", response.headers)
+        with open(os.path.join(self.static, "styles.css"), "rb") as f:
+            self.assertEqual(response.data, f.read())
+
+    def test_precompressed(self):
+        with self.app.test_request_context():
+            url = url_for("static", filename="styles.css")
+        response = self.client.get(url, headers={"Accept-Encoding": "gzip"})
+        self.assertEqual(response.headers["Content-Encoding"], "gzip")
+        self.assertEqual(response.mimetype, "text/css")
+        self.assertIn("Accept-Encoding", response.headers["Vary"])
+        with open(os.path.join(self.static, "styles.css"), "rb") as f:
+            self.assertEqual(gzip.decompress(response.data), f.read())
+
+    def test_css_references(self):
+        names = self.manifest["bootstrap.static"]
+        path = os.path.join(self.static, names["css/bootstrap.css"])
+        with open(path) as f:
+            css = f.read()
+        font = names["fonts/glyphicons-halflings-regular.woff2"]
+        self.assertIn("../fonts/" + os.path.basename(font), css)
@@ -0,0 +1,80 @@
+import unittest
+
+from sqlalchemy import inspect
+
+from app import create_app, db
+from app.backfill import Backfill, backfills, create_index_online
+from app.models import Role, User
+
+
+class Interrupted(Exception):
+    pass
+
+
+class BackfillTestCase(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app("testing")
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+        Role.insert_roles()
+        users = User.__table__
+        db.session.execute(
+            users.insert(),
+            [
+                {"email": "user%d@example.com" % i, "username": "u%d" % i}
+                for i in range(25)
+            ],
+        )
+        db.session.commit()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def test_resume(self):
+        users = User.__table__
+        job = Backfill(
+            "users.location",
+            users,
+            values={"location": "Earth"},
+            where=users.c.location.is_(None),
+            batch_size=10,
+        )
+        batches = []
+
+        def interrupt(rows, last_key):
+            batches.append((rows, last_key))
+            raise Interrupted()
+
+        with self.assertRaises(Interrupted):
+            job.run(db.engine, progress=interrupt)
+        self.assertEqual(User.query.filter_by(location="Earth").count(), 10)
+
+        # the next run starts after the checkpoint
+        self.assertEqual(job.run(db.engine), 25)
+        self.assertEqual(User.query.filter_by(location="Earth").count(), 25)
+        self.assertEqual(batches, [(10, 10)])
+        # a finished backfill does not run again
+        db.session.execute(users.update().values(location=None))
+        db.session.commit()
+        self.assertEqual(job.run(db.engine), 25)
+        self.assertEqual(User.query.filter_by(location="Earth").count(), 0)
+        job.reset(db.engine)
+        job.run(db.engine)
+        self.assertEqual(User.query.filter_by(location="Earth").count(), 25)
+
+    def test_compute(self):
+        job = backfills["users.avatar_hash"]
+        self.assertEqual(job.run(db.engine, batch_size=7), 25)
+        user = User.query.filter_by(username="u3").one()
+        self.assertEqual(user.avatar_hash, user.gravatar_hash())
+
+    def test_create_index_online(self):
+        for _ in range(2):
+            create_index_online(
+                db.session.connection(), "ix_users_location", "users", ["location"]
+            )
+        indexes = inspect(db.session.connection()).get_indexes("users")
+        self.assertIn("ix_users_location", [index["name"] for index in indexes])
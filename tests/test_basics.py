@@ -1,24 +1,21 @@
-import unittest
-
 from flask import current_app
 
-from app import create_app, db
-
+from app import create_app
+from tests.base import DatabaseTestCase
 
-class BasicsTestCase(unittest.TestCase):
-    def setUp(self):
-        self.app = create_app("testing")
-        self.app_context = self.app.app_context()
-        self.app_context.push()
-        db.create_all()
-
-    def tearDown(self):
-        db.session.remove()
-        db.drop_all()
-        self.app_context.pop()
 
+class BasicsTestCase(DatabaseTestCase):
     def test_app_exists(self):
         self.assertFalse(current_app is None)
 
     def test_app_is_testing(self):
         self.assertTrue(current_app.config["TESTING"])
+
+    def test_api_profile(self):
+        app = create_app("api")
+        self.assertEqual(list(app.blueprints), ["api"])
+        self.assertIsNone(app.before_request_funcs.get(None))
+        response = app.test_client().get("/wrong/url")
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(response.get_json()["error"], "not found")
+        self.assertIsNone(response.headers.get("Set-Cookie"))
@@ -0,0 +1,101 @@
+import json
+from base64 import b64encode
+
+from app import db
+from app.models import Role, User
+from tests.base import DatabaseTestCase
+
+
+class BatchTestCase(DatabaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.client = self.app.test_client()
+        role = Role.query.filter_by(name="Moderator").first()
+        self.user = User(
+            email="john@example.com",
+            username="john",
+            password="cat",
+            confirmed=True,
+            role=role,
+        )
+        self.others = [
+            User(email="user%d@example.com" % i, username="user%d" % i)
+            for i in range(3)
+        ]
+        db.session.add_all([self.user] + self.others)
+        db.session.commit()
+        self.statements = []
+        db.event.listen(db.engine, "before_cursor_execute", self._count)
+        self.addCleanup(
+            db.event.remove, db.engine, "before_cursor_execute", self._count
+        )
+
+    def _count(self, conn, cursor, statement, parameters, context, executemany):
+        self.statements.append(statement)
+
+    def batch(self, requests, email="john@example.com", password="cat"):
+        credentials = b64encode((email + ":" + password).encode("utf-8"))
+        response = self.client.post(
+            "/api/v1/batch",
+            headers={"Authorization": "Basic " + credentials.decode("utf-8")},
+            json={"requests": requests},
+        )
+        return response.status_code, json.loads(response.get_data(as_text=True))
+
+    def test_batch(self):
+        ids = [user.id for user in self.others]
+        status, data = self.batch(
+            [{"path": "/api/v1/users/%d" % id} for id in ids]
+            + [
+                {"method": "POST", "path": "/api/v1/tokens/"},
+                {"path": "/api/v1/users/12345"},
+                {"path": "/api/v1/nowhere"},
+                {"path": "/api/v1/batch", "method": "POST"},
+                {
+                    "method": "POST",
+                    "path": "/api/v1/add_new_user/",
+                    "body": {"email": "new@example.com", "username": "new", "id": 99},
+                },
+                {"method": "POST", "path": "/api/v1/add_new_user/", "body": {}},
+                {"path": "/api/v1/users/changes"},
+            ]
+        )
+        self.assertEqual(status, 200)
+        responses = data["responses"]
+        self.assertEqual(
+            [r["status"] for r in responses],
+            [200, 200, 200, 200, 404, 404, 404, 201, 400, 403],
+        )
+        self.assertEqual([r["body"]["id"] for r in responses[:3]], ids)
+        self.assertIn("token", responses[3]["body"])
+        self.assertEqual(responses[7]["headers"]["Location"], "/api/v1/users/99")
+        self.assertIsNotNone(User.query.filter_by(username="new").first())
+
+    def test_gets_are_coalesced(self):
+        ids = [user.id for user in self.others]
+        db.session.expunge_all()
+        self.statements.clear()
+        status, data = self.batch([{"path": "/api/v1/users/%d" % id} for id in ids])
+        self.assertEqual(status, 200)
+        # authentication, then a single query for the three users
+        users = [s for s in self.statements if "FROM users" in s]
+        self.assertEqual(len(users), 2)
+        self.assertIn("IN", users[1])
+
+    def test_authenticated_once(self):
+        status, data = self.batch([{"path": "/api/v1/users/"}], password="dog")
+        self.assertEqual(status, 401)
+        status, data = self.batch({"path": "/api/v1/users/"})
+        self.assertEqual(status, 400)
+        self.app.config["FLASK_BATCH_MAX_REQUESTS"] = 2
+        status, data = self.batch([{"path": "/api/v1/users/"}] * 3)
+        self.assertEqual(status, 400)
+
+    def test_headers(self):
+        status, data = self.batch(
+            [{"path": "/api/v1/users/", "headers": {"If-None-Match": '"x"'}}]
+        )
+        self.assertEqual(status, 200)
+        for headers in (["x"], "x", {"Accept": 1}, {"Accept": None}):
+            status, data = self.batch([{"path": "/api/v1/users/", "headers": headers}])
+            self.assertEqual(status, 400)
@@ -0,0 +1,67 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from benchmarks import load
+from benchmarks.load import collection, runner
+
+
+class BenchTestCase(unittest.TestCase):
+    def test_collection(self):
+        scenarios, variables = collection.load()
+        names = [scenario.name for scenario in scenarios]
+        self.assertIn("get token", names)
+        token = scenarios[names.index("get token")]
+        self.assertEqual(token.sets, {"token": "token"})
+        from_token = scenarios[names.index("get user from token")]
+        method, path, headers, body = from_token.request({"token": "abc"})
+        self.assertEqual((method, path, body), ("GET", "/api/v1/users/5", None))
+        self.assertEqual(headers["Authorization"], "Basic YWJjOg==")
+        per_page = scenarios[names.index("get users per page")]
+        self.assertEqual(per_page.path, "/api/v1/users_per_page?page=2")
+        # the resources created by the POST scenarios are unique
+        add_user = scenarios[names.index("add_new_user_access_admin")]
+        first = json.loads(add_user.request(variables, 0, first_id=100)[3])
+        second = json.loads(add_user.request(variables, 1, first_id=100)[3])
+        self.assertNotEqual(first["email"], second["email"])
+        self.assertNotEqual(first["username"], second["username"])
+        self.assertEqual((first["id"], second["id"]), (100, 101))
+
+    def test_percentile(self):
+        latencies = list(range(1, 101))
+        self.assertEqual(runner.percentile(latencies, 50), 50)
+        self.assertEqual(runner.percentile(latencies, 99), 99)
+        self.assertEqual(runner.percentile([7], 95), 7)
+        self.assertIsNone(runner.percentile([], 50))
+
+    def test_run(self):
+        data_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, data_dir)
+        results = load.run(
+            users=[20],
+            config_name="testing",
+            requests=3,
+            warmup=1,
+            scenarios=["token"],
+            data_dir=data_dir,
+            report=lambda line: None,
+        )
+        self.assertEqual(os.listdir(data_dir), ["testing-users-20.sqlite"])
+        statuses = {r["scenario"]: r["statuses"] for r in results["results"]}
+        self.assertEqual(
+            statuses,
+            {
+                "get token": {"200": 3},
+                "get user from token": {"200": 3},
+                "get users from token": {"200": 3},
+            },
+        )
+        for result in results["results"]:
+            self.assertEqual(result["users"], 20)
+            self.assertLessEqual(result["p50_ms"], result["p99_ms"])
+
+        path = load.save(results, os.path.join(data_dir, "results.json"))
+        with open(path) as f:
+            self.assertEqual(json.load(f), results)
@@ -0,0 +1,189 @@
+import json
+import threading
+import unittest
+from base64 import b64encode
+from datetime import datetime, timedelta
+
+from app import changes, db
+from app.changes import Change, ChangeHub, change_log
+from app.models import Role, User
+from tests.base import DatabaseTestCase
+
+
+class ChangeHubTestCase(unittest.TestCase):
+    def test_since(self):
+        hub = ChangeHub()
+        self.assertEqual(hub.since(0), [])
+        hub.publish([Change(i, "users", i, "insert", None) for i in (3, 2, 4)])
+        self.assertEqual([change.id for change in hub.since(2)], [3, 4])
+        self.assertEqual(hub.since(4), [])
+        # change 1 is not in the hub
+        self.assertIsNone(hub.since(0))
+        hub.publish([Change(6, "users", 6, "insert", None)])
+        self.assertIsNone(hub.since(4))
+
+    def test_wait(self):
+        hub = ChangeHub()
+        hub.wait(0, 0.01)
+        thread = threading.Timer(
+            0.05, hub.publish, [[Change(1, "users", 1, "insert", None)]]
+        )
+        thread.start()
+        hub.wait(0, 10)
+        self.assertEqual([change.id for change in hub.since(0)], [1])
+        thread.join()
+
+
+class ChangeFeedTestCase(DatabaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.app.config["FLASK_CHANGES_STREAM_SECONDS"] = 0
+        self.client = self.app.test_client()
+        admin = Role.query.filter_by(name="Administrator").first()
+        self.admin = User(
+            email="admin@example.com", password="cat", confirmed=True, role=admin
+        )
+        db.session.add(self.admin)
+        db.session.commit()
+
+    def headers(self, email="admin@example.com", password="cat", **extra):
+        credentials = b64encode((email + ":" + password).encode("utf-8"))
+        return dict(Authorization="Basic " + credentials.decode("utf-8"), **extra)
+
+    def events(self, last_event_id=None):
+        headers = self.headers()
+        if last_event_id is not None:
+            headers["Last-Event-ID"] = str(last_event_id)
+        response = self.client.get("/api/v1/users/changes", headers=headers)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.mimetype, "text/event-stream")
+        events = []
+        for block in response.get_data(as_text=True).split("\n\n"):
+            fields = dict(
+                line.split(": ", 1) for line in block.splitlines() if ": " in line
+            )
+            if "event" in fields:
+                events.append(fields)
+        return events
+
+    def logged(self):
+        return db.session.execute(
+            db.select(change_log.c.row_id, change_log.c.op).order_by(change_log.c.id)
+        ).all()
+
+    def test_log(self):
+        user = User(email="john@example.com", username="john")
+        db.session.add(user)
+        db.session.commit()
+        user.ping()
+        user.name = "John"
+        db.session.commit()
+        user.name = "Johnny"
+        db.session.rollback()
+        db.session.delete(user)
+        db.session.commit()
+        self.assertEqual(
+            self.logged(),
+            [
+                (self.admin.id, "insert"),
+                (user.id, "insert"),
+                (user.id, "update"),
+                (user.id, "delete"),
+            ],
+        )
+        # the hub has the committed changes only
+        self.assertEqual(len(changes.hub().since(0)), 4)
+
+    def test_resume(self):
+        user = User(email="john@example.com", username="john")
+        db.session.add(user)
+        db.session.commit()
+        user.name = "John"
+        db.session.commit()
+
+        events = self.events(last_event_id=0)
+        self.assertEqual([e["event"] for e in events], ["insert", "insert", "update"])
+        data = json.loads(events[2]["data"])
+        self.assertEqual(data["id"], user.id)
+        self.assertEqual(data["url"], "/api/v1/users/%d" % user.id)
+        self.assertEqual(self.events(last_event_id=events[1]["id"]), events[2:])
+        # without Last-Event-ID only the changes to come are sent
+        self.assertEqual(self.events(), [])
+
+    def test_resume_from_the_database(self):
+        db.session.add(User(email="john@example.com", username="john"))
+        db.session.commit()
+        # changes of another process are not in the hub of this one
+        self.app.extensions["change_hub"] = ChangeHub()
+        events = self.events(last_event_id=0)
+        self.assertEqual(len(events), 2)
+
+    def test_reset_after_pruning(self):
+        # pruned entries are days old, the ones left are no recent gap
+        self.app.config["FLASK_CHANGES_GAP_GRACE"] = 0
+        db.session.add(User(email="john@example.com", username="john"))
+        db.session.commit()
+        db.session.execute(
+            change_log.delete().where(change_log.c.row_id == self.admin.id)
+        )
+        db.session.commit()
+        self.app.extensions["change_hub"] = ChangeHub()
+        events = self.events(last_event_id=0)
+        self.assertEqual([e["event"] for e in events], ["reset", "insert"])
+
+    def test_ids_not_reused_after_pruning(self):
+        ids = db.select(change_log.c.id)
+        db.session.add(User(email="john@example.com", username="john"))
+        db.session.commit()
+        last_id = max(db.session.execute(ids).scalars())
+        changes.prune(db.session.connection(), days=-1)
+        db.session.commit()
+        self.assertEqual(db.session.execute(ids).all(), [])
+        db.session.add(User(email="susan@example.com", username="susan"))
+        db.session.commit()
+        self.assertEqual(list(db.session.execute(ids).scalars()), [last_id + 1])
+
+    def test_out_of_order_commits(self):
+        def log(id, seconds_ago=0):
+            db.session.execute(
+                change_log.insert().values(
+                    id=id,
+                    table_name="users",
+                    row_id=self.admin.id,
+                    op="update",
+                    changed_at=datetime.utcnow() - timedelta(seconds=seconds_ago),
+                )
+            )
+            db.session.commit()
+
+        first = changes.start_id(30)
+        # the transaction of first + 1 commits after the one of first + 2
+        log(first + 2)
+        self.app.extensions["change_hub"] = ChangeHub()
+        self.assertEqual(changes.read(first, 30), [])
+        self.assertEqual(changes.start_id(30), first)
+        self.assertEqual(self.events(last_event_id=first), [])
+        log(first + 1)
+        events = self.events(last_event_id=first)
+        self.assertEqual([int(e["id"]) for e in events], [first + 1, first + 2])
+
+        # a gap older than the grace period was a rolled back transaction
+        log(first + 4, seconds_ago=60)
+        self.assertEqual(
+            [change.id for change in changes.read(first + 2, 30)], [first + 4]
+        )
+        self.assertEqual(changes.start_id(30), first + 4)
+
+    def test_admins_only(self):
+        db.session.add(User(email="john@example.com", password="dog", confirmed=True))
+        db.session.commit()
+        response = self.client.get(
+            "/api/v1/users/changes", headers=self.headers("john@example.com", "dog")
+        )
+        self.assertEqual(response.status_code, 403)
+        for last_event_id in ("x", "-1", "2147483648", "9" * 400):
+            response = self.client.get(
+                "/api/v1/users/changes",
+                headers=self.headers(**{"Last-Event-ID": last_event_id}),
+            )
+            self.assertEqual(response.status_code, 400)
@@ -1,24 +1,19 @@
+import os
 import re
-import unittest
+import shutil
+import struct
+import tempfile
 
-from app import create_app, db
+from app import db
 from app.models import Role, User
+from tests.base import DatabaseTestCase
 
 
-class FlaskClientTestCase(unittest.TestCase):
+class FlaskClientTestCase(DatabaseTestCase):
     def setUp(self):
-        self.app = create_app("testing")
-        self.app_context = self.app.app_context()
-        self.app_context.push()
-        db.create_all()
-        Role.insert_roles()
+        super().setUp()
         self.client = self.app.test_client(use_cookies=True)
 
-    def tearDown(self):
-        db.session.remove()
-        db.drop_all()
-        self.app_context.pop()
-
     def test_home_page(self):
         # Test redirect to login page functionality for unauthorized users
         response = self.client.get("/", follow_redirects=True)
@@ -83,3 +78,77 @@ class FlaskClientTestCase(unittest.TestCase):
         response = self.client.get("/auth/logout", follow_redirects=True)
         self.assertEqual(response.status_code, 200)
         self.assertTrue("You have been logged out" in response.get_data(as_text=True))
+
+    def test_edit_profile_admin(self):
+        r = Role.query.filter_by(name="User").first()
+        admin = User(
+            email=self.app.config["APP_ADMIN"],
+            username="admin",
+            password="admin123",
+            confirmed=True,
+        )
+        u1 = User(email="john@example.com", username="john", password="cat", role=r)
+        u2 = User(email="adam@example.com", username="adam", password="dog", role=r)
+        db.session.add_all([admin, u1, u2])
+        db.session.commit()
+        self.client.post(
+            "/auth/login",
+            data={"email": self.app.config["APP_ADMIN"], "password": "admin123"},
+        )
+        moderator = Role.query.filter_by(name="Moderator").first()
+        data = {
+            "email": "john@example.com",
+            "username": "adam",
+            "role": moderator.id,
+            "name": "John",
+        }
+
+        # a username taken by another user is rejected
+        response = self.client.post("/edit-profile/{}".format(u1.id), data=data)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue("Username already in use." in response.get_data(as_text=True))
+        self.assertFalse("Email already registered." in response.get_data(as_text=True))
+
+        # unchanged values of the edited user are accepted
+        data["username"] = "john"
+        response = self.client.post("/edit-profile/{}".format(u1.id), data=data)
+        self.assertEqual(response.status_code, 302)
+        u1 = User.query.get(u1.id)
+        self.assertEqual(u1.name, "John")
+        self.assertEqual(u1.role_id, moderator.id)
+
+    def test_local_avatar(self):
+        self.app.config["FLASK_LOCAL_AVATARS"] = True
+        directory = self.app.config["FLASK_AVATAR_DIR"] = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, True)
+        u = User(email="john@example.com", username="john", password="cat")
+        db.session.add(u)
+        db.session.commit()
+        with self.app.test_request_context("/"):
+            url = u.gravatar(size=40)
+            # only the sizes of the templates are served
+            self.assertEqual(u.gravatar(size=30), url)
+        self.assertEqual(url, "/avatar/d4c74594d841139328695756648b6bd6?s=40")
+
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.mimetype, "image/png")
+        self.assertTrue(response.cache_control.immutable)
+        self.assertEqual(response.cache_control.max_age, 365 * 24 * 3600)
+        png = response.get_data()
+        self.assertTrue(png.startswith(b"\x89PNG\r\n\x1a\n"))
+        self.assertEqual(struct.unpack(">II", png[16:24]), (40, 40))
+
+        # the generated image is served again from the disk cache
+        response = self.client.get(
+            url, headers={"If-None-Match": response.get_etag()[0]}
+        )
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(self.client.get("/avatar/not-a-hash").status_code, 404)
+        self.assertEqual(self.client.get(url[:-2] + "41").status_code, 404)
+
+        # the identicons of hashes that belong to no user are not stored
+        response = self.client.get("/avatar/%s?s=256" % ("0" * 32))
+        self.assertEqual(response.status_code, 200)
+        stored = [name for _, _, names in os.walk(directory) for name in names]
+        self.assertEqual(stored, ["d4c74594d841139328695756648b6bd6-40.png"])
@@ -0,0 +1,108 @@
+import gzip
+import os
+import unittest
+import zlib
+
+from werkzeug.test import Client
+from werkzeug.wrappers import Response
+
+from app.compression import CompressionMiddleware
+
+
+class CompressionTestCase(unittest.TestCase):
+    def client(self, body, content_type="application/json", headers=None):
+        def app(environ, start_response):
+            response = Response(body, content_type=content_type, headers=headers)
+            return response(environ, start_response)
+
+        return Client(CompressionMiddleware(app, {"application/json": 6}))
+
+    def test_gzip(self):
+        body = b'{"users": []}' * 100
+        response = self.client(body).get(headers={"Accept-Encoding": "gzip"})
+        self.assertEqual(response.headers["Content-Encoding"], "gzip")
+        self.assertEqual(response.headers["Vary"], "Accept-Encoding")
+        self.assertEqual(gzip.decompress(response.data), body)
+        self.assertLess(len(response.data), len(body))
+
+    def test_deflate(self):
+        body = b"x" * 1000
+        response = self.client(body).get(
+            headers={"Accept-Encoding": "gzip;q=0.5, deflate"}
+        )
+        self.assertEqual(response.headers["Content-Encoding"], "deflate")
+        self.assertEqual(zlib.decompress(response.data), body)
+
+    def test_passthrough(self):
+        # small payload
+        response = self.client(b"{}").get(headers={"Accept-Encoding": "gzip"})
+        self.assertNotIn("Content-Encoding", response.headers)
+        self.assertEqual(response.data, b"{}")
+        # content type without a level
+        response = self.client(b"x" * 1000, "image/png").get(
+            headers={"Accept-Encoding": "gzip"}
+        )
+        self.assertNotIn("Content-Encoding", response.headers)
+        # already compressed
+        body = gzip.compress(os.urandom(1000))
+        self.assertGreater(len(body), 500)
+        response = self.client(body, headers={"Content-Encoding": "gzip"}).get(
+            headers={"Accept-Encoding": "gzip"}
+        )
+        self.assertEqual(response.data, body)
+        # not accepted
+        response = self.client(b"x" * 1000).get()
+        self.assertNotIn("Content-Encoding", response.headers)
+
+    def test_streaming(self):
+        produced = []
+
+        def generate():
+            for i in range(3):
+                produced.append(i)
+                yield b'{"chunk": %d}' % i
+
+        response = self.client(generate()).get(
+            headers={"Accept-Encoding": "gzip"}, buffered=False
+        )
+        self.assertEqual(response.headers["Content-Encoding"], "gzip")
+        decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        chunks = iter(response.response)
+        # every chunk can be decompressed as soon as it is received
+        self.assertEqual(decompressor.decompress(next(chunks)), b'{"chunk": 0}')
+        self.assertEqual(produced, [0])
+        self.assertEqual(decompressor.decompress(next(chunks)), b'{"chunk": 1}')
+        self.assertEqual(produced, [0, 1])
+        rest = b"".join(decompressor.decompress(chunk) for chunk in chunks)
+        self.assertEqual(rest + decompressor.flush(), b'{"chunk": 2}')
+        response.close()
+
+    def test_etag(self):
+        body = b"x" * 1000
+        client = self.client(body, headers={"ETag": '"abc"'})
+        response = client.get(headers={"Accept-Encoding": "gzip"})
+        self.assertEqual(response.headers["ETag"], 'W/"abc"')
+        # the uncompressed representation keeps its strong ETag
+        response = client.get()
+        self.assertEqual(response.headers["ETag"], '"abc"')
+        response = self.client(b"{}", headers={"ETag": '"abc"'}).get(
+            headers={"Accept-Encoding": "gzip"}
+        )
+        self.assertEqual(response.headers["ETag"], '"abc"')
+
+    def test_etag_of_304(self):
+        def app(environ, start_response):
+            start_response("304 NOT MODIFIED", [("ETag", '"abc"')])
+            return []
+
+        client = Client(CompressionMiddleware(app, {"application/json": 6}))
+        # revalidating a compressed response
+        response = client.get(
+            headers={"Accept-Encoding": "gzip", "If-None-Match": 'W/"abc"'}
+        )
+        self.assertEqual(response.headers["ETag"], 'W/"abc"')
+        # revalidating a response that was not compressed, like an image
+        response = client.get(
+            headers={"Accept-Encoding": "gzip", "If-None-Match": '"abc"'}
+        )
+        self.assertEqual(response.headers["ETag"], '"abc"')
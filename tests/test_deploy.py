@@ -0,0 +1,99 @@
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+from flask_migrate import Migrate
+
+from app import create_app, db, deploy
+from app.models import Role, User
+
+
+class DeployTestCase(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.app = create_app("testing")
+        self.app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite:///" + os.path.join(
+            self.directory, "deploy.sqlite"
+        )
+        Migrate(self.app, db)
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+
+    def tearDown(self):
+        db.session.remove()
+        db.get_engine().dispose()
+        self.app_context.pop()
+        shutil.rmtree(self.directory)
+
+    def test_idempotent(self):
+        self.assertEqual(deploy.run(), ["schema", "seed"])
+        self.assertEqual(Role.query.count(), 3)
+        admin = User.query.filter_by(email="vaibhav@example.com").one()
+        self.assertTrue(admin.is_administrator())
+        revision = db.session.execute(
+            db.text("SELECT version_num FROM alembic_version")
+        ).scalar()
+        self.assertIsNotNone(revision)
+
+        # nothing changed, nothing to do
+        password_hash = admin.password_hash
+        self.assertEqual(deploy.run(), [])
+        db.session.expire_all()
+        self.assertEqual(admin.password_hash, password_hash)
+
+        # changed models or migrations
+        with mock.patch.object(deploy, "schema_fingerprint", lambda engine: "new"):
+            self.assertEqual(deploy.run(), ["schema"])
+            self.assertEqual(deploy.read_state(db.engine)["schema"], "new")
+
+            # new seed data
+            with mock.patch.object(deploy, "SEED_VERSION", deploy.SEED_VERSION + 1):
+                self.assertEqual(deploy.run(), ["seed"])
+        self.assertEqual(User.query.count(), 1)
+
+    def test_existing_database(self):
+        # the schema created by db.create_all() before the migrations were
+        # tracked
+        metadata = db.MetaData()
+        db.Table(
+            "roles",
+            metadata,
+            db.Column("id", db.Integer, primary_key=True),
+            db.Column("name", db.String(64), unique=True),
+            db.Column("default", db.Boolean, index=True),
+            db.Column("permissions", db.Integer),
+        )
+        db.Table(
+            "users",
+            metadata,
+            db.Column("id", db.Integer, primary_key=True),
+            db.Column("email", db.String(64), unique=True, index=True),
+            db.Column("username", db.String(64), unique=True, index=True),
+            db.Column("role_id", db.Integer, db.ForeignKey("roles.id")),
+            db.Column("password_hash", db.String(128)),
+            db.Column("confirmed", db.Boolean),
+            db.Column("name", db.String(64)),
+            db.Column("location", db.String(64)),
+            db.Column("about_me", db.Text()),
+            db.Column("member_since", db.DateTime()),
+            db.Column("last_seen", db.DateTime()),
+            db.Column("avatar_hash", db.String(32)),
+        )
+        metadata.create_all(db.engine)
+        with db.engine.begin() as connection:
+            connection.execute(
+                metadata.tables["users"]
+                .insert()
+                .values(email="john@example.com", username="john")
+            )
+
+        self.assertEqual(deploy.run(), ["schema", "seed"])
+        self.assertEqual(Role.query.count(), 3)
+        # the columns and indexes of the later revisions were added
+        john = User.query.filter_by(username="john").one()
+        self.assertEqual(john.version, 0)
+        indexes = db.inspect(db.engine).get_indexes("users")
+        self.assertIn("ix_users_avatar_hash", [index["name"] for index in indexes])
+        self.assertEqual(deploy.run(), [])
@@ -0,0 +1,106 @@
+import csv
+import gzip
+import io
+import json
+import unittest
+from base64 import b64encode
+
+from app import db, export
+from app.exceptions import ValidationError
+from app.models import Role, User
+from tests.base import DatabaseTestCase
+
+try:
+    import pyarrow.parquet as pq
+except ImportError:
+    pq = None
+
+
+class ExportTestCase(DatabaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.client = self.app.test_client()
+        admin = Role.query.filter_by(name="Administrator").first()
+        self.admin = User(
+            email="admin@example.com", password="cat", confirmed=True, role=admin
+        )
+        db.session.add(self.admin)
+        db.session.add_all(
+            User(email="user%d@example.com" % i, username="user%d" % i)
+            for i in range(5)
+        )
+        db.session.commit()
+
+    def get_api_headers(self, username, password):
+        return {
+            "Authorization": "Basic "
+            + b64encode((username + ":" + password).encode("utf-8")).decode("utf-8")
+        }
+
+    def test_csv(self):
+        data = b"".join(export.export_users("csv", ("id", "email"), batch_size=2))
+        rows = list(csv.reader(io.StringIO(data.decode("utf-8"))))
+        self.assertEqual(rows[0], ["id", "email"])
+        self.assertEqual(len(rows), 7)
+        self.assertEqual(rows[-1], [str(User.query.count()), "user4@example.com"])
+
+    def test_jsonl_gzip(self):
+        data = b"".join(export.export_users("jsonl", gzip=True, batch_size=4))
+        lines = gzip.decompress(data).decode("utf-8").splitlines()
+        users = [json.loads(line) for line in lines]
+        self.assertEqual(len(users), 6)
+        self.assertEqual(list(users[0]), list(export.COLUMNS))
+        self.assertEqual(users[0]["email"], "admin@example.com")
+        self.assertEqual(users[0]["member_since"], self.admin.member_since.isoformat())
+        self.assertNotIn("password_hash", users[0])
+
+    def test_columns(self):
+        self.assertEqual(export.parse_columns(""), export.COLUMNS)
+        self.assertEqual(export.parse_columns("id, email"), ("id", "email"))
+        with self.assertRaises(ValidationError):
+            export.parse_columns("id,password_hash")
+
+    @unittest.skipUnless(pq, "pyarrow is not installed")
+    def test_parquet(self):
+        data = b"".join(export.export_users("parquet", ("id", "email"), batch_size=4))
+        parquet = pq.ParquetFile(io.BytesIO(data))
+        self.assertEqual(parquet.metadata.num_row_groups, 2)
+        self.assertEqual(
+            parquet.read().column("email").to_pylist()[-1], "user4@example.com"
+        )
+        data = b"".join(export.export_users("parquet"))
+        users = pq.read_table(io.BytesIO(data)).to_pylist()
+        self.assertEqual(list(users[0]), list(export.COLUMNS))
+        self.assertEqual(users[0]["member_since"], self.admin.member_since)
+        self.assertIs(users[0]["confirmed"], True)
+        self.assertIsNone(users[0]["username"])
+
+    def test_api(self):
+        headers = self.get_api_headers("admin@example.com", "cat")
+        response = self.client.get(
+            "/api/v1/users/export?format=jsonl&columns=id,username&gzip=1",
+            headers=headers,
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.mimetype, "application/gzip")
+        self.assertIn("users.jsonl.gz", response.headers["Content-Disposition"])
+        lines = gzip.decompress(response.get_data()).decode("utf-8").splitlines()
+        self.assertEqual(json.loads(lines[-1])["username"], "user4")
+
+        response = self.client.get("/api/v1/users/export", headers=headers)
+        self.assertEqual(response.mimetype, "text/csv")
+        self.assertEqual(len(response.get_data(as_text=True).splitlines()), 7)
+
+        response = self.client.get("/api/v1/users/export?format=xml", headers=headers)
+        self.assertEqual(response.status_code, 400)
+
+    def test_api_requires_admin(self):
+        user = User.query.filter_by(email="user0@example.com").first()
+        user.password = "dog"
+        user.confirmed = True
+        db.session.commit()
+        response = self.client.get(
+            "/api/v1/users/export",
+            headers=self.get_api_headers("user0@example.com", "dog"),
+        )
+        self.assertEqual(response.status_code, 403)
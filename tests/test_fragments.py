@@ -0,0 +1,105 @@
+import shutil
+import tempfile
+
+from flask import render_template
+
+from app import db
+from app.fragments import FragmentCache
+from app.models import Role, User
+from app.records import select_users, user_records
+from tests.base import DatabaseTestCase
+
+
+class FragmentCacheTestCase(DatabaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.client = self.app.test_client(use_cookies=True)
+
+    def test_byte_budget(self):
+        cache = FragmentCache(max_bytes=10, ttl=60)
+        cache.set("a", "users-1", "aaaa")
+        cache.set("b", "users-2", "bbbb")
+        self.assertEqual(cache.get("a", "users-1"), "aaaa")
+        # the least recently used fragment is evicted
+        cache.set("c", "users-3", "cccc")
+        self.assertIsNone(cache.get("b", "users-2"))
+        self.assertEqual(cache.get("a", "users-1"), "aaaa")
+        self.assertLessEqual(cache.size, 10)
+        # fragments larger than the budget are never stored
+        cache.set("d", "users-4", "d" * 11)
+        self.assertIsNone(cache.get("d", "users-4"))
+
+    def test_file_tier(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, True)
+        cache = FragmentCache(max_bytes=1024, ttl=60, directory=directory)
+        cache.set("a", "users-1", "aaaa")
+        # a second process finds the fragment on disk
+        other = FragmentCache(max_bytes=1024, ttl=60, directory=directory)
+        self.assertEqual(other.get("a", "users-1"), "aaaa")
+        other.invalidate("users-1")
+        self.assertIsNone(FragmentCache(1024, 60, directory).get("a", "users-1"))
+
+    def test_profile_invalidation(self):
+        u = User(
+            email="john@example.com",
+            username="john",
+            password="cat",
+            confirmed=True,
+            location="Jaipur",
+        )
+        db.session.add(u)
+        db.session.commit()
+        response = self.client.get("/user/john")
+        self.assertTrue("Jaipur" in response.get_data(as_text=True))
+        cache = self.app.extensions["fragment_cache"]
+        self.assertTrue(cache.size > 0)
+
+        # ping() alone keeps the fragments that do not show the last visit time
+        u.ping()
+        self.assertTrue(cache.size > 0)
+
+        u.location = "Pune"
+        db.session.add(u)
+        db.session.commit()
+        self.assertEqual(cache.size, 0)
+        response = self.client.get("/user/john")
+        self.assertTrue("Pune" in response.get_data(as_text=True))
+        self.assertFalse("Jaipur" in response.get_data(as_text=True))
+
+    def test_version_in_keys(self):
+        u = User(email="john@example.com", username="john", location="Jaipur")
+        db.session.add(u)
+        db.session.commit()
+        response = self.client.get("/user/john")
+        self.assertTrue("Jaipur" in response.get_data(as_text=True))
+        version = u.version
+        u.ping()
+        self.assertEqual(u.version, version)
+
+        # a Core UPDATE, or a commit in another worker process, does not go
+        # through the invalidation events of this process
+        db.session.execute(
+            User.__table__.update()
+            .where(User.id == u.id)
+            .values(location="Pune", last_seen=u.last_seen)
+        )
+        db.session.commit()
+        self.assertEqual(u.version, version + 1)
+        response = self.client.get("/user/john")
+        self.assertTrue("Pune" in response.get_data(as_text=True))
+        self.assertFalse("Jaipur" in response.get_data(as_text=True))
+
+    def test_role_name_in_keys(self):
+        role = Role.query.filter_by(name="Moderator").first()
+        db.session.add(User(email="john@example.com", username="john", role=role))
+        db.session.commit()
+        records = user_records(select_users())
+        with self.app.test_request_context():
+            html = render_template("show_profiles.html", users=records)
+            self.assertIn("Role: Moderator", html)
+            # a rename bumps the version of the role table, not of the users
+            role.name = "Reviewer"
+            db.session.commit()
+            html = render_template("show_profiles.html", users=records)
+            self.assertIn("Role: Reviewer", html)
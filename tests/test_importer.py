@@ -0,0 +1,124 @@
+import io
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from app import create_app, db, export, importer
+from app.changes import change_log
+from app.models import Role, User, role_table
+
+
+class ImporterTestCase(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.app = create_app("testing")
+        self.app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite:///" + os.path.join(
+            self.directory, "data.sqlite"
+        )
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        self.addCleanup(self.app_context.pop)
+        db.create_all()
+        Role.insert_roles()
+        db.session.add(User(email="taken@example.com", username="taken"))
+        db.session.commit()
+        self.addCleanup(db.engine.dispose)
+        self.addCleanup(db.session.remove)
+        self.settings = importer.settings(self.app, role_table.get())
+        self.errors = []
+
+    def run_import(self, text, format="csv", **kwargs):
+        records = importer.read_records(io.StringIO(text), format)
+        return importer.import_users(
+            db.engine,
+            records,
+            self.settings,
+            errors=lambda line, message: self.errors.append((line, message)),
+            **kwargs
+        )
+
+    def test_csv(self):
+        stats = self.run_import(
+            "email,username,password,role,confirmed\n"
+            "taken@example.com,someone,cat,,\n"
+            "john@example.com,taken,cat,,\n"
+            "not-an-email,invalid,cat,,\n"
+            "susan@example.com,1susan,cat,,\n"
+            "david@example.com,david,cat,Moderator,true\n"
+            "david@example.com,david2,cat,,\n"
+            "mary@example.com,mary,,Nobody,\n"
+            "%s,admin,dog,,\n" % self.app.config["APP_ADMIN"],
+            processes=1,
+            batch_size=2,
+        )
+        self.assertEqual(
+            (stats.read, stats.imported, stats.duplicates, stats.invalid), (8, 2, 3, 3)
+        )
+        self.assertEqual([line for line, _ in self.errors], [4, 5, 8])
+        david = User.query.filter_by(username="david").one()
+        self.assertEqual(david.role.name, "Moderator")
+        self.assertTrue(david.confirmed)
+        self.assertTrue(david.verify_password("cat"))
+        self.assertEqual(david.avatar_hash, david.gravatar_hash())
+        admin = User.query.filter_by(username="admin").one()
+        self.assertTrue(admin.is_administrator())
+        # the change feed hears about the imported users
+        logged = db.session.execute(
+            db.select(change_log.c.row_id).where(change_log.c.op == "insert")
+        ).scalars()
+        taken = User.query.filter_by(username="taken").one()
+        self.assertEqual(set(logged), {taken.id, david.id, admin.id})
+
+    def test_jsonl_types(self):
+        lines = [
+            {"email": "john@example.com", "username": "john", "role": ["User"]},
+            {"email": "susan@example.com", "username": "susan", "role_id": {}},
+            {"email": ["david@example.com"], "username": "david"},
+            {"email": "mary@example.com", "username": "mary", "role": "User"},
+        ]
+        stats = self.run_import(
+            "\n".join(json.dumps(line) for line in lines), format="jsonl", processes=1
+        )
+        self.assertEqual((stats.read, stats.imported, stats.invalid), (4, 1, 3))
+        self.assertEqual([line for line, _ in self.errors], [1, 2, 3])
+        self.assertIsNotNone(User.query.filter_by(username="mary").first())
+
+    def test_parallel_workers(self):
+        lines = ["email,username,password,name"]
+        lines += [
+            "user%d@example.com,user%d,pw%d,User %d" % ((i,) * 4) for i in range(50)
+        ]
+        lines += ["user%d@example.com,again%d,pw," % (i, i) for i in range(5)]
+        stats = self.run_import("\n".join(lines), processes=2, batch_size=7)
+        self.assertEqual((stats.imported, stats.duplicates), (50, 5))
+        user = User.query.filter_by(username="user49").one()
+        self.assertEqual(user.name, "User 49")
+        self.assertTrue(user.verify_password("pw49"))
+
+    def test_export_round_trip(self):
+        with self.app.test_request_context():
+            data = b"".join(export.export_users("jsonl")).decode("utf-8")
+        User.query.delete()
+        db.session.commit()
+        stats = self.run_import(data + "{not json\n", format="jsonl", processes=1)
+        self.assertEqual((stats.imported, stats.invalid), (1, 1))
+        user = User.query.one()
+        exported = json.loads(data.splitlines()[0])
+        self.assertEqual(user.email, "taken@example.com")
+        self.assertEqual(user.member_since.isoformat(), exported["member_since"])
+        self.assertEqual(user.role_id, exported["role_id"])
+
+    def test_multirow_insert(self):
+        rows = [
+            importer.validate(
+                {"email": "user%d@example.com" % i, "username": "user%d" % i},
+                self.settings,
+            )
+            for i in range(3)
+        ]
+        with db.engine.begin() as connection:
+            importer._multirow_insert(connection, rows)
+        self.assertEqual(User.query.count(), 4)
@@ -0,0 +1,80 @@
+import logging
+import time
+import unittest
+
+from app import logs
+from tests.smtp_server import LocalSMTPServer
+
+
+class SlowHandler(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.records = []
+
+    def emit(self, record):
+        time.sleep(0.2)
+        self.records.append(record)
+
+
+class LogsTestCase(unittest.TestCase):
+    def setUp(self):
+        self.logger = logging.getLogger("tests.logs.%s" % self._testMethodName)
+        self.logger.propagate = False
+        self.addCleanup(self.logger.handlers.clear)
+
+    def add_handler(self, handler):
+        class App:
+            logger = self.logger
+
+        logs.add_handler(App, handler)
+
+    def test_non_blocking(self):
+        handler = SlowHandler()
+        handler.setLevel(logging.ERROR)
+        self.add_handler(handler)
+        start = time.perf_counter()
+        self.logger.error("first")
+        self.logger.error("second")
+        self.logger.warning("ignored")
+        self.assertLess(time.perf_counter() - start, 0.1)
+        logs.flush()
+        self.assertEqual([r.getMessage() for r in handler.records], ["first", "second"])
+
+    def test_digest(self):
+        with LocalSMTPServer() as server:
+            handler = logs.DigestSMTPHandler(
+                mailhost=("localhost", server.port),
+                fromaddr="flasky@example.com",
+                toaddrs=["admin@example.com"],
+                subject="[Flask] Application Error",
+                interval=3600,
+            )
+            handler.setLevel(logging.ERROR)
+            self.add_handler(handler)
+            # the first error is sent right away
+            self.logger.error("boom")
+            logs.flush()
+            self.assertEqual(len(server.messages), 1)
+            self.assertEqual(server.messages[0]["Subject"], "[Flask] Application Error")
+            self.assertIn("boom", server.messages[0].get_content())
+
+            # an error storm is collected into one digest
+            for i in range(50):
+                self.logger.error("storm %d", i)
+            try:
+                1 / 0
+            except ZeroDivisionError:
+                self.logger.exception("division")
+            logs.flush()
+            self.assertEqual(len(server.messages), 1)
+            handler.flush()
+            self.assertEqual(len(server.messages), 2)
+            digest = server.messages[1]
+            self.assertEqual(
+                digest["Subject"],
+                "[Flask] Application Error (51 occurrences of 2 errors)",
+            )
+            body = digest.get_content()
+            self.assertIn("50 occurrences", body)
+            self.assertIn("storm 0", body)
+            self.assertIn("ZeroDivisionError", body)
@@ -0,0 +1,40 @@
+from werkzeug.exceptions import NotFound
+
+from app import db, queries
+from app.models import Role, User
+from tests.base import DatabaseTestCase
+
+
+class QueriesTestCase(DatabaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User(email="john@example.com", username="john", password="cat")
+        db.session.add(self.user)
+        db.session.commit()
+
+    def test_user_lookups(self):
+        self.assertIs(queries.user_by_email("john@example.com"), self.user)
+        self.assertIs(queries.user_by_username("john"), self.user)
+        self.assertIs(queries.user(self.user.id), self.user)
+        self.assertIs(queries.user_or_404(self.user.id), self.user)
+        self.assertIsNone(queries.user_by_email("susan@example.com"))
+        self.assertIsNone(queries.user_by_username("susan"))
+        self.assertIsNone(queries.user(self.user.id + 1))
+        with self.assertRaises(NotFound):
+            queries.user_or_404(self.user.id + 1)
+
+    def test_lookups_see_pending_changes(self):
+        # like Query.first(), the session is flushed before the lookup
+        self.user.email = "johnny@example.com"
+        db.session.add(User(email="susan@example.com", username="susan"))
+        self.assertIs(queries.user_by_email("johnny@example.com"), self.user)
+        self.assertIsNone(queries.user_by_email("john@example.com"))
+        self.assertEqual(queries.user_by_username("susan").email, "susan@example.com")
+
+    def test_role_lookups(self):
+        self.assertEqual(queries.role_by_name("Administrator").name, "Administrator")
+        self.assertIsNone(queries.role_by_name("Nobody"))
+        self.assertEqual(
+            queries.default_role(), Role.query.filter_by(default=True).one()
+        )
+        self.assertEqual(self.user.role, queries.default_role())
@@ -0,0 +1,55 @@
+from flask import render_template
+
+from app import db
+from app.fragments import tag_for
+from app.models import Role, User
+from app.records import UserRecord, paginate_users, select_users, user_records
+from tests.base import DatabaseTestCase
+
+
+class RecordsTestCase(DatabaseTestCase):
+    def setUp(self):
+        super().setUp()
+        admin = Role.query.filter_by(name="Administrator").first()
+        self.users = [
+            User(email="john@example.com", username="john", password="cat"),
+            User(email="susan@example.com", username="susan", role=admin),
+            User(email="david@example.com", username="david", name="David"),
+        ]
+        db.session.add_all(self.users)
+        db.session.commit()
+
+    def test_same_interface_as_users(self):
+        records = user_records(select_users().order_by(User.id))
+        self.assertEqual([r.id for r in records], [u.id for u in self.users])
+        with self.app.test_request_context():
+            for record, user in zip(records, self.users):
+                self.assertIsInstance(record, UserRecord)
+                self.assertEqual(record.to_json(), user.to_json())
+                self.assertEqual(record.gravatar(size=40), user.gravatar(size=40))
+                self.assertEqual(record.role_name, user.role_name)
+                self.assertEqual(tag_for(record), tag_for(user))
+        self.assertFalse(hasattr(records[0], "password_hash"))
+        with self.assertRaises(AttributeError):
+            records[0].name = "John"
+
+    def test_templates_render_both(self):
+        records = user_records(select_users().order_by(User.id))
+        with self.app.test_request_context():
+            html = render_template("show_profiles.html", users=records)
+            # rendered again, not read from the fragment cache
+            self.app.extensions["fragment_cache"].clear()
+            self.assertEqual(
+                render_template("show_profiles.html", users=self.users), html
+            )
+
+    def test_paginate(self):
+        statement = select_users().order_by(User.id)
+        page = paginate_users(statement, 2, 2)
+        self.assertEqual([r.username for r in page.items], ["david"])
+        self.assertEqual(page.total, 3)
+        self.assertTrue(page.has_prev)
+        self.assertFalse(page.has_next)
+        page = paginate_users(statement, 0, 2)
+        self.assertEqual([r.username for r in page.items], ["john", "susan"])
+        self.assertTrue(page.has_next)
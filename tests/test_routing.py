@@ -0,0 +1,118 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+from base64 import b64encode
+
+from app import create_app, db
+from app.models import Role, User
+from app.routing import use_primary
+
+
+class RoutingTestCase(unittest.TestCase):
+    """A primary and a replica in two SQLite files, the replica lagging behind."""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        primary = os.path.join(self.directory, "primary.sqlite")
+        replica = os.path.join(self.directory, "replica.sqlite")
+        self.app = create_app("testing")
+        self.app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite:///" + primary
+        self.app.config["SQLALCHEMY_BINDS"] = {"replica0": "sqlite:///" + replica}
+        self.app.config["SQLALCHEMY_REPLICA_BINDS"] = ["replica0"]
+        self.app.config["SQLALCHEMY_REPLICA_LAG"] = 60
+
+        @self.app.route("/test/name/<int:id>")
+        def name(id):
+            return db.session.get(User, id).name
+
+        @self.app.route("/test/primary/name/<int:id>")
+        @use_primary
+        def primary_name(id):
+            return db.session.get(User, id).name
+
+        @self.app.route("/test/name/<int:id>", methods=["POST"])
+        def rename(id):
+            user = db.session.get(User, id)
+            user.name = "renamed"
+            db.session.commit()
+            return ""
+
+        # requests run in their own application context, with their own session
+        with self.app.app_context():
+            self.seed(primary, replica)
+        self.addCleanup(self.dispose)
+        self.client = self.app.test_client()
+
+    def seed(self, primary, replica):
+        db.create_all()
+        Role.insert_roles()
+        user = User(
+            email="john@example.com",
+            username="john",
+            password="cat",
+            confirmed=True,
+            name="John",
+        )
+        db.session.add(user)
+        db.session.commit()
+        self.id = user.id
+        db.session.remove()
+        db.get_engine().dispose()
+        # the replica has caught up with the primary, until the name changes
+        shutil.copyfile(primary, replica)
+        with db.get_engine().begin() as connection:
+            connection.execute(User.__table__.update().values(name="John Smith"))
+
+    def dispose(self):
+        with self.app.app_context():
+            db.get_engine().dispose()
+            db.get_engine(bind="replica0").dispose()
+
+    def test_api_reads_from_replica(self):
+        headers = {
+            "Authorization": "Basic "
+            + b64encode(b"john@example.com:cat").decode("utf-8"),
+            "Accept": "application/json",
+        }
+        response = self.client.get("/api/v1/users/%d" % self.id, headers=headers)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(json.loads(response.data)["name"], "John")
+        response = self.client.get("/api/v1/users/", headers=headers)
+        self.assertEqual(json.loads(response.data)["users"][0]["name"], "John")
+
+    def test_use_primary(self):
+        self.assertEqual(self.client.get("/test/name/%d" % self.id).data, b"John")
+        self.assertEqual(
+            self.client.get("/test/primary/name/%d" % self.id).data, b"John Smith"
+        )
+
+    def test_outside_of_requests(self):
+        with self.app.app_context():
+            self.assertEqual(db.session.get(User, self.id).name, "John Smith")
+
+    def test_read_your_writes(self):
+        with self.app.test_request_context("/test/name/%d" % self.id):
+            user = db.session.get(User, self.id)
+            self.assertEqual(user.name, "John")
+            # the time of the last visit does not need to be read back
+            user.ping()
+            self.assertEqual(self.select_name(), "John")
+            user.about_me = "Hello"
+            db.session.commit()
+            self.assertEqual(self.select_name(), "John Smith")
+
+    def test_read_your_writes_after_redirect(self):
+        self.client.post("/test/name/%d" % self.id)
+        # the next requests of the same user read from the primary
+        self.assertEqual(self.client.get("/test/name/%d" % self.id).data, b"renamed")
+        # but not those of other users
+        other = self.app.test_client()
+        self.assertEqual(other.get("/test/name/%d" % self.id).data, b"John")
+
+    def select_name(self):
+        return db.session.execute(
+            db.select(User.name).where(User.id == self.id)
+        ).scalar()
@@ -0,0 +1,115 @@
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+
+from sqlalchemy.exc import OperationalError
+
+from app import create_app, db
+from app.models import Role, User
+
+
+class SQLiteProfileTestCase(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.app = create_app("testing")
+        self.app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite:///" + os.path.join(
+            self.directory, "data.sqlite"
+        )
+        self.app.config["SQLALCHEMY_SQLITE_PRAGMAS"] = dict(
+            self.app.config["SQLALCHEMY_SQLITE_PRAGMAS"], busy_timeout=1000
+        )
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        self.addCleanup(self.app_context.pop)
+        db.create_all()
+        Role.insert_roles()
+        self.addCleanup(db.engine.dispose)
+        self.addCleanup(db.session.remove)
+
+    def test_pragmas(self):
+        with db.engine.connect() as connection:
+
+            def pragma(name):
+                return connection.exec_driver_sql("PRAGMA %s" % name).scalar()
+
+            self.assertEqual(pragma("journal_mode"), "wal")
+            self.assertEqual(pragma("synchronous"), 1)  # NORMAL
+            self.assertEqual(pragma("busy_timeout"), 1000)
+            self.assertEqual(pragma("cache_size"), -64 * 1024)
+
+    def test_writes_are_serialized(self):
+        engine = db.engine
+        connection = engine.connect()
+        transaction = connection.begin()
+        connection.execute(User.__table__.insert().values(email="john@example.com"))
+        written = threading.Event()
+
+        def write():
+            with engine.begin() as other:
+                other.execute(User.__table__.insert().values(email="susan@example.com"))
+            written.set()
+
+        thread = threading.Thread(target=write)
+        thread.start()
+        # the second writer waits in the queue until the first one commits
+        self.assertFalse(written.wait(0.2))
+        transaction.commit()
+        connection.close()
+        thread.join()
+        self.assertTrue(written.is_set())
+        self.assertEqual(User.query.count(), 2)
+
+    def test_queue_timeout(self):
+        engine = db.engine
+        connection = engine.connect()
+        transaction = connection.begin()
+        connection.execute(User.__table__.insert().values(email="john@example.com"))
+        errors = []
+
+        def write():
+            try:
+                with engine.begin() as other:
+                    other.execute(
+                        User.__table__.insert().values(email="susan@example.com")
+                    )
+            except OperationalError as e:
+                errors.append(e)
+
+        start = time.perf_counter()
+        thread = threading.Thread(target=write)
+        thread.start()
+        thread.join()
+        self.assertGreaterEqual(time.perf_counter() - start, 1)
+        self.assertIn("database is locked", str(errors[0]))
+        transaction.rollback()
+        connection.close()
+        # the queue is free again
+        with db.engine.begin() as other:
+            other.execute(User.__table__.insert().values(email="susan@example.com"))
+
+    def test_concurrent_sessions(self):
+        errors = []
+
+        def worker(n):
+            with self.app.app_context():
+                try:
+                    for i in range(20):
+                        db.session.add(User(email="user%d-%d@example.com" % (n, i)))
+                        db.session.commit()
+                        User.query.count()
+                except OperationalError as e:
+                    errors.append(e)
+                finally:
+                    db.session.remove()
+
+        threads = [threading.Thread(target=worker, args=(n,)) for n in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [])
+        self.assertEqual(User.query.count(), 160)
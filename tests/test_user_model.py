@@ -1,24 +1,14 @@
 import time
-import unittest
 from datetime import datetime
 
-from app import create_app, db
-from app.models import AnonymousUser, Permission, Role, User
-
+from itsdangerous import TimedJSONWebSignatureSerializer as Serializer
 
-class UserModelTestCase(unittest.TestCase):
-    def setUp(self):
-        self.app = create_app("testing")
-        self.app_context = self.app.app_context()
-        self.app_context.push()
-        db.create_all()
-        Role.insert_roles()
+from app import db, tokens
+from app.models import AnonymousUser, Permission, Role, User
+from tests.base import DatabaseTestCase
 
-    def tearDown(self):
-        db.session.remove()
-        db.drop_all()
-        self.app_context.pop()
 
+class UserModelTestCase(DatabaseTestCase):
     def test_password_setter(self):
         u = User(password="cat")
         self.assertTrue(u.password_hash is not None)
@@ -38,6 +28,67 @@ class UserModelTestCase(unittest.TestCase):
         u2 = User(password="cat")
         self.assertTrue(u.password_hash != u2.password_hash)
 
+    def test_valid_auth_token(self):
+        u = User(password="cat")
+        db.session.add(u)
+        db.session.commit()
+        token = u.generate_auth_token(expiration=3600)
+        self.assertTrue(token.startswith(tokens.PREFIX))
+        self.assertEqual(User.verify_auth_token(token), u)
+
+    def test_invalid_auth_token(self):
+        u = User(password="cat")
+        db.session.add(u)
+        db.session.commit()
+        token = u.generate_auth_token(expiration=3600)
+        tampered = token[:10] + ("B" if token[10] == "A" else "A") + token[11:]
+        self.assertIsNone(User.verify_auth_token(tampered))
+        self.assertIsNone(User.verify_auth_token(token[:20]))
+        # a confirmation token is not accepted for authentication
+        self.assertIsNone(User.verify_auth_token(u.generate_confirmation_token()))
+
+    def test_expired_auth_token(self):
+        u = User(password="cat")
+        db.session.add(u)
+        db.session.commit()
+        signer = tokens.get_signer()
+        token = signer.dumps(tokens.AUTH, u.id, 1, now=time.time() - 2)
+        self.assertIsNone(User.verify_auth_token(token))
+        token = signer.dumps(tokens.AUTH, u.id, 1)
+        self.assertIsNone(signer.loads(tokens.AUTH, token, now=time.time() + 2))
+
+    def test_legacy_tokens(self):
+        u = User(password="cat")
+        db.session.add(u)
+        db.session.commit()
+        s = Serializer(self.app.config["SECRET_KEY"], expires_in=3600)
+        token = s.dumps({"id": u.id}).decode("utf-8")
+        self.assertEqual(User.verify_auth_token(token), u)
+        token = s.dumps({"confirm": u.id}).decode("utf-8")
+        self.assertTrue(u.confirm(token))
+        self.app.config["FLASK_LEGACY_TOKENS"] = False
+        self.assertIsNone(User.verify_auth_token(token))
+
+    def test_token_key_rotation(self):
+        old = tokens.TokenSigner(["old key"])
+        rotated = tokens.TokenSigner(["new key", "old key"])
+        token = old.dumps(tokens.AUTH, 42, 3600)
+        self.assertEqual(rotated.loads(tokens.AUTH, token), 42)
+        token = rotated.dumps(tokens.AUTH, 42, 3600)
+        self.assertEqual(rotated.loads(tokens.AUTH, token), 42)
+        self.assertIsNone(old.loads(tokens.AUTH, token))
+        # key ids of unrelated keys do not collide
+        tokens.TokenSigner(["key %d" % i for i in range(1000)])
+
+    def test_confirmation_token(self):
+        u1 = User(password="cat")
+        u2 = User(password="dog")
+        db.session.add_all([u1, u2])
+        db.session.commit()
+        token = u1.generate_confirmation_token()
+        self.assertFalse(u2.confirm(token))
+        self.assertTrue(u1.confirm(token))
+
     def test_user_role(self):
         u = User(email="john@example.com", password="cat")
         self.assertTrue(u.can(Permission.FOLLOW))
@@ -64,6 +115,25 @@ class UserModelTestCase(unittest.TestCase):
         self.assertTrue(u.can(Permission.MODERATE))
         self.assertTrue(u.can(Permission.ADMIN))
 
+    def test_role_permission_changes(self):
+        r = Role.query.filter_by(name="Moderator").first()
+        u = User(email="john@example.com", password="cat", role=r)
+        db.session.add(u)
+        db.session.commit()
+        self.assertTrue(u.can(Permission.MODERATE))
+        self.assertFalse(u.can(Permission.ADMIN))
+
+        # editing a role reloads the role table after the commit
+        r.add_permission(Permission.ADMIN)
+        db.session.commit()
+        self.assertTrue(u.can(Permission.ADMIN))
+
+        # assigning another role forgets the stored permission bits
+        u.role = Role.query.filter_by(name="User").first()
+        self.assertFalse(u.can(Permission.MODERATE))
+        db.session.commit()
+        self.assertFalse(u.can(Permission.MODERATE))
+
     def test_anonymous_user(self):
         u = AnonymousUser()
         self.assertFalse(u.can(Permission.FOLLOW))